@@ -12,9 +12,25 @@ def create_app(config_name='development'):
     # 載入配置
     app.config.from_object(config[config_name])
     
-    # 初始化擴展
+    # 初始化擴展（連線池配置需在建立引擎之前套用）
+    from utils.db_pool import init_db_pool
+    init_db_pool(app)
     db.init_app(app)
     
+    # SQL 統計（Server-Timing、結構化日誌、慢查詢）與每個請求的查詢數檢查
+    from utils.query_stats import init_query_stats
+    from utils.query_budget import init_query_budget
+    init_query_stats(app)
+    init_query_budget(app)
+    
+    # Prometheus 指標（/metrics）
+    from utils.metrics import init_metrics
+    init_metrics(app)
+    
+    # 初始化快取
+    from utils.cache import init_cache
+    init_cache(app)
+    
     # 初始化 Flask-Login
     login_manager = LoginManager()
     login_manager.init_app(app)
@@ -32,12 +48,18 @@ def create_app(config_name='development'):
     from routes.transactions import transactions_bp
     from routes.goals import goals_bp
     from routes.reports import reports_bp
+    from routes.metrics import metrics_bp
     
     app.register_blueprint(auth_bp)
     app.register_blueprint(dashboard_bp)
     app.register_blueprint(transactions_bp)
     app.register_blueprint(goals_bp)
     app.register_blueprint(reports_bp)
+    app.register_blueprint(metrics_bp)
+    
+    # 註冊命令列指令
+    from utils.commands import register_commands
+    register_commands(app)
     
     # 首頁路由
     @app.route('/')
@@ -0,0 +1,4 @@
+"""
+Benchmarks 套件
+包含測試資料產生器與效能基準
+"""
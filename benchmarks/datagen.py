@@ -0,0 +1,206 @@
+import math
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from flask import current_app
+from werkzeug.security import generate_password_hash
+from sqlalchemy import insert, select
+from models import db, User, Category, Transaction, Goal
+from services.rollup_service import RollupService
+from services.anomaly_service import AnomalyService
+from services.transaction_service import TransactionService, get_month_range
+
+BENCH_PASSWORD = 'bench123'
+
+
+def parse_goal_mix(value):
+    """解析目標組合字串（例如 'saving=2,expense_limit=1'）"""
+    mix = {}
+    for part in filter(None, (item.strip() for item in value.split(','))):
+        goal_type, _, count = part.partition('=')
+        if goal_type not in ('saving', 'expense_limit'):
+            raise ValueError(f'不支援的目標類型: {goal_type}')
+        mix[goal_type] = int(count or 1)
+    return mix
+
+
+class SyntheticDataGenerator:
+    """可重現的測試資料產生器
+    
+    相同的 seed 與 end_date 會產生完全相同的使用者、類別、交易與目標。
+    每位使用者每月 5 日入帳薪資，支出筆數每日依 Poisson 分布，
+    支出類別依 Zipf 分布（category_skew 越大越集中在少數類別），金額為各類別基準金額的對數常態分布。
+    交易以 executemany 分批寫入，寫入後一次重建每日彙總、異常支出標記與目標進度。
+    """
+    
+    BATCH_SIZE = 5000
+    
+    def __init__(self, users=10, years=1, transactions_per_day=3.0, category_skew=1.2,
+                 goal_mix=None, seed=42, end_date=None, username_prefix='bench'):
+        self.users = users
+        self.years = years
+        self.transactions_per_day = transactions_per_day
+        self.category_skew = category_skew
+        self.goal_mix = goal_mix if goal_mix is not None else {'saving': 1, 'expense_limit': 1}
+        self.seed = seed
+        self.end_date = end_date or datetime.now().date()
+        self.start_date = self.end_date - timedelta(days=365 * years)
+        self.username_prefix = username_prefix
+    
+    def generate(self):
+        """產生所有使用者的資料（需在應用程式上下文中呼叫），回傳統計"""
+        started = time.perf_counter()
+        # 雜湊計算成本高，所有測試使用者共用同一組密碼雜湊
+        password_hash = generate_password_hash(BENCH_PASSWORD)
+        
+        totals = {'users': 0, 'transactions': 0, 'goals': 0}
+        
+        for index in range(self.users):
+            rng = random.Random(f'{self.seed}:{index}')
+            user_id = self._create_user(index, password_hash)
+            categories = self._create_categories(user_id)
+            
+            totals['transactions'] += self._insert_transactions(user_id, categories, rng)
+            totals['goals'] += self._create_goals(user_id, rng)
+            totals['users'] += 1
+            
+            RollupService(user_id).rebuild()
+            AnomalyService(user_id).refresh(self.start_date)
+            db.session.commit()
+            TransactionService(user_id).update_goals_progress()
+        
+        totals['elapsed_seconds'] = time.perf_counter() - started
+        return totals
+    
+    def username(self, index):
+        """第 index 位測試使用者的帳號"""
+        return f'{self.username_prefix}{index:05d}'
+    
+    def _create_user(self, index, password_hash):
+        username = self.username(index)
+        if db.session.scalar(select(User.id).where(User.username == username)) is not None:
+            raise ValueError(f'使用者 {username} 已存在，請更換 username_prefix 或使用新的資料庫')
+        
+        return db.session.execute(insert(User).values(
+            username=username,
+            email=f'{username}@example.com',
+            password_hash=password_hash,
+            created_at=datetime.combine(self.start_date, datetime.min.time())
+        ).returning(User.id)).scalar_one()
+    
+    def _create_categories(self, user_id):
+        """建立預設類別，回傳 {'income': [(id, name)], 'expense': [(id, name)]}"""
+        config = current_app.config
+        rows = [
+            {'user_id': user_id, 'name': name, 'type': category_type, 'is_default': True}
+            for category_type, names in (('income', config['DEFAULT_INCOME_CATEGORIES']),
+                                         ('expense', config['DEFAULT_EXPENSE_CATEGORIES']))
+            for name in names
+        ]
+        db.session.execute(insert(Category), rows)
+        
+        categories = {'income': [], 'expense': []}
+        for category_id, name, category_type in db.session.execute(
+            select(Category.id, Category.name, Category.type)
+            .where(Category.user_id == user_id)
+            .order_by(Category.id)
+        ):
+            categories[category_type].append((category_id, name))
+        return categories
+    
+    def _poisson(self, rng, mean):
+        # Knuth 演算法（mean 不大時足夠快）
+        limit = math.exp(-mean)
+        count, product = 0, rng.random()
+        while product > limit:
+            count += 1
+            product *= rng.random()
+        return count
+    
+    def _insert_transactions(self, user_id, categories, rng):
+        """依分布產生交易並分批寫入，回傳筆數"""
+        expense_categories = list(categories['expense'])
+        income_categories = categories['income']
+        
+        # 支出類別權重（Zipf）與基準金額
+        weights = [1 / (rank ** self.category_skew) for rank in range(1, len(expense_categories) + 1)]
+        rng.shuffle(expense_categories)
+        base_amounts = [rng.choice((60, 120, 250, 500, 1200, 3000)) for _ in expense_categories]
+        salary = Decimal(rng.randrange(30000, 90000, 500))
+        
+        batch = []
+        count = 0
+        current = self.start_date
+        
+        while current <= self.end_date:
+            created_at = datetime.combine(current, datetime.min.time())
+            
+            if current.day == 5:
+                batch.append(self._row(user_id, income_categories[0][0], 'income', salary, current, created_at, '薪資'))
+                if rng.random() < 0.1:
+                    bonus = Decimal(str(round(float(salary) * rng.uniform(0.2, 1.0), 2)))
+                    batch.append(self._row(user_id, rng.choice(income_categories[1:])[0], 'income', bonus, current, created_at, None))
+            
+            for _ in range(self._poisson(rng, self.transactions_per_day)):
+                position = rng.choices(range(len(expense_categories)), weights=weights)[0]
+                amount = max(round(base_amounts[position] * rng.lognormvariate(0, 0.6), 2), 1)
+                batch.append(self._row(
+                    user_id, expense_categories[position][0], 'expense', Decimal(str(amount)),
+                    current, created_at + timedelta(minutes=rng.randrange(24 * 60)), None
+                ))
+            
+            if len(batch) >= self.BATCH_SIZE:
+                db.session.execute(insert(Transaction), batch)
+                count += len(batch)
+                batch = []
+            
+            current += timedelta(days=1)
+        
+        if batch:
+            db.session.execute(insert(Transaction), batch)
+            count += len(batch)
+        
+        return count
+    
+    @staticmethod
+    def _row(user_id, category_id, transaction_type, amount, transaction_date, created_at, description):
+        return {
+            'user_id': user_id,
+            'category_id': category_id,
+            'type': transaction_type,
+            'amount': amount,
+            'date': transaction_date,
+            'description': description,
+            'created_at': created_at
+        }
+    
+    def _create_goals(self, user_id, rng):
+        """依目標組合建立目標，回傳筆數"""
+        rows = []
+        month_start, month_end = get_month_range(self.end_date.year, self.end_date.month)
+        
+        for goal_type, count in sorted(self.goal_mix.items()):
+            for number in range(1, count + 1):
+                if goal_type == 'saving':
+                    start_date = self.end_date - timedelta(days=rng.randrange(0, 300))
+                    rows.append({
+                        'name': f'儲蓄目標 {number}',
+                        'target_amount': Decimal(rng.randrange(50000, 500000, 1000)),
+                        'period': 'yearly',
+                        'start_date': start_date,
+                        'end_date': start_date + timedelta(days=364)
+                    })
+                else:
+                    rows.append({
+                        'name': f'支出上限 {number}',
+                        'target_amount': Decimal(rng.randrange(10000, 80000, 1000)),
+                        'period': 'monthly',
+                        'start_date': month_start,
+                        'end_date': month_end
+                    })
+                rows[-1].update({'user_id': user_id, 'goal_type': goal_type, 'current_amount': 0, 'status': 'active'})
+        
+        if rows:
+            db.session.execute(insert(Goal), rows)
+        return len(rows)
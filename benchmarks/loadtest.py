@@ -0,0 +1,295 @@
+"""
+HTTP 負載測試
+
+對執行中的服務（例如 gunicorn）以多個虛擬使用者重播加權的操作組合，
+回報各路由的吞吐量與 p50 / p95 / p99 延遲。只使用標準函式庫，不需載入應用程式。
+
+使用方式（使用者需先以 flask bench seed 建立）：
+    python -m benchmarks.loadtest --base-url http://127.0.0.1:8080 --users 20 --duration 60
+"""
+import argparse
+import http.client
+import json
+import math
+import random
+import re
+import threading
+import time
+from datetime import date
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+# 操作與權重（依實際使用情況調整）
+DEFAULT_MIX = {
+    'dashboard': 30,
+    'quick_stats': 25,
+    'transactions_page': 15,
+    'report_detail': 10,
+    'goals': 8,
+    'report_compare': 5,
+    'add_transaction': 5
+}
+
+_CURSOR_LINK = re.compile(r'href="[^"]*[?&]after=([^"&]+)')
+_EXPENSE_OPTION = re.compile(r'<option value="(\d+)" data-type="expense">')
+
+
+def percentile(values, percent):
+    """百分位數（最近排名法）"""
+    if not values:
+        return 0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+def parse_mix(value):
+    """解析操作權重（例如 'dashboard=30,quick_stats=25'），未列出的操作不執行"""
+    mix = {}
+    for part in filter(None, (item.strip() for item in value.split(','))):
+        action, _, weight = part.partition('=')
+        if action not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f'不支援的操作: {action}（可用: {", ".join(DEFAULT_MIX)}）')
+        mix[action] = float(weight or 1)
+    return mix
+
+
+def shift_month(year, month, offset):
+    """年月加減月數（與 services.transaction_service.shift_month 相同，避免載入應用程式）"""
+    index = year * 12 + (month - 1) + offset
+    return index // 12, index % 12 + 1
+
+
+class VirtualUser(threading.Thread):
+    """一個已登入的虛擬使用者，在截止時間前依權重隨機執行操作
+    
+    每個使用者使用自己的 keep-alive 連線與 cookie，並像瀏覽器一樣對儀表板帶上 If-None-Match。
+    成功回應的延遲與錯誤次數記錄在自己的 dict 中，結束後由主執行緒合併，量測過程不需要鎖。
+    """
+    
+    def __init__(self, base_url, username, password, mix, deadline, think_time, seed):
+        super().__init__(daemon=True)
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.https = parts.scheme == 'https'
+        self.username = username
+        self.password = password
+        self.actions = list(mix)
+        self.weights = [mix[action] for action in self.actions]
+        self.deadline = deadline
+        self.think_time = think_time
+        self.rng = random.Random(seed)
+        self.cookies = {}
+        self.etags = {}
+        self.expense_category_ids = []
+        self.latencies = {}
+        self.errors = {}
+        self.login_error = None
+        self._connection = None
+    
+    def _connect(self):
+        connection_class = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        return connection_class(self.host, self.port, timeout=30)
+    
+    def request(self, route, method, path, form=None, headers=None):
+        """送出請求並記錄延遲，回傳 (狀態碼, 回應標頭, 內容)；連線錯誤時狀態碼為 None"""
+        headers = dict(headers or {})
+        body = None
+        if form is not None:
+            body = urlencode(form)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{name}={value}' for name, value in self.cookies.items())
+        
+        started = time.perf_counter()
+        try:
+            if self._connection is None:
+                self._connection = self._connect()
+            self._connection.request(method, path, body=body, headers=headers)
+            response = self._connection.getresponse()
+            content = response.read()
+        except (OSError, http.client.HTTPException):
+            # 伺服器關閉 keep-alive 連線時重新連線，下一次請求再試
+            if self._connection is not None:
+                self._connection.close()
+            self._connection = None
+            self.errors[route] = self.errors.get(route, 0) + 1
+            return None, {}, b''
+        
+        # 錯誤回應的延遲來自錯誤處理，不計入百分位數
+        if response.status >= 400:
+            self.errors[route] = self.errors.get(route, 0) + 1
+        else:
+            self.latencies.setdefault(route, []).append(time.perf_counter() - started)
+        
+        for header in response.headers.get_all('Set-Cookie') or []:
+            for name, morsel in SimpleCookie(header).items():
+                self.cookies[name] = morsel.value
+        
+        return response.status, response.headers, content
+    
+    def login(self):
+        status, headers, _ = self.request('login', 'POST', '/auth/login', form={
+            'username': self.username,
+            'password': self.password
+        })
+        if status != 302 or 'login' in (headers.get('Location') or ''):
+            raise RuntimeError(f'{self.username} 登入失敗（狀態碼 {status}）')
+        
+        _, _, content = self.request('add_form', 'GET', '/transactions/add')
+        self.expense_category_ids = _EXPENSE_OPTION.findall(content.decode('utf-8', 'replace'))
+    
+    def _conditional_get(self, route, path):
+        headers = {'If-None-Match': self.etags[path]} if path in self.etags else None
+        status, response_headers, _ = self.request(route, 'GET', path, headers=headers)
+        if status == 200 and response_headers.get('ETag'):
+            self.etags[path] = response_headers['ETag']
+    
+    def _random_month(self):
+        today = date.today()
+        return shift_month(today.year, today.month, -self.rng.randrange(1, 13))
+    
+    def dashboard(self):
+        self._conditional_get('dashboard', '/dashboard/')
+    
+    def quick_stats(self):
+        self._conditional_get('quick_stats', '/dashboard/quick-stats')
+    
+    def transactions_page(self):
+        # 第一頁後再往後翻 0 ~ 3 頁
+        _, _, content = self.request('transactions_page', 'GET', '/transactions/')
+        for _ in range(self.rng.randrange(4)):
+            match = _CURSOR_LINK.search(content.decode('utf-8', 'replace'))
+            if not match:
+                break
+            _, _, content = self.request('transactions_next_page', 'GET', f'/transactions/?after={match.group(1)}')
+    
+    def goals(self):
+        self.request('goals', 'GET', '/goals/')
+    
+    def report_detail(self):
+        year, month = self._random_month()
+        self.request('report_detail', 'GET', f'/reports/detail/{year}/{month}')
+    
+    def report_compare(self):
+        year1, month1 = self._random_month()
+        year2, month2 = shift_month(year1, month1, -1)
+        query = urlencode({'year1': year1, 'month1': month1, 'year2': year2, 'month2': month2})
+        self.request('report_compare', 'GET', f'/reports/compare?{query}')
+    
+    def add_transaction(self):
+        if not self.expense_category_ids:
+            return
+        self.request('add_transaction', 'POST', '/transactions/add', form={
+            'type': 'expense',
+            'category_id': self.rng.choice(self.expense_category_ids),
+            'amount': f'{self.rng.lognormvariate(5, 0.6):.2f}',
+            'date': date.today().isoformat(),
+            'description': 'loadtest'
+        })
+    
+    def run(self):
+        try:
+            self.login()
+        except RuntimeError as e:
+            self.login_error = str(e)
+            return
+        
+        while time.monotonic() < self.deadline:
+            action = self.rng.choices(self.actions, weights=self.weights)[0]
+            getattr(self, action)()
+            if self.think_time:
+                time.sleep(self.rng.expovariate(1 / self.think_time))
+        
+        if self._connection is not None:
+            self._connection.close()
+
+
+def run_load_test(base_url, usernames, password, mix, duration, think_time=0.0, seed=42):
+    """以多個虛擬使用者執行負載測試，回傳各路由的統計（延遲百分位數只計入成功的回應）"""
+    started = time.monotonic()
+    deadline = started + duration
+    users = [
+        VirtualUser(base_url, username, password, mix, deadline, think_time, f'{seed}:{index}')
+        for index, username in enumerate(usernames)
+    ]
+    for user in users:
+        user.start()
+    for user in users:
+        user.join()
+    elapsed = time.monotonic() - started
+    
+    latencies, errors = {}, {}
+    for user in users:
+        for route, values in user.latencies.items():
+            latencies.setdefault(route, []).extend(values)
+        for route, count in user.errors.items():
+            errors[route] = errors.get(route, 0) + count
+    
+    routes = []
+    for route in sorted(set(latencies) | set(errors)):
+        values = latencies.get(route, [])
+        requests = len(values) + errors.get(route, 0)
+        routes.append({
+            'route': route,
+            'requests': requests,
+            'errors': errors.get(route, 0),
+            'throughput_rps': round(requests / elapsed, 2),
+            'p50_ms': round(percentile(values, 50) * 1000, 2),
+            'p95_ms': round(percentile(values, 95) * 1000, 2),
+            'p99_ms': round(percentile(values, 99) * 1000, 2),
+            'max_ms': round(max(values, default=0) * 1000, 2)
+        })
+    
+    total_requests = sum(route['requests'] for route in routes)
+    return {
+        'base_url': base_url,
+        'users': len(users),
+        'login_failures': [user.login_error for user in users if user.login_error],
+        'duration_seconds': round(elapsed, 2),
+        'mix': mix,
+        'total_requests': total_requests,
+        'throughput_rps': round(total_requests / elapsed, 2),
+        'routes': routes
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='以加權的使用者操作對執行中的服務進行負載測試')
+    parser.add_argument('--base-url', default='http://127.0.0.1:8080', help='服務網址')
+    parser.add_argument('--users', type=int, default=10, help='虛擬使用者數（同時連線數）')
+    parser.add_argument('--duration', type=float, default=60, help='測試秒數')
+    parser.add_argument('--think-time', type=float, default=0.0, help='每次操作間的平均等待秒數（0 為不等待）')
+    parser.add_argument('--prefix', default='bench', help='使用者名稱前綴（flask bench seed 建立的帳號）')
+    parser.add_argument('--accounts', type=int, help='輪流使用的帳號數（預設與虛擬使用者數相同）')
+    parser.add_argument('--password', default='bench123', help='帳號密碼')
+    parser.add_argument('--mix', type=parse_mix, default=dict(DEFAULT_MIX), help='操作權重，例如 dashboard=30,quick_stats=25')
+    parser.add_argument('--seed', type=int, default=42, help='亂數種子')
+    parser.add_argument('--output', help='將 JSON 結果寫入檔案')
+    args = parser.parse_args(argv)
+    
+    accounts = args.accounts or args.users
+    usernames = [f'{args.prefix}{index % accounts:05d}' for index in range(args.users)]
+    
+    report = run_load_test(args.base_url, usernames, args.password, args.mix, args.duration, args.think_time, args.seed)
+    
+    print(f"{'route':<24}{'requests':>10}{'errors':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for route in report['routes']:
+        print(
+            f"{route['route']:<24}{route['requests']:>10}{route['errors']:>8}{route['throughput_rps']:>10.2f}"
+            f"{route['p50_ms']:>10.1f}{route['p95_ms']:>10.1f}{route['p99_ms']:>10.1f}"
+        )
+    print(f"總計 {report['total_requests']} 個請求，{report['throughput_rps']:.2f} req/s，{report['duration_seconds']:.1f} 秒")
+    for error in report['login_failures']:
+        print(f"⚠️  {error}")
+    for route in report['routes']:
+        if route['errors']:
+            print(f"⚠️  {route['route']} 有 {route['errors']}/{route['requests']} 個請求失敗，結果不適合用來估算容量")
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+import contextlib
+import functools
+import platform
+import statistics
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import event, func, select
+from models import db, User, Goal, Transaction
+from services.transaction_service import TransactionService, get_month_range, shift_month
+from services.goal_service import GoalService
+from services.report_service import ReportService
+from services.analysis_service import AnalysisService
+from services.dashboard_service import DashboardService
+from services.anomaly_service import AnomalyService
+from benchmarks.datagen import BENCH_PASSWORD
+
+
+class BenchmarkSuite:
+    """服務層與主要路由的效能基準
+    
+    對指定使用者重複執行各服務進入點與路由（以 Flask test client），
+    記錄每次耗時與執行的 SQL 查詢數，結果以 JSON 相容的 dict 回傳。
+    每次執行前清除快取與 session，量測的是未命中快取的路徑。
+    項目拋出例外時記錄於該項目的 error 欄位，不中斷其他項目。
+    
+    未納入的進入點：交易寫入時的同步掛鉤（record_transaction_added / removed、apply_transaction_delta、
+    mark_months_dirty、AnomalyService.flag_transaction / unflag_transaction）需要正在寫入的交易，
+    由路由與負載測試涵蓋；DashboardService.get_snapshot 在清除快取後等同 build_snapshot。
+    """
+    
+    def __init__(self, app, username, repeat=5, warmup=1):
+        self.app = app
+        self.username = username
+        self.repeat = repeat
+        self.warmup = warmup
+        self._query_count = 0
+    
+    @contextlib.contextmanager
+    def _count_queries(self):
+        def count(*args):
+            self._query_count += 1
+        
+        engine = db.engine
+        self._query_count = 0
+        event.listen(engine, 'before_cursor_execute', count)
+        try:
+            yield
+        finally:
+            event.remove(engine, 'before_cursor_execute', count)
+    
+    def _measure(self, name, func, http=False):
+        """重複執行並記錄耗時與查詢數（http=True 時 func 回傳 HTTP 狀態碼）"""
+        cache = current_app.extensions['cache']
+        timings = []
+        queries = []
+        
+        for iteration in range(self.warmup + self.repeat):
+            cache.clear()
+            db.session.expire_all()
+            
+            try:
+                with self._count_queries():
+                    started = time.perf_counter()
+                    outcome = func()
+                    elapsed_ms = (time.perf_counter() - started) * 1000
+            except Exception as e:
+                db.session.rollback()
+                return {'name': name, 'error': f'{type(e).__name__}: {e}'}
+            
+            if iteration >= self.warmup:
+                timings.append(elapsed_ms)
+                queries.append(self._query_count)
+        
+        result = {
+            'name': name,
+            'runs': len(timings),
+            'min_ms': round(min(timings), 3),
+            'median_ms': round(statistics.median(timings), 3),
+            'max_ms': round(max(timings), 3),
+            'queries': max(queries)
+        }
+        if http:
+            # 路由項目記錄 HTTP 狀態碼，非 200 時耗時不具比較意義
+            result['status'] = outcome
+        return result
+    
+    def _service_cases(self, user_id):
+        today = datetime.now().date()
+        year, month = today.year, today.month
+        last_year, last_month = shift_month(year, month, -1)
+        month_start, month_end = get_month_range(year, month)
+        goal_id = db.session.scalar(
+            select(Goal.id).where(Goal.user_id == user_id).order_by(Goal.id).limit(1)
+        )
+        # 支出上限目標不會因更新進度而變成已完成，重複量測的路徑相同
+        expense_goal_id = db.session.scalar(
+            select(Goal.id).where(
+                Goal.user_id == user_id, Goal.goal_type == 'expense_limit', Goal.status == 'active'
+            ).order_by(Goal.id).limit(1)
+        )
+        category_id = db.session.scalar(
+            select(Transaction.category_id).where(
+                Transaction.user_id == user_id, Transaction.type == 'expense'
+            ).group_by(Transaction.category_id).order_by(func.count().desc()).limit(1)
+        )
+        
+        # 每次呼叫建立新的服務實例，與每個請求的情況相同
+        transactions = functools.partial(TransactionService, user_id)
+        goals = functools.partial(GoalService, user_id)
+        reports = functools.partial(ReportService, user_id)
+        analysis = functools.partial(AnalysisService, user_id)
+        
+        def refresh_dirty_report():
+            # 標記上個月的報表過期後重新生成（報表由 generate_monthly_report 項目先建立）
+            service = reports()
+            service.mark_months_dirty([(last_year, last_month)])
+            return service.refresh_dirty_reports([(last_year, last_month)])
+        
+        def refresh_anomalies():
+            flagged = AnomalyService(user_id).refresh(today - timedelta(days=90))
+            db.session.commit()
+            return flagged
+        
+        cases = [
+            ('TransactionService.aggregate', lambda: transactions().aggregate(month_start, month_end)),
+            ('TransactionService.aggregate[date]', lambda: transactions().aggregate(month_start, month_end, group_by='date')),
+            ('TransactionService.count_transactions', lambda: transactions().count_transactions()),
+            ('TransactionService.get_transactions_by_date_range', lambda: transactions().get_transactions_by_date_range(month_start, month_end)),
+            ('TransactionService.get_monthly_summary', lambda: transactions().get_monthly_summary(year, month)),
+            ('TransactionService.get_category_stats', lambda: transactions().get_category_stats(month_start, month_end)),
+            ('TransactionService.get_monthly_trend[6]', lambda: transactions().get_monthly_trend(6)),
+            ('TransactionService.get_monthly_trend[24]', lambda: transactions().get_monthly_trend(24)),
+            ('TransactionService.get_monthly_category_stats', lambda: transactions().get_monthly_category_stats(year, month)),
+            ('TransactionService.get_daily_stats', lambda: transactions().get_daily_stats(year, month)),
+            ('TransactionService.get_top_expenses', lambda: transactions().get_top_expenses(year, month)),
+            ('TransactionService.calculate_average_daily_expense', lambda: transactions().calculate_average_daily_expense()),
+            ('TransactionService.get_spending_by_weekday', lambda: transactions().get_spending_by_weekday(year, month)),
+            ('TransactionService.update_goals_progress', lambda: transactions().update_goals_progress()),
+            ('GoalService.compute_active_goal_progress', lambda: goals().compute_active_goal_progress()),
+            ('GoalService.get_all_active_goals_summary', lambda: goals().get_all_active_goals_summary()),
+            ('ReportService.generate_monthly_report', lambda: reports().generate_monthly_report(last_year, last_month)),
+            ('ReportService.refresh_dirty_reports', refresh_dirty_report),
+            ('ReportService.get_yearly_summary', lambda: reports().get_yearly_summary(year)),
+            ('ReportService.get_category_yearly_breakdown', lambda: reports().get_category_yearly_breakdown(year)),
+            ('AnalysisService.get_monthly_insights', lambda: analysis().get_monthly_insights()),
+            ('AnalysisService.get_suggestions', lambda: analysis().get_suggestions()),
+            ('AnalysisService.generate_spending_report', lambda: analysis().generate_spending_report()),
+            ('AnalysisService.get_spending_by_weekday', lambda: analysis().get_spending_by_weekday(year, month)),
+            ('AnalysisService.get_savings_rate_trend', lambda: analysis().get_savings_rate_trend()),
+            ('AnomalyService.detect[90d]', lambda: AnomalyService(user_id).detect(today - timedelta(days=90))),
+            ('AnomalyService.get_flagged_expenses[30d]', lambda: AnomalyService(user_id).get_flagged_expenses(today - timedelta(days=30), today)),
+            ('AnomalyService.refresh[90d]', refresh_anomalies),
+            ('DashboardService.build_snapshot', lambda: DashboardService(user_id).build_snapshot(today))
+        ]
+        
+        if category_id is not None:
+            cases.append(('TransactionService.get_category_trend', lambda: transactions().get_category_trend(category_id)))
+        
+        if expense_goal_id is not None:
+            cases.append(('GoalService.update_goal_progress', lambda: goals().update_goal_progress(expense_goal_id)))
+        
+        if goal_id is not None:
+            cases.extend([
+                ('GoalService.get_goal_statistics', lambda: goals().get_goal_statistics(goal_id)),
+                ('GoalService.get_goal_progress_history', lambda: goals().get_goal_progress_history(goal_id)),
+                ('GoalService.suggest_goal_adjustment', lambda: goals().suggest_goal_adjustment(goal_id))
+            ])
+        
+        return cases
+    
+    def _route_cases(self, client):
+        today = datetime.now().date()
+        last_year, last_month = shift_month(today.year, today.month, -1)
+        
+        def get(url):
+            def request():
+                # 每個請求使用新的應用程式上下文，避免 flask.g 上的請求範圍快取跨請求共用
+                with self.app.app_context():
+                    return client.get(url).status_code
+            return request
+        
+        return [
+            (f'GET {url}', get(url)) for url in (
+                '/dashboard/',
+                '/dashboard/quick-stats',
+                '/transactions/',
+                '/transactions/?count=1',
+                '/goals/',
+                '/reports/',
+                f'/reports/detail/{last_year}/{last_month}',
+                '/reports/compare',
+                '/reports/summary'
+            )
+        ]
+    
+    def run(self):
+        """執行所有基準（需在應用程式上下文中呼叫），回傳結果"""
+        user_id = db.session.scalar(select(User.id).where(User.username == self.username))
+        if user_id is None:
+            raise ValueError(f'找不到使用者 {self.username}')
+        
+        results = [self._measure(name, func) for name, func in self._service_cases(user_id)]
+        
+        client = self.app.test_client()
+        with self.app.app_context():
+            response = client.post('/auth/login', data={'username': self.username, 'password': BENCH_PASSWORD})
+        if response.status_code != 302:
+            raise RuntimeError(f'無法以 {self.username} 登入（請使用資料產生器建立的使用者）')
+        
+        results.extend(self._measure(name, func, http=True) for name, func in self._route_cases(client))
+        
+        return {
+            'started_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            'python': platform.python_version(),
+            'database': db.engine.dialect.name,
+            'username': self.username,
+            'repeat': self.repeat,
+            'results': results
+        }
@@ -31,7 +31,18 @@ class Config:
     
     SQLALCHEMY_DATABASE_URI = DATABASE_URL
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SQLALCHEMY_ECHO = True  # 設為 True 可以看到 SQL 查詢日誌
+    SQLALCHEMY_ECHO = os.environ.get('SQLALCHEMY_ECHO', 'false').lower() == 'true'  # 輸出每一條 SQL（僅供除錯）
+    
+    # 連線池配置（PostgreSQL 等使用 QueuePool 的資料庫，SQLite 沿用預設連線池）
+    # 每個 gunicorn worker 各有一個連線池，資料庫連線上限需大於 worker 數 × (DB_POOL_SIZE + DB_MAX_OVERFLOW)
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))  # 常駐連線數
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))  # 尖峰時額外建立、歸還後關閉的連線數
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))  # 連線用盡時等待的秒數，逾時拋出錯誤
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))  # 連線建立超過此秒數後重建（-1 為不重建）
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true'  # 取出前檢查連線，容錯移轉後丟棄失效連線
+    DB_POOL_USE_LIFO = os.environ.get('DB_POOL_USE_LIFO', 'true').lower() == 'true'  # 優先重用最近歸還的連線，讓多餘的閒置連線被回收
+    # 經由 PgBouncer transaction pooling 連線時設為 true（psycopg3 停用伺服器端 prepared statement）
+    DB_PGBOUNCER = os.environ.get('DB_PGBOUNCER', 'false').lower() == 'true'
     
     # Session 配置
     PERMANENT_SESSION_LIFETIME = timedelta(days=7)
@@ -45,6 +56,45 @@ class Config:
     # 應用程式配置
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 最大上傳 16MB
     
+    # 快取配置
+    # CACHE_BACKEND: 'lru'（程序內）、'redis'（Redis 相容伺服器，多個 worker 共用）或 'null'（停用）
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'lru')
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    CACHE_DEFAULT_TTL = int(os.environ.get('CACHE_DEFAULT_TTL', 300))  # 秒
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 1024))
+    
+    # 排程配置
+    GOAL_UPDATE_CHUNK_SIZE = int(os.environ.get('GOAL_UPDATE_CHUNK_SIZE', 1000))  # 每批更新的目標數
+    REPORT_WORKERS = int(os.environ.get('REPORT_WORKERS', 1))  # 月報表批次生成的程序數
+    REPORT_CHUNK_SIZE = int(os.environ.get('REPORT_CHUNK_SIZE', 50))  # 每批交給程序池的使用者數
+    REPORT_BATCH_TIMEOUT = int(os.environ.get('REPORT_BATCH_TIMEOUT', 3600))  # 排程月報表子程序的逾時秒數
+    
+    # 分析後端：'python'（預設）或 'numpy'（需安裝 numpy，一次載入交易後以向量化運算計算摘要、趨勢、儲蓄率與星期分布）
+    ANALYTICS_BACKEND = os.environ.get('ANALYTICS_BACKEND', 'python')
+    ANALYTICS_WINDOW_MONTHS = int(os.environ.get('ANALYTICS_WINDOW_MONTHS', 6))  # 載入與趨勢分析的月數（至少 6，最多 120）
+    
+    # 異常支出偵測：與同類別前 N 筆支出比較，需同時超過 平均 + Z × 標準差 與 平均 × (1 + 最小增幅)
+    ANOMALY_HISTORY_SIZE = int(os.environ.get('ANOMALY_HISTORY_SIZE', 30))  # 歷史視窗筆數
+    ANOMALY_MIN_HISTORY = int(os.environ.get('ANOMALY_MIN_HISTORY', 5))  # 歷史筆數不足時不判定
+    ANOMALY_Z_THRESHOLD = float(os.environ.get('ANOMALY_Z_THRESHOLD', 3.0))
+    ANOMALY_MIN_RATIO = float(os.environ.get('ANOMALY_MIN_RATIO', 0.5))
+    
+    # SQL 統計：回應附加 Server-Timing 標頭，每個請求輸出一筆 JSON 日誌（查詢數、資料庫時間、最慢語句、重複語句）
+    SQL_INSTRUMENTATION = os.environ.get('SQL_INSTRUMENTATION', 'true').lower() == 'true'
+    SQL_SERVER_TIMING = os.environ.get('SQL_SERVER_TIMING', 'true').lower() == 'true'
+    SQL_SLOWEST_COUNT = int(os.environ.get('SQL_SLOWEST_COUNT', 3))  # 日誌中列出的最慢語句數
+    SQL_REPEAT_THRESHOLD = int(os.environ.get('SQL_REPEAT_THRESHOLD', 5))  # 同一語句執行達此次數視為可能的 N+1
+    SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 200))  # 慢查詢門檻（毫秒，0 為停用），記錄語句與參數
+    SLOW_QUERY_EXPLAIN = os.environ.get('SLOW_QUERY_EXPLAIN', 'false').lower() == 'true'  # 慢查詢另外執行 EXPLAIN（多一次查詢，預設關閉）
+    
+    # Prometheus 指標（/metrics），設定 METRICS_TOKEN 時需以 Authorization: Bearer <token> 存取（生產環境必須設定）
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    
+    # 每個請求的 SQL 查詢數上限（0 為停用），超過時記錄警告；路由可用 @query_budget(n) 個別指定
+    QUERY_BUDGET = int(os.environ.get('QUERY_BUDGET', 0))
+    QUERY_BUDGET_STRICT = False  # True 時超過上限直接拋出例外（測試環境使用）
+    
     # 預設類別配置
     DEFAULT_INCOME_CATEGORIES = [
         '薪資', '獎金', '獎助金', '投資收益', '兼職收入', '其他收入'
@@ -63,7 +113,8 @@ class Config:
 class DevelopmentConfig(Config):
     """開發環境配置"""
     DEBUG = True
-    SQLALCHEMY_ECHO = True
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 2))  # 開發環境只有少量連線，避免佔用共用資料庫
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 3))
 
 
 class ProductionConfig(Config):
@@ -71,6 +122,12 @@ class ProductionConfig(Config):
     DEBUG = False
     SESSION_COOKIE_SECURE = True
     SQLALCHEMY_ECHO = False  # 生產環境關閉 SQL 日誌
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))  # 連線用盡時盡快失敗，避免請求在 worker 中堆積
+    
+    # /metrics 會公開各路由流量、排程任務結果與連線池狀態，未設定 METRICS_TOKEN 時預設關閉，
+    # 明確設定 METRICS_ENABLED=true 卻沒有 token 時拒絕啟動
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true' if Config.METRICS_TOKEN else 'false').lower() == 'true'
+    METRICS_REQUIRE_TOKEN = True
     
     # 生產環境應該從環境變數讀取
     SECRET_KEY = os.environ.get('SECRET_KEY')
@@ -82,6 +139,8 @@ class TestingConfig(Config):
     """測試環境配置"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'  # 使用記憶體資料庫測試
+    QUERY_BUDGET = 30  # 超過查詢數上限的請求直接失敗，避免 N+1 查詢回歸
+    QUERY_BUDGET_STRICT = True
 
 
 # 根據環境變數選擇配置
@@ -22,6 +22,11 @@ class User(UserMixin, db.Model):
     transactions = db.relationship('Transaction', backref='user', lazy='dynamic', cascade='all, delete-orphan')
     goals = db.relationship('Goal', backref='user', lazy='dynamic', cascade='all, delete-orphan')
     monthly_reports = db.relationship('MonthlyReport', backref='user', lazy='dynamic', cascade='all, delete-orphan')
+    daily_rollups = db.relationship('DailyRollup', backref='user', lazy='dynamic', cascade='all, delete-orphan')
+    data_version = db.relationship('UserDataVersion', backref='user', uselist=False, cascade='all, delete-orphan')
+    report_job_items = db.relationship('ReportJobItem', backref='user', lazy='dynamic', cascade='all, delete-orphan')
+    dirty_report_months = db.relationship('DirtyReportMonth', backref='user', lazy='dynamic', cascade='all, delete-orphan')
+    expense_anomalies = db.relationship('ExpenseAnomaly', backref='user', lazy='dynamic', cascade='all, delete-orphan')
     
     def set_password(self, password):
         """設定密碼（加密）"""
@@ -74,12 +79,61 @@ class Transaction(db.Model):
     __table_args__ = (
         CheckConstraint("type IN ('income', 'expense')", name='check_transaction_type'),
         CheckConstraint("amount > 0", name='check_positive_amount'),
+        # 交易列表 Keyset 分頁使用的複合索引（與排序鍵一致）
+        db.Index('ix_transactions_user_date_created_id', 'user_id', 'date', 'created_at', 'id'),
     )
     
     def __repr__(self):
         return f'<Transaction {self.type} ${self.amount} on {self.date}>'
 
 
+class ExpenseAnomaly(db.Model):
+    """異常支出標記（交易寫入時依同類別的歷史支出判定，儀表板直接讀取）"""
+    __tablename__ = 'expense_anomalies'
+    
+    transaction_id = db.Column(db.Integer, db.ForeignKey('transactions.id', ondelete='CASCADE'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    baseline_mean = db.Column(db.Numeric(12, 2), nullable=False)  # 同類別前 N 筆支出的平均
+    baseline_stddev = db.Column(db.Numeric(12, 2), nullable=False)  # 同類別前 N 筆支出的標準差
+    z_score = db.Column(db.Float)  # 標準差為 0 時為 NULL
+    history_count = db.Column(db.Integer, nullable=False)
+    flagged_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f'<ExpenseAnomaly Transaction {self.transaction_id}>'
+
+
+class DailyRollup(db.Model):
+    """每日彙總模型（依使用者、日期、類型、類別彙總交易金額與筆數）"""
+    __tablename__ = 'daily_rollups'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    type = db.Column(db.String(10), primary_key=True)  # 'income' 或 'expense'
+    category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), primary_key=True)
+    total_amount = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    transaction_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        CheckConstraint("type IN ('income', 'expense')", name='check_rollup_type'),
+    )
+    
+    def __repr__(self):
+        return f'<DailyRollup {self.date} {self.type} ${self.total_amount} ({self.transaction_count})>'
+
+
+class UserDataVersion(db.Model):
+    """使用者資料版本模型（交易、類別、目標異動時遞增，用於快取失效與 ETag）"""
+    __tablename__ = 'user_data_versions'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f'<UserDataVersion User {self.user_id} v{self.version}>'
+
+
 class Goal(db.Model):
     """財務目標模型"""
     __tablename__ = 'goals'
@@ -103,11 +157,13 @@ class Goal(db.Model):
         CheckConstraint("target_amount > 0", name='check_positive_target'),
     )
     
-    def calculate_progress(self):
-        """計算目標進度百分比"""
+    def calculate_progress(self, current_amount=None):
+        """計算目標進度百分比（可傳入即時計算的目前金額）"""
         if self.target_amount == 0:
             return 0
-        progress = (float(self.current_amount) / float(self.target_amount)) * 100
+        if current_amount is None:
+            current_amount = self.current_amount
+        progress = (float(current_amount) / float(self.target_amount)) * 100
         return min(progress, 100)  # 最多 100%
     
     def __repr__(self):
@@ -126,6 +182,7 @@ class MonthlyReport(db.Model):
     total_expense = db.Column(db.Numeric(12, 2), default=0)
     net_amount = db.Column(db.Numeric(12, 2), default=0)
     report_data = db.Column(db.JSON)  # 儲存詳細分析資料
+    payload_hash = db.Column(db.String(64))  # report_data 的 SHA-256，內容未變時略過寫入
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     
     __table_args__ = (
@@ -134,4 +191,60 @@ class MonthlyReport(db.Model):
     )
     
     def __repr__(self):
-        return f'<MonthlyReport {self.year}-{self.month:02d} User {self.user_id}>'
\ No newline at end of file
+        return f'<MonthlyReport {self.year}-{self.month:02d} User {self.user_id}>'
+
+
+class DirtyReportMonth(db.Model):
+    """待重新生成的月報表（交易異動時標記，檢視報表或背景排程時重新生成）"""
+    __tablename__ = 'dirty_report_months'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Integer, primary_key=True)
+    marked_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f'<DirtyReportMonth {self.year}-{self.month:02d} User {self.user_id}>'
+
+
+class ReportJob(db.Model):
+    """月報表批次生成作業模型（每個年月一筆，用於中斷後續跑）"""
+    __tablename__ = 'report_jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='running')  # 'running', 'completed', 'failed'
+    total_users = db.Column(db.Integer, nullable=False, default=0)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = db.Column(db.DateTime)
+    
+    # 關聯
+    items = db.relationship('ReportJobItem', backref='job', lazy='dynamic', cascade='all, delete-orphan')
+    
+    __table_args__ = (
+        db.UniqueConstraint('year', 'month', name='unique_report_job_month'),
+        CheckConstraint("status IN ('running', 'completed', 'failed')", name='check_report_job_status'),
+    )
+    
+    def __repr__(self):
+        return f'<ReportJob {self.year}-{self.month:02d} {self.status}>'
+
+
+class ReportJobItem(db.Model):
+    """月報表批次作業的使用者檢查點（已處理的使用者不會重複生成）"""
+    __tablename__ = 'report_job_items'
+    
+    job_id = db.Column(db.Integer, db.ForeignKey('report_jobs.id'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    status = db.Column(db.String(20), nullable=False)  # 'completed', 'no_data', 'failed'
+    elapsed_ms = db.Column(db.Float, nullable=False, default=0)
+    error = db.Column(db.Text)
+    finished_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    __table_args__ = (
+        CheckConstraint("status IN ('completed', 'no_data', 'failed')", name='check_report_job_item_status'),
+    )
+    
+    def __repr__(self):
+        return f'<ReportJobItem Job {self.job_id} User {self.user_id} {self.status}>'
@@ -1,10 +1,11 @@
-from flask import Blueprint, render_template
+from flask import Blueprint, render_template, jsonify
 from flask_login import login_required, current_user
-from models import Transaction, Goal
-from services.analysis_service import AnalysisService
+from services.dashboard_service import DashboardService
 from services.transaction_service import TransactionService
+from services.data_version_service import DataVersionService
+from utils.http_cache import conditional_response
 from datetime import datetime, timedelta
-from sqlalchemy import func
+from decimal import Decimal
 
 dashboard_bp = Blueprint('dashboard', __name__, url_prefix='/dashboard')
 
@@ -13,101 +14,42 @@ dashboard_bp = Blueprint('dashboard', __name__, url_prefix='/dashboard')
 @login_required
 def index():
     """儀表板首頁"""
-    # 獲取當前月份的統計資料
     today = datetime.now().date()
-    first_day_of_month = today.replace(day=1)
     
-    # 本月收入和支出
-    monthly_income = db.session.query(func.sum(Transaction.amount)).filter(
-        Transaction.user_id == current_user.id,
-        Transaction.type == 'income',
-        Transaction.date >= first_day_of_month
-    ).scalar() or 0
-    
-    monthly_expense = db.session.query(func.sum(Transaction.amount)).filter(
-        Transaction.user_id == current_user.id,
-        Transaction.type == 'expense',
-        Transaction.date >= first_day_of_month
-    ).scalar() or 0
-    
-    # 本月淨收入
-    net_income = float(monthly_income) - float(monthly_expense)
-    
-    # 最近 7 天的交易
-    seven_days_ago = today - timedelta(days=7)
-    recent_transactions = Transaction.query.filter(
-        Transaction.user_id == current_user.id,
-        Transaction.date >= seven_days_ago
-    ).order_by(Transaction.date.desc(), Transaction.created_at.desc()).limit(10).all()
-    
-    # 進行中的目標
-    active_goals = Goal.query.filter(
-        Goal.user_id == current_user.id,
-        Goal.status == 'active'
-    ).all()
-    
-    # 計算每個目標的進度
-    for goal in active_goals:
-        goal.progress = goal.calculate_progress()
-    
-    # 獲取分析和建議
-    analysis_service = AnalysisService(current_user.id)
-    insights = analysis_service.get_monthly_insights()
-    suggestions = analysis_service.get_suggestions()
-    
-    # 獲取本月類別統計（用於圖表）
-    transaction_service = TransactionService(current_user.id)
-    category_stats = transaction_service.get_monthly_category_stats(
-        today.year, today.month
-    )
-    
-    return render_template(
-        'dashboard/index.html',
-        monthly_income=monthly_income,
-        monthly_expense=monthly_expense,
-        net_income=net_income,
-        recent_transactions=recent_transactions,
-        active_goals=active_goals,
-        insights=insights,
-        suggestions=suggestions,
-        category_stats=category_stats
-    )
+    # 資料版本未變動時直接回傳 304
+    etag = DataVersionService(current_user.id).etag('dashboard', today)
+    return conditional_response(etag, lambda: _render_dashboard(today))
+
+
+def _render_dashboard(today):
+    """渲染儀表板（內容由 DashboardService 快取）"""
+    snapshot = DashboardService(current_user.id).get_snapshot(today)
+    return render_template('dashboard/index.html', **snapshot)
 
 
 @dashboard_bp.route('/quick-stats')
 @login_required
 def quick_stats():
     """快速統計資料（AJAX 端點）"""
-    from flask import jsonify
-    
     today = datetime.now().date()
-    
-    # 今日統計
-    today_income = db.session.query(func.sum(Transaction.amount)).filter(
-        Transaction.user_id == current_user.id,
-        Transaction.type == 'income',
-        Transaction.date == today
-    ).scalar() or 0
-    
-    today_expense = db.session.query(func.sum(Transaction.amount)).filter(
-        Transaction.user_id == current_user.id,
-        Transaction.type == 'expense',
-        Transaction.date == today
-    ).scalar() or 0
-    
-    # 本週統計
+    etag = DataVersionService(current_user.id).etag('quick_stats', today)
+    return conditional_response(etag, lambda: _build_quick_stats(today))
+
+
+def _build_quick_stats(today):
+    """計算今日與本週統計"""
+    # 本週統計（按日期分組，一次查詢同時取得今日統計）
     week_start = today - timedelta(days=today.weekday())
-    week_income = db.session.query(func.sum(Transaction.amount)).filter(
-        Transaction.user_id == current_user.id,
-        Transaction.type == 'income',
-        Transaction.date >= week_start
-    ).scalar() or 0
+    transaction_service = TransactionService(current_user.id)
+    by_date = transaction_service.aggregate(week_start, group_by='date')
+    
+    week_income = sum((totals['income'] for totals in by_date.values()), Decimal('0'))
+    week_expense = sum((totals['expense'] for totals in by_date.values()), Decimal('0'))
     
-    week_expense = db.session.query(func.sum(Transaction.amount)).filter(
-        Transaction.user_id == current_user.id,
-        Transaction.type == 'expense',
-        Transaction.date >= week_start
-    ).scalar() or 0
+    # 今日統計
+    today_totals = by_date.get(today)
+    today_income = today_totals['income'] if today_totals else 0
+    today_expense = today_totals['expense'] if today_totals else 0
     
     return jsonify({
         'today': {
@@ -120,8 +62,4 @@ def quick_stats():
             'expense': float(week_expense),
             'net': float(week_income) - float(week_expense)
         }
-    })
-
-
-# 導入 db 以供查詢使用
-from models import db
\ No newline at end of file
+    })
\ No newline at end of file
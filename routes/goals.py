@@ -2,6 +2,8 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_required, current_user
 from models import db, Goal
 from services.goal_service import GoalService
+from services.data_version_service import DataVersionService
+from utils.http_cache import conditional_response
 from datetime import datetime, timedelta
 from decimal import Decimal
 from dateutil.relativedelta import relativedelta
@@ -16,6 +18,13 @@ def index():
     # 獲取篩選參數
     status_filter = request.args.get('status', 'active')  # active, completed, cancelled, all
     
+    # 資料版本未變動時直接回傳 304（進度與逾期狀態與日期相關）
+    etag = DataVersionService(current_user.id).etag('goals', status_filter, datetime.now().date())
+    return conditional_response(etag, lambda: _render_goal_list(status_filter))
+
+
+def _render_goal_list(status_filter):
+    """計算並渲染目標列表"""
     # 建立查詢
     query = Goal.query.filter_by(user_id=current_user.id)
     
@@ -28,15 +37,13 @@ def index():
         Goal.created_at.desc()
     ).all()
     
-    # 計算每個目標的進度
+    # 計算每個目標的進度（進行中的目標即時計算，不寫入資料庫）
     goal_service = GoalService(current_user.id)
+    active_amounts = goal_service.compute_active_goal_progress()
     for goal in goals:
-        goal.progress = goal.calculate_progress()
+        goal.display_amount = active_amounts.get(goal.id, goal.current_amount)
+        goal.progress = goal.calculate_progress(goal.display_amount)
         goal.is_overdue = goal_service.is_goal_overdue(goal)
-        
-        # 對於進行中的目標，更新當前金額
-        if goal.status == 'active':
-            goal_service.update_goal_progress(goal.id)
     
     # 統計資料
     total_goals = Goal.query.filter_by(user_id=current_user.id).count()
@@ -129,6 +136,7 @@ def add():
                 status='active'
             )
             db.session.add(goal)
+            DataVersionService(current_user.id).bump()
             db.session.commit()
             
             # 立即計算初始進度
@@ -193,6 +201,10 @@ def edit(id):
                 goal.name = name
                 goal.target_amount = target_amount
                 goal.end_date = end_date
+                
+                # 期間或目標金額改變後重新計算進度，與修改寫入同一個資料庫交易
+                GoalService(current_user.id).recalculate_progress(goal)
+                DataVersionService(current_user.id).bump()
                 db.session.commit()
                 
                 flash('目標已更新', 'success')
@@ -215,6 +227,7 @@ def delete(id):
     
     try:
         db.session.delete(goal)
+        DataVersionService(current_user.id).bump()
         db.session.commit()
         flash('目標已刪除', 'success')
     except Exception as e:
@@ -233,6 +246,7 @@ def complete(id):
     
     try:
         goal.status = 'completed'
+        DataVersionService(current_user.id).bump()
         db.session.commit()
         flash(f'恭喜！目標「{goal.name}」已完成！', 'success')
     except Exception as e:
@@ -251,6 +265,7 @@ def cancel(id):
     
     try:
         goal.status = 'cancelled'
+        DataVersionService(current_user.id).bump()
         db.session.commit()
         flash('目標已取消', 'info')
     except Exception as e:
@@ -281,6 +296,7 @@ def reactivate(id):
         elif goal.period == 'yearly':
             goal.end_date = goal.start_date + relativedelta(years=1) - timedelta(days=1)
         
+        DataVersionService(current_user.id).bump()
         db.session.commit()
         
         # 更新進度
@@ -302,6 +318,12 @@ def detail(id):
     """目標詳情頁面"""
     goal = Goal.query.filter_by(id=id, user_id=current_user.id).first_or_404()
     
+    etag = DataVersionService(current_user.id).etag('goal_detail', goal.id, datetime.now().date())
+    return conditional_response(etag, lambda: _render_goal_detail(goal))
+
+
+def _render_goal_detail(goal):
+    """計算並渲染目標詳情"""
     # 計算進度
     goal.progress = goal.calculate_progress()
     
@@ -312,6 +334,27 @@ def detail(id):
     return render_template('goals/detail.html', goal=goal, stats=stats)
 
 
+@goals_bp.route('/history/<int:id>')
+@login_required
+def history(id):
+    """目標歷史累計進度（AJAX 端點，?granularity=day|week|month，預設 week）"""
+    goal = Goal.query.filter_by(id=id, user_id=current_user.id).first_or_404()
+    
+    granularity = request.args.get('granularity', 'week')
+    if granularity not in ('day', 'week', 'month'):
+        return jsonify({
+            'success': False,
+            'message': f'不支援的統計粒度: {granularity}'
+        }), 400
+    
+    etag = DataVersionService(current_user.id).etag('goal_history', goal.id, granularity, datetime.now().date())
+    return conditional_response(etag, lambda: jsonify({
+        'success': True,
+        'granularity': granularity,
+        'history': GoalService(current_user.id).get_goal_progress_history(goal.id, granularity)
+    }))
+
+
 @goals_bp.route('/refresh-progress', methods=['POST'])
 @login_required
 def refresh_progress():
@@ -325,13 +368,11 @@ def refresh_progress():
             status='active'
         ).all()
         
+        # 重新計算進度並套用完成規則（只有儲蓄目標會自動完成）
         for goal in active_goals:
-            goal_service.update_goal_progress(goal.id)
-            
-            # 檢查是否達成目標
-            if goal.current_amount >= goal.target_amount:
-                goal.status = 'completed'
+            goal_service.recalculate_progress(goal)
         
+        DataVersionService(current_user.id).bump()
         db.session.commit()
         
         return jsonify({
@@ -0,0 +1,54 @@
+import hmac
+import logging
+import time
+from flask import Blueprint, Response, abort, current_app, jsonify, request
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from models import db
+from utils.db_pool import get_pool_status
+from utils.metrics import collect_runtime_metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+logger = logging.getLogger(__name__)
+
+
+def _has_metrics_token():
+    """請求是否帶有正確的 METRICS_TOKEN"""
+    token = current_app.config.get('METRICS_TOKEN')
+    return bool(token) and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+
+
+@metrics_bp.route('/metrics')
+def index():
+    """Prometheus 文字格式的指標（設定 METRICS_TOKEN 時需以 Bearer token 存取）"""
+    registry = current_app.extensions.get('metrics')
+    if registry is None:
+        abort(404)
+    
+    if current_app.config.get('METRICS_TOKEN') and not _has_metrics_token():
+        abort(401)
+    
+    collect_runtime_metrics(current_app)
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+@metrics_bp.route('/health')
+def health():
+    """健康檢查：執行 SELECT 1，資料庫無法連線或連線池逾時時回傳 503
+    
+    公開回應只有狀態；啟用指標且帶有 METRICS_TOKEN 時才附上查詢耗時與連線池狀態。
+    """
+    started = time.perf_counter()
+    try:
+        db.session.execute(text('SELECT 1'))
+        result = {'status': 'ok'}
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        logger.warning("健康檢查失敗: %s", e)
+        result = {'status': 'error'}
+    
+    if current_app.extensions.get('metrics') is not None and _has_metrics_token():
+        result['database_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        result['pool'] = get_pool_status(db.engine)
+    return jsonify(result), 200 if result['status'] == 'ok' else 503
@@ -2,6 +2,8 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_required, current_user
 from models import db, MonthlyReport
 from services.report_service import ReportService
+from services.data_version_service import DataVersionService
+from utils.http_cache import conditional_response
 from datetime import datetime
 
 reports_bp = Blueprint('reports', __name__, url_prefix='/reports')
@@ -58,6 +60,10 @@ def detail(year, month):
         flash('無效的月份', 'danger')
         return redirect(url_for('reports.index'))
     
+    # 交易異動後報表已過期時重新生成
+    report_service = ReportService(current_user.id)
+    report_service.refresh_dirty_reports([(year, month)])
+    
     # 查找報表
     report = MonthlyReport.query.filter_by(
         user_id=current_user.id,
@@ -67,7 +73,6 @@ def detail(year, month):
     
     # 如果報表不存在，嘗試生成
     if not report:
-        report_service = ReportService(current_user.id)
         report = report_service.generate_monthly_report(year, month)
         
         if not report:
@@ -119,18 +124,7 @@ def generate():
 def regenerate(year, month):
     """重新生成月報表"""
     try:
-        # 刪除舊報表
-        old_report = MonthlyReport.query.filter_by(
-            user_id=current_user.id,
-            year=year,
-            month=month
-        ).first()
-        
-        if old_report:
-            db.session.delete(old_report)
-            db.session.commit()
-        
-        # 生成新報表
+        # 以 upsert 覆寫既有報表（內容未變時不寫入）
         report_service = ReportService(current_user.id)
         report = report_service.generate_monthly_report(year, month)
         
@@ -171,6 +165,10 @@ def compare():
             year2 = year1
             month2 = month1 - 1
     
+    # 交易異動後報表已過期時重新生成
+    report_service = ReportService(current_user.id)
+    report_service.refresh_dirty_reports([(year1, month1), (year2, month2)])
+    
     # 獲取兩個報表
     report1 = MonthlyReport.query.filter_by(
         user_id=current_user.id,
@@ -185,8 +183,6 @@ def compare():
     ).first()
     
     # 如果報表不存在，嘗試生成
-    report_service = ReportService(current_user.id)
-    
     if not report1:
         report1 = report_service.generate_monthly_report(year1, month1)
     
@@ -242,6 +238,9 @@ def summary():
     """年度總結報表"""
     year = request.args.get('year', datetime.now().year, type=int)
     
+    # 交易異動後報表已過期時重新生成
+    ReportService(current_user.id).refresh_dirty_reports([(year, month) for month in range(1, 13)])
+    
     # 獲取該年度的所有月報表
     monthly_reports = MonthlyReport.query.filter_by(
         user_id=current_user.id,
@@ -291,14 +290,16 @@ def export(year, month):
         month=month
     ).first_or_404()
     
-    return jsonify({
+    # 報表內容改變時雜湊值會改變
+    etag = DataVersionService(current_user.id).etag('report_export', report.id, report.payload_hash)
+    return conditional_response(etag, lambda: jsonify({
         'year': report.year,
         'month': report.month,
         'total_income': float(report.total_income),
         'total_expense': float(report.total_expense),
         'net_amount': float(report.net_amount),
         'report_data': report.report_data
-    })
+    }))
 
 
 def calculate_percent_change(old_value, new_value):
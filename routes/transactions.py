@@ -1,91 +1,201 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, abort, Response, stream_with_context
 from flask_login import login_required, current_user
 from models import db, Transaction, Category
+from sqlalchemy.orm import joinedload
 from services.transaction_service import TransactionService
+from services.import_service import ImportService
+from services.data_version_service import DataVersionService
+from utils.pagination import paginate_keyset
 from datetime import datetime, timedelta
 from decimal import Decimal
+import csv
+import io
+import itertools
+import json
 
 transactions_bp = Blueprint('transactions', __name__, url_prefix='/transactions')
 
+# 匯出設定
+EXPORT_COLUMNS = ('date', 'type', 'category', 'amount', 'description')
+EXPORT_BATCH_SIZE = 1000
 
-@transactions_bp.route('/')
-@login_required
-def index():
-    """交易列表頁面"""
-    # 獲取篩選參數
-    transaction_type = request.args.get('type', 'all')  # all, income, expense
-    category_id = request.args.get('category', type=int)
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-    page = request.args.get('page', 1, type=int)
-    per_page = 20
-    
-    # 建立查詢
-    query = Transaction.query.filter_by(user_id=current_user.id)
-    
-    # 應用篩選條件
-    if transaction_type != 'all':
-        query = query.filter_by(type=transaction_type)
-    
-    if category_id:
-        query = query.filter_by(category_id=category_id)
+
+def _parse_filter_args():
+    """從查詢參數解析交易篩選條件"""
+    filters = {
+        'type': request.args.get('type', 'all'),  # all, income, expense
+        'category': request.args.get('category', type=int),
+        'start_date': request.args.get('start_date'),
+        'end_date': request.args.get('end_date')
+    }
     
-    if start_date:
+    start = end = None
+    if filters['start_date']:
         try:
-            start = datetime.strptime(start_date, '%Y-%m-%d').date()
-            query = query.filter(Transaction.date >= start)
+            start = datetime.strptime(filters['start_date'], '%Y-%m-%d').date()
         except ValueError:
             pass
     
-    if end_date:
+    if filters['end_date']:
         try:
-            end = datetime.strptime(end_date, '%Y-%m-%d').date()
-            query = query.filter(Transaction.date <= end)
+            end = datetime.strptime(filters['end_date'], '%Y-%m-%d').date()
         except ValueError:
             pass
     
-    # 排序和分頁
-    transactions = query.order_by(
-        Transaction.date.desc(), 
-        Transaction.created_at.desc()
-    ).paginate(page=page, per_page=per_page, error_out=False)
+    return filters, start, end
+
+
+def _apply_filters(query, filters, start, end):
+    """對交易查詢套用篩選條件"""
+    query = query.filter(Transaction.user_id == current_user.id)
+    
+    if filters['type'] != 'all':
+        query = query.filter(Transaction.type == filters['type'])
+    
+    if filters['category']:
+        query = query.filter(Transaction.category_id == filters['category'])
+    
+    if start:
+        query = query.filter(Transaction.date >= start)
+    
+    if end:
+        query = query.filter(Transaction.date <= end)
+    
+    return query
+
+
+@transactions_bp.route('/')
+@login_required
+def index():
+    """交易列表頁面"""
+    # 獲取篩選參數
+    filters, start, end = _parse_filter_args()
+    transaction_type = filters['type']
+    category_id = filters['category']
+    after = request.args.get('after')
+    before = request.args.get('before')
+    show_count = request.args.get('count') == '1'
+    per_page = 20
+    
+    # 建立查詢並應用篩選條件（類別以 JOIN 一併載入，避免每列各查一次）
+    query = _apply_filters(
+        Transaction.query.options(joinedload(Transaction.category, innerjoin=True)),
+        filters, start, end
+    )
+    
+    # 排序和分頁（以 (date, created_at, id) 為游標，深層頁面也不需 OFFSET 掃描）
+    transactions = paginate_keyset(
+        query,
+        (Transaction.date, Transaction.created_at, Transaction.id),
+        per_page=per_page,
+        after=after,
+        before=before
+    )
     
     # 獲取所有類別供篩選使用
     categories = Category.query.filter_by(user_id=current_user.id).order_by(Category.type, Category.name).all()
     
     # 計算篩選結果的統計
-    total_income = db.session.query(db.func.sum(Transaction.amount)).filter(
-        Transaction.user_id == current_user.id,
-        Transaction.type == 'income'
-    )
-    if start_date:
-        total_income = total_income.filter(Transaction.date >= start)
-    if end_date:
-        total_income = total_income.filter(Transaction.date <= end)
-    total_income = total_income.scalar() or 0
-    
-    total_expense = db.session.query(db.func.sum(Transaction.amount)).filter(
-        Transaction.user_id == current_user.id,
-        Transaction.type == 'expense'
-    )
-    if start_date:
-        total_expense = total_expense.filter(Transaction.date >= start)
-    if end_date:
-        total_expense = total_expense.filter(Transaction.date <= end)
-    total_expense = total_expense.scalar() or 0
+    transaction_service = TransactionService(current_user.id)
+    totals = transaction_service.aggregate(start, end)
+    total_income = totals['income']
+    total_expense = totals['expense']
+    
+    # 總筆數僅在使用者要求時計算
+    total_count = None
+    if show_count:
+        total_count = transaction_service.count_transactions(
+            transaction_type=transaction_type if transaction_type != 'all' else None,
+            category_id=category_id,
+            start_date=start,
+            end_date=end
+        )
     
     return render_template(
         'transactions/index.html',
         transactions=transactions,
         categories=categories,
-        filters={
-            'type': transaction_type,
-            'category': category_id,
-            'start_date': start_date,
-            'end_date': end_date
-        },
+        filters=filters,
         total_income=total_income,
-        total_expense=total_expense
+        total_expense=total_expense,
+        total_count=total_count
+    )
+
+
+@transactions_bp.route('/export')
+@login_required
+def export():
+    """以串流方式匯出篩選後的交易（CSV 或 NDJSON）"""
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'ndjson'):
+        abort(400)
+    
+    filters, start, end = _parse_filter_args()
+    
+    # 只取需要的欄位，並以 yield_per 使用伺服器端游標分批讀取，記憶體用量與筆數無關
+    query = _apply_filters(
+        db.session.query(
+            Transaction.date,
+            Transaction.type,
+            Category.name,
+            Transaction.amount,
+            Transaction.description
+        ).join(Category, Transaction.category_id == Category.id),
+        filters, start, end
+    ).order_by(
+        Transaction.date,
+        Transaction.created_at,
+        Transaction.id
+    ).execution_options(yield_per=EXPORT_BATCH_SIZE)
+    
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        
+        for index, (t_date, t_type, category_name, amount, description) in enumerate(query, start=1):
+            writer.writerow([t_date.strftime('%Y-%m-%d'), t_type, category_name, str(amount), description or ''])
+            
+            if index % EXPORT_BATCH_SIZE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+        
+        yield buffer.getvalue()
+    
+    def generate_ndjson():
+        lines = []
+        
+        for t_date, t_type, category_name, amount, description in query:
+            lines.append(json.dumps({
+                'date': t_date.strftime('%Y-%m-%d'),
+                'type': t_type,
+                'category': category_name,
+                'amount': str(amount),
+                'description': description
+            }, ensure_ascii=False))
+            
+            if len(lines) >= EXPORT_BATCH_SIZE:
+                yield '\n'.join(lines) + '\n'
+                lines = []
+        
+        if lines:
+            yield '\n'.join(lines) + '\n'
+    
+    filename = f"transactions_{datetime.now().strftime('%Y%m%d')}.{export_format}"
+    
+    if export_format == 'csv':
+        # 加上 BOM 讓 Excel 正確辨識 UTF-8
+        body = itertools.chain(['\ufeff'], generate_csv())
+        mimetype = 'text/csv'
+    else:
+        body = generate_ndjson()
+        mimetype = 'application/x-ndjson'
+    
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
     )
 
 
@@ -157,11 +267,11 @@ def add():
                 description=description
             )
             db.session.add(transaction)
-            db.session.commit()
             
-            # 更新相關目標進度
-            transaction_service = TransactionService(current_user.id)
-            transaction_service.update_goals_progress()
+            # 在同一個資料庫交易中更新每日彙總和相關目標進度
+            TransactionService(current_user.id).record_transaction_added(transaction)
+            DataVersionService(current_user.id).bump()
+            db.session.commit()
             
             flash('交易記錄已成功新增', 'success')
             return redirect(url_for('transactions.index'))
@@ -229,15 +339,18 @@ def edit(id):
         else:
             # 更新交易記錄
             try:
+                # 先扣除舊值的彙總與目標進度，再計入新值
+                transaction_service = TransactionService(current_user.id)
+                transaction_service.record_transaction_removed(transaction)
+                
                 transaction.category_id = category_id
                 transaction.amount = amount
                 transaction.date = transaction_date
                 transaction.description = description
-                db.session.commit()
                 
-                # 更新相關目標進度
-                transaction_service = TransactionService(current_user.id)
-                transaction_service.update_goals_progress()
+                transaction_service.record_transaction_added(transaction)
+                DataVersionService(current_user.id).bump()
+                db.session.commit()
                 
                 flash('交易記錄已更新', 'success')
                 return redirect(url_for('transactions.index'))
@@ -263,13 +376,11 @@ def delete(id):
     transaction = Transaction.query.filter_by(id=id, user_id=current_user.id).first_or_404()
     
     try:
+        TransactionService(current_user.id).record_transaction_removed(transaction)
         db.session.delete(transaction)
+        DataVersionService(current_user.id).bump()
         db.session.commit()
         
-        # 更新相關目標進度
-        transaction_service = TransactionService(current_user.id)
-        transaction_service.update_goals_progress()
-        
         flash('交易記錄已刪除', 'success')
     except Exception as e:
         db.session.rollback()
@@ -279,6 +390,40 @@ def delete(id):
     return redirect(url_for('transactions.index'))
 
 
+@transactions_bp.route('/import', methods=['GET', 'POST'])
+@login_required
+def import_csv():
+    """批次匯入交易（CSV）"""
+    result = None
+    
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        create_categories = request.form.get('create_categories') == 'on'
+        
+        if not upload or not upload.filename:
+            flash('請選擇要匯入的 CSV 檔案', 'danger')
+            return render_template('transactions/import.html', result=result)
+        
+        try:
+            # 以串流方式讀取上傳檔案，不將整個檔案載入記憶體
+            text_stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+            import_service = ImportService(current_user.id, create_categories=create_categories)
+            result = import_service.import_csv(text_stream)
+            
+            if result['imported']:
+                flash(f"已匯入 {result['imported']} 筆交易", 'success')
+            if result['skipped'] or result['errors']:
+                flash(f"有 {result['skipped']} 筆資料未匯入，請檢查錯誤訊息", 'warning')
+        
+        except UnicodeDecodeError:
+            flash('檔案編碼錯誤，請使用 UTF-8 編碼的 CSV 檔案', 'danger')
+        except Exception as e:
+            flash('匯入失敗，請稍後再試', 'danger')
+            print(f"匯入交易錯誤: {e}")
+    
+    return render_template('transactions/import.html', result=result)
+
+
 @transactions_bp.route('/categories')
 @login_required
 def categories():
@@ -330,6 +475,7 @@ def add_category():
             is_default=False
         )
         db.session.add(category)
+        DataVersionService(current_user.id).bump()
         db.session.commit()
         flash('類別已新增', 'success')
     except Exception as e:
@@ -359,6 +505,7 @@ def delete_category(id):
     
     try:
         db.session.delete(category)
+        DataVersionService(current_user.id).bump()
         db.session.commit()
         flash('類別已刪除', 'success')
     except Exception as e:
@@ -1,9 +1,12 @@
-from models import db, Transaction, Category, Goal
-from services.transaction_service import TransactionService
+from flask import current_app
+from models import db, Goal
+from services.transaction_service import TransactionService, get_month_range, shift_month
 from services.goal_service import GoalService
-from sqlalchemy import func
+from services.anomaly_service import AnomalyService
+from services.analytics_backend import get_analytics_backend
 from datetime import datetime, timedelta
 from decimal import Decimal
+from utils.request_scope import get_service
 
 
 class AnalysisService:
@@ -11,8 +14,85 @@ class AnalysisService:
     
     def __init__(self, user_id):
         self.user_id = user_id
-        self.transaction_service = TransactionService(user_id)
-        self.goal_service = GoalService(user_id)
+        # 同一個請求內共用服務實例與查詢結果
+        self.transaction_service = get_service(TransactionService, user_id)
+        self.goal_service = get_service(GoalService, user_id)
+        self._backend = None
+        self._backend_loaded = False
+    
+    def _get_backend(self):
+        """取得已載入最近 ANALYTICS_WINDOW_MONTHS 個月交易的 NumPy 分析後端（未啟用時回傳 None）"""
+        if not self._backend_loaded:
+            today = datetime.now().date()
+            window = max(current_app.config.get('ANALYTICS_WINDOW_MONTHS', 6), 6)
+            start_date = get_month_range(*shift_month(today.year, today.month, 1 - window))[0]
+            end_date = get_month_range(today.year, today.month)[1]
+            
+            self._backend = get_analytics_backend(self.user_id, start_date, end_date)
+            self._backend_loaded = True
+        
+        return self._backend
+    
+    def _get_monthly_trend(self, months):
+        """最近 N 個月（含本月，N ≤ 6）的收支矩陣，提供 summary / category_stats
+        
+        啟用 NumPy 後端時以向量化計算，否則以單一分組查詢取得。
+        """
+        backend = self._get_backend()
+        if backend:
+            return backend
+        return self.transaction_service.get_monthly_trend(months)
+    
+    def _get_monthly_summary(self, year, month):
+        """月度摘要（啟用 NumPy 後端時由已載入的陣列計算）"""
+        backend = self._get_backend()
+        if backend and backend.covers(year, month):
+            return backend.summary(year, month)
+        return self.transaction_service.get_monthly_summary(year, month)
+    
+    def _get_monthly_category_stats(self, year, month):
+        """月度類別統計（啟用 NumPy 後端時由已載入的陣列計算）"""
+        backend = self._get_backend()
+        if backend and backend.covers(year, month):
+            return backend.category_stats(year, month)
+        return self.transaction_service.get_monthly_category_stats(year, month)
+    
+    def get_spending_by_weekday(self, year, month):
+        """按星期幾統計的支出（格式同 TransactionService.get_spending_by_weekday）"""
+        backend = self._get_backend()
+        if backend and backend.covers(year, month):
+            return backend.spending_by_weekday(year, month)
+        return self.transaction_service.get_spending_by_weekday(year, month)
+    
+    def get_savings_rate_trend(self, months=None):
+        """最近 N 個月（含本月，預設 ANALYTICS_WINDOW_MONTHS）的收入、支出與儲蓄率，由舊到新
+        
+        無收入的月份儲蓄率為 None。啟用 NumPy 後端且 N 不超過載入期間時以向量化計算，
+        否則以單一分組查詢取得。
+        """
+        if months is None:
+            months = current_app.config.get('ANALYTICS_WINDOW_MONTHS', 6)
+        
+        backend = self._get_backend()
+        if backend:
+            trend = backend.monthly_trend()
+            if months <= len(trend):
+                return trend[-months:]
+        
+        trend = self.transaction_service.get_monthly_trend(months)
+        result = []
+        for year, month in trend.months:
+            totals = trend.totals(year, month)
+            income, expense = totals['income'], totals['expense']
+            result.append({
+                'year': year,
+                'month': month,
+                'total_income': float(income),
+                'total_expense': float(expense),
+                'net_amount': float(income - expense),
+                'savings_rate': float((income - expense) / income * 100) if income > 0 else None
+            })
+        return result
     
     def get_monthly_insights(self):
         """獲取本月的分析見解"""
@@ -21,7 +101,7 @@ class AnalysisService:
         current_month = today.month
         
         # 獲取本月摘要
-        summary = self.transaction_service.get_monthly_summary(current_year, current_month)
+        summary = self._get_monthly_summary(current_year, current_month)
         
         insights = []
         
@@ -104,21 +184,12 @@ class AnalysisService:
         """分析支出趨勢"""
         today = datetime.now().date()
         
-        # 獲取最近三個月的支出
-        expenses = []
-        for i in range(3):
-            month_offset = i
-            if today.month - month_offset < 1:
-                year = today.year - 1
-                month = 12 + (today.month - month_offset)
-            else:
-                year = today.year
-                month = today.month - month_offset
-            
-            summary = self.transaction_service.get_monthly_summary(year, month)
-            expenses.append(summary['total_expense'])
-        
-        expenses.reverse()  # 從舊到新排序
+        # 獲取最近三個月的支出（從舊到新排序）
+        trend = self._get_monthly_trend(3)
+        expenses = [
+            trend.summary(*shift_month(today.year, today.month, offset))['total_expense']
+            for offset in range(-2, 1)
+        ]
         
         # 檢查趨勢
         if len(expenses) >= 2:
@@ -146,34 +217,22 @@ class AnalysisService:
         today = datetime.now().date()
         thirty_days_ago = today - timedelta(days=30)
         
-        # 獲取最近 30 天的支出
-        recent_expenses = Transaction.query.filter(
-            Transaction.user_id == self.user_id,
-            Transaction.type == 'expense',
-            Transaction.date >= thirty_days_ago,
-            Transaction.date <= today
-        ).all()
+        # 異常標記在交易寫入時已判定，此處只讀取最近 30 天金額最大的一筆
+        anomalies = get_service(AnomalyService, self.user_id).get_flagged_expenses(thirty_days_ago, today, limit=1)
         
-        if not recent_expenses:
+        if not anomalies:
             return None
         
-        # 計算平均值和標準差
-        amounts = [float(t.amount) for t in recent_expenses]
-        avg_amount = sum(amounts) / len(amounts)
-        
-        # 找出異常高額支出（超過平均值 2 倍）
-        abnormal = [t for t in recent_expenses if float(t.amount) > avg_amount * 2]
-        
-        if abnormal:
-            max_abnormal = max(abnormal, key=lambda t: t.amount)
-            return {
-                'type': 'info',
-                'icon': '🔍',
-                'title': '發現高額支出',
-                'message': f'在「{max_abnormal.category.name}」類別有 ${float(max_abnormal.amount):.2f} 的大額支出'
-            }
-        
-        return None
+        anomaly = anomalies[0]
+        return {
+            'type': 'info',
+            'icon': '🔍',
+            'title': '發現高額支出',
+            'message': (
+                f'在「{anomaly["category"]}」類別有 ${anomaly["amount"]:.2f} 的大額支出'
+                f'（該類別近期平均 ${anomaly["mean"]:.2f}）'
+            )
+        }
     
     def _get_goal_reminders(self):
         """獲取目標進度提醒"""
@@ -184,11 +243,11 @@ class AnalysisService:
             status='active'
         ).all()
         
+        # 即時計算進度（不寫入資料庫）
+        amounts = self.goal_service.compute_active_goal_progress()
+        
         for goal in active_goals:
-            # 更新進度
-            self.goal_service.update_goal_progress(goal.id)
-            
-            progress = goal.calculate_progress()
+            progress = goal.calculate_progress(amounts.get(goal.id))
             
             # 即將完成的目標
             if 80 <= progress < 100:
@@ -228,9 +287,7 @@ class AnalysisService:
     def _suggest_budget_optimization(self):
         """建議預算優化"""
         today = datetime.now().date()
-        current_month_summary = self.transaction_service.get_monthly_summary(
-            today.year, today.month
-        )
+        current_month_summary = self._get_monthly_summary(today.year, today.month)
         
         # 如果支出超過收入
         if current_month_summary['net_amount'] < 0:
@@ -250,9 +307,7 @@ class AnalysisService:
         today = datetime.now().date()
         
         # 獲取本月類別統計
-        category_stats = self.transaction_service.get_monthly_category_stats(
-            today.year, today.month
-        )
+        category_stats = self._get_monthly_category_stats(today.year, today.month)
         
         if not category_stats['expense']:
             return suggestions
@@ -288,9 +343,7 @@ class AnalysisService:
     def _suggest_savings_improvement(self):
         """建議提高儲蓄"""
         today = datetime.now().date()
-        summary = self.transaction_service.get_monthly_summary(
-            today.year, today.month
-        )
+        summary = self._get_monthly_summary(today.year, today.month)
         
         if summary['total_income'] == 0:
             return None
@@ -351,29 +404,18 @@ class AnalysisService:
         """生成詳細的支出分析報告"""
         today = datetime.now().date()
         
-        # 獲取最近 6 個月的資料
+        # 獲取最近 6 個月的資料（從舊到新排序）
+        trend = self._get_monthly_trend(6)
         monthly_data = []
-        for i in range(6):
-            month_offset = i
-            if today.month - month_offset < 1:
-                year = today.year - ((month_offset - today.month + 1) // 12 + 1)
-                month = 12 - ((month_offset - today.month) % 12)
-            else:
-                year = today.year
-                month = today.month - month_offset
-            
-            summary = self.transaction_service.get_monthly_summary(year, month)
-            category_stats = self.transaction_service.get_monthly_category_stats(year, month)
-            
+        for offset in range(-5, 1):
+            year, month = shift_month(today.year, today.month, offset)
             monthly_data.append({
                 'year': year,
                 'month': month,
-                'summary': summary,
-                'categories': category_stats
+                'summary': trend.summary(year, month),
+                'categories': trend.category_stats(year, month)
             })
         
-        monthly_data.reverse()  # 從舊到新排序
-        
         # 計算趨勢
         expenses = [m['summary']['total_expense'] for m in monthly_data]
         avg_expense = sum(expenses) / len(expenses) if expenses else 0
@@ -406,5 +448,7 @@ class AnalysisService:
                 {'category': cat, 'average': avg}
                 for cat, avg in top_categories
             ],
+            'savings_rate_trend': self.get_savings_rate_trend(6),
+            'weekday_spending': self.get_spending_by_weekday(today.year, today.month),
             'trend': 'increasing' if expenses[-1] > avg_expense * 1.1 else 'decreasing' if expenses[-1] < avg_expense * 0.9 else 'stable'
         }
\ No newline at end of file
@@ -0,0 +1,173 @@
+from flask import current_app
+from sqlalchemy import cast, func, BigInteger
+from models import db, Transaction, Category
+from services.transaction_service import get_month_range
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+WEEKDAY_NAMES = ['週一', '週二', '週三', '週四', '週五', '週六', '週日']
+
+
+def get_analytics_backend(user_id, start_date, end_date):
+    """依設定取得分析後端（ANALYTICS_BACKEND=numpy 時回傳已載入資料的 NumpyLedger，否則回傳 None）"""
+    if current_app.config.get('ANALYTICS_BACKEND', 'python') != 'numpy':
+        return None
+    
+    if np is None:
+        raise RuntimeError("使用 NumPy 分析後端需要安裝 numpy 套件（pip install numpy）")
+    
+    return NumpyLedger(user_id).load(start_date, end_date)
+
+
+class NumpyLedger:
+    """以 NumPy 欄位陣列進行分析計算
+    
+    一次載入使用者在指定期間的交易（日期、金額分、類別代碼、類型），
+    月度摘要、類別統計、每月趨勢與儲蓄率、星期分布皆以 bincount 等向量化運算計算，
+    載入多年資料時也只需一次查詢與數次陣列運算。
+    summary / category_stats 的介面與 MonthlyTrend 相同。金額以整數（分）累加，結果與列順序無關。
+    """
+    
+    def __init__(self, user_id):
+        self.user_id = user_id
+    
+    def load(self, start_date, end_date):
+        """載入期間內的交易為欄位陣列"""
+        rows = db.session.query(
+            Transaction.date,
+            Transaction.type == 'expense',
+            cast(func.round(Transaction.amount * 100), BigInteger),
+            Transaction.category_id
+        ).filter(
+            Transaction.user_id == self.user_id,
+            Transaction.date >= start_date,
+            Transaction.date <= end_date
+        ).all()
+        
+        dates, is_expense, cents, category_ids = zip(*rows) if rows else ((), (), (), ())
+        
+        self.start_date = start_date
+        self.end_date = end_date
+        self.days = np.array(dates, dtype='datetime64[D]')
+        self.months = self.days.astype('datetime64[M]').astype(np.int64)
+        self.is_expense = np.array(is_expense, dtype=bool)
+        self.cents = np.array(cents, dtype=np.int64)
+        
+        # 類別以名稱分組（與彙總查詢相同），代碼依名稱排序
+        names = dict(db.session.query(Category.id, Category.name).filter(Category.user_id == self.user_id))
+        self.category_names = sorted(set(names.values()))
+        name_codes = {name: code for code, name in enumerate(self.category_names)}
+        unique_ids, inverse = np.unique(np.array(category_ids, dtype=np.int64), return_inverse=True)
+        id_codes = np.array([name_codes[names[int(category_id)]] for category_id in unique_ids], dtype=np.int64)
+        self.category_codes = id_codes[inverse] if len(unique_ids) else np.zeros(0, dtype=np.int64)
+        
+        return self
+    
+    @staticmethod
+    def _month_index(year, month):
+        return (year - 1970) * 12 + (month - 1)
+    
+    def covers(self, year, month):
+        """月份是否完整在已載入的期間內"""
+        start_date, end_date = get_month_range(year, month)
+        return self.start_date <= start_date and end_date <= self.end_date
+    
+    def _month_mask(self, year, month):
+        if not self.covers(year, month):
+            raise ValueError(f'{year}-{month:02d} 不在已載入的期間內')
+        return self.months == self._month_index(year, month)
+    
+    @staticmethod
+    def _to_float(cents):
+        return int(cents) / 100
+    
+    def summary(self, year, month):
+        """月度摘要（同 TransactionService.get_monthly_summary）"""
+        mask = self._month_mask(year, month)
+        expense_mask = mask & self.is_expense
+        income_mask = mask & ~self.is_expense
+        
+        income = int(self.cents[income_mask].sum())
+        expense = int(self.cents[expense_mask].sum())
+        income_count = int(income_mask.sum())
+        expense_count = int(expense_mask.sum())
+        
+        return {
+            'year': year,
+            'month': month,
+            'total_income': self._to_float(income),
+            'total_expense': self._to_float(expense),
+            'net_amount': self._to_float(income - expense),
+            'income_count': income_count,
+            'expense_count': expense_count,
+            'total_count': income_count + expense_count
+        }
+    
+    def category_stats(self, year, month):
+        """月度類別統計（同 TransactionService.get_monthly_category_stats）"""
+        mask = self._month_mask(year, month)
+        size = len(self.category_names)
+        stats = {}
+        
+        for transaction_type, type_mask in (('income', ~self.is_expense), ('expense', self.is_expense)):
+            selected = mask & type_mask
+            codes = self.category_codes[selected]
+            totals = np.bincount(codes, weights=self.cents[selected], minlength=size)
+            counts = np.bincount(codes, minlength=size)
+            
+            stats[transaction_type] = [
+                {'category': self.category_names[code], 'amount': self._to_float(round(totals[code]))}
+                for code in np.flatnonzero(counts)
+            ]
+        
+        return stats
+    
+    def monthly_trend(self):
+        """期間內每月的收入、支出與儲蓄率（由舊到新，無收入的月份儲蓄率為 None）"""
+        first = self._month_index(self.start_date.year, self.start_date.month)
+        size = self._month_index(self.end_date.year, self.end_date.month) - first + 1
+        offsets = self.months - first
+        
+        income = np.rint(np.bincount(
+            offsets[~self.is_expense], weights=self.cents[~self.is_expense], minlength=size
+        )).astype(np.int64)
+        expense = np.rint(np.bincount(
+            offsets[self.is_expense], weights=self.cents[self.is_expense], minlength=size
+        )).astype(np.int64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rates = np.where(income > 0, (income - expense) / income * 100, np.nan)
+        
+        return [
+            {
+                'year': (first + offset) // 12 + 1970,
+                'month': (first + offset) % 12 + 1,
+                'total_income': self._to_float(income[offset]),
+                'total_expense': self._to_float(expense[offset]),
+                'net_amount': self._to_float(income[offset] - expense[offset]),
+                'savings_rate': None if np.isnan(rates[offset]) else float(rates[offset])
+            }
+            for offset in range(size)
+        ]
+    
+    def spending_by_weekday(self, year, month):
+        """按星期幾統計的支出（同 TransactionService.get_spending_by_weekday）"""
+        selected = self._month_mask(year, month) & self.is_expense
+        # 1970-01-01 為週四，位移 3 天後 0 為週一
+        weekdays = (self.days[selected].astype(np.int64) + 3) % 7
+        totals = np.bincount(weekdays, weights=self.cents[selected], minlength=7)
+        counts = np.bincount(weekdays, minlength=7)
+        
+        result = []
+        for weekday in range(7):
+            total = self._to_float(round(totals[weekday]))
+            count = int(counts[weekday])
+            result.append({
+                'weekday': WEEKDAY_NAMES[weekday],
+                'total': total,
+                'count': count,
+                'average': total / count if count > 0 else 0
+            })
+        return result
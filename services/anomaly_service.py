@@ -0,0 +1,258 @@
+import math
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import select, func, insert, or_, and_
+from models import db, Transaction, Category, ExpenseAnomaly
+
+
+class AnomalyService:
+    """異常支出偵測服務
+    
+    以視窗函數在資料庫中計算每筆支出之前、同類別最近 N 筆支出的平均與標準差，
+    金額同時高於「平均 + Z × 標準差」與「平均 × (1 + 最小增幅)」時判定為異常，查詢只回傳被標記的列。
+    交易寫入時即判定並存入 expense_anomalies（由呼叫端 commit），儀表板直接讀取標記。
+    補登較早日期、修改或刪除支出時，同類別之後的支出歷史視窗也會改變，會一併重新判定。
+    """
+    
+    def __init__(self, user_id):
+        self.user_id = user_id
+        config = current_app.config
+        self.history_size = config.get('ANOMALY_HISTORY_SIZE', 30)
+        self.min_history = config.get('ANOMALY_MIN_HISTORY', 5)
+        self.z_threshold = config.get('ANOMALY_Z_THRESHOLD', 3.0)
+        self.min_ratio = config.get('ANOMALY_MIN_RATIO', 0.5)
+    
+    def _flagged_query(self, start_date, end_date=None, category_id=None, transaction_id=None, exclude_id=None):
+        """期間內被判定為異常的支出（含類別名稱與歷史統計）
+        
+        歷史視窗為同類別依 (日期, id) 排序的前 N 筆支出，不另以日期截斷，
+        因此單筆寫入時的判定與任何期間的 refresh() 結果一致；變異數以 avg(x²) - avg(x)² 計算，與門檻比較時取平方，不需要資料庫支援 sqrt / stddev。
+        exclude_id 的交易不納入計算（即將刪除或修改的交易）。
+        """
+        window = {
+            'partition_by': Transaction.category_id,
+            'order_by': (Transaction.date, Transaction.id),
+            'rows': (-self.history_size, -1)
+        }
+        
+        filters = [
+            Transaction.user_id == self.user_id,
+            Transaction.type == 'expense'
+        ]
+        if end_date is not None:
+            filters.append(Transaction.date <= end_date)
+        if category_id is not None:
+            filters.append(Transaction.category_id == category_id)
+        if exclude_id is not None:
+            filters.append(Transaction.id != exclude_id)
+        
+        history = select(
+            Transaction.id,
+            Transaction.date,
+            Transaction.amount,
+            Transaction.description,
+            Transaction.category_id,
+            func.avg(Transaction.amount).over(**window).label('mean'),
+            func.avg(Transaction.amount * Transaction.amount).over(**window).label('mean_square'),
+            func.count(Transaction.id).over(**window).label('history_count')
+        ).where(*filters).subquery()
+        
+        variance = history.c.mean_square - history.c.mean * history.c.mean
+        deviation = history.c.amount - history.c.mean
+        
+        query = select(
+            history.c.id,
+            history.c.date,
+            history.c.amount,
+            history.c.description,
+            history.c.mean,
+            variance.label('variance'),
+            history.c.history_count,
+            Category.name
+        ).join(Category, Category.id == history.c.category_id).where(
+            history.c.date >= start_date,
+            history.c.history_count >= self.min_history,
+            history.c.amount > history.c.mean * (1 + self.min_ratio),
+            deviation * deviation > variance * (self.z_threshold ** 2)
+        )
+        
+        if transaction_id is not None:
+            query = query.where(history.c.id == transaction_id)
+        
+        return query.order_by(history.c.date.desc(), history.c.id.desc())
+    
+    @staticmethod
+    def _to_result(row):
+        """將查詢列轉為結果字典"""
+        amount = float(row.amount)
+        mean = float(row.mean)
+        stddev = math.sqrt(max(float(row.variance), 0))
+        
+        return {
+            'transaction_id': row.id,
+            'date': row.date,
+            'amount': amount,
+            'description': row.description,
+            'category': row.name,
+            'mean': mean,
+            'stddev': stddev,
+            'z_score': (amount - mean) / stddev if stddev > 0 else None,
+            'history_count': row.history_count
+        }
+    
+    def detect(self, start_date, end_date=None, category_id=None, exclude_id=None):
+        """即時計算期間內的異常支出（依日期新到舊）"""
+        rows = db.session.execute(self._flagged_query(
+            start_date, end_date, category_id=category_id, exclude_id=exclude_id
+        )).all()
+        return [self._to_result(row) for row in rows]
+    
+    def _later_expenses(self, transaction):
+        """同類別依 (日期, id) 排在此交易之後的支出查詢"""
+        return select(Transaction.date).where(
+            Transaction.user_id == self.user_id,
+            Transaction.type == 'expense',
+            Transaction.category_id == transaction.category_id,
+            Transaction.id != transaction.id,
+            or_(
+                Transaction.date > transaction.date,
+                and_(Transaction.date == transaction.date, Transaction.id > transaction.id)
+            )
+        )
+    
+    def _has_later_expenses(self, transaction):
+        """同類別是否有排在此交易之後的支出（其歷史視窗可能包含此交易）"""
+        return db.session.scalar(self._later_expenses(transaction).limit(1)) is not None
+    
+    def _refresh_following(self, transaction, exclude=False):
+        """重新判定同類別之後 N 筆歷史視窗會包含此交易的支出，回傳異常結果"""
+        # 第 N 筆之後的支出，歷史視窗已不含此交易；不足 N 筆時判定到最後一筆
+        end_date = db.session.scalar(
+            self._later_expenses(transaction)
+            .order_by(Transaction.date, Transaction.id)
+            .offset(self.history_size - 1)
+            .limit(1)
+        )
+        return self._replace_flags(
+            transaction.date,
+            end_date,
+            category_id=transaction.category_id,
+            exclude_id=transaction.id if exclude else None
+        )
+    
+    def flag_transaction(self, transaction):
+        """交易寫入後判定是否異常，異常時寫入標記並回傳結果
+        
+        補登的日期早於同類別其他支出時，之後的支出一併重新判定。
+        """
+        if transaction.type != 'expense':
+            return None
+        
+        if transaction.id is None:
+            db.session.flush()
+        
+        if self._has_later_expenses(transaction):
+            anomalies = self._refresh_following(transaction)
+            return next((result for result in anomalies if result['transaction_id'] == transaction.id), None)
+        
+        row = db.session.execute(self._flagged_query(
+            transaction.date, transaction.date,
+            category_id=transaction.category_id,
+            transaction_id=transaction.id
+        )).first()
+        
+        if row is None:
+            return None
+        
+        result = self._to_result(row)
+        db.session.execute(insert(ExpenseAnomaly), [self._anomaly_values(result)])
+        return result
+    
+    def unflag_transaction(self, transaction):
+        """交易刪除前（或編輯修改欄位前）移除其異常標記
+        
+        同類別之後的支出以不含此交易的歷史視窗重新判定。
+        """
+        if transaction.id is None:
+            return
+        
+        db.session.execute(
+            ExpenseAnomaly.__table__.delete().where(ExpenseAnomaly.transaction_id == transaction.id)
+        )
+        
+        if transaction.type == 'expense' and self._has_later_expenses(transaction):
+            self._refresh_following(transaction, exclude=True)
+    
+    def refresh(self, start_date, end_date=None, category_id=None):
+        """重新判定期間內所有支出的異常標記（批次匯入與補建使用），回傳標記筆數"""
+        return len(self._replace_flags(start_date, end_date, category_id=category_id))
+    
+    def _replace_flags(self, start_date, end_date=None, category_id=None, exclude_id=None):
+        """刪除期間內的既有標記後重新判定並寫入，回傳異常結果"""
+        transaction_ids = select(Transaction.id).where(
+            Transaction.user_id == self.user_id,
+            Transaction.date >= start_date
+        )
+        if end_date is not None:
+            transaction_ids = transaction_ids.where(Transaction.date <= end_date)
+        if category_id is not None:
+            transaction_ids = transaction_ids.where(Transaction.category_id == category_id)
+        
+        db.session.execute(
+            ExpenseAnomaly.__table__.delete().where(ExpenseAnomaly.transaction_id.in_(transaction_ids))
+        )
+        
+        anomalies = self.detect(start_date, end_date, category_id=category_id, exclude_id=exclude_id)
+        if anomalies:
+            db.session.execute(insert(ExpenseAnomaly), [self._anomaly_values(result) for result in anomalies])
+        
+        return anomalies
+    
+    def _anomaly_values(self, result):
+        """異常結果轉為 expense_anomalies 的欄位值"""
+        return {
+            'transaction_id': result['transaction_id'],
+            'user_id': self.user_id,
+            'baseline_mean': round(result['mean'], 2),
+            'baseline_stddev': round(result['stddev'], 2),
+            'z_score': result['z_score'],
+            'history_count': result['history_count'],
+            'flagged_at': datetime.utcnow()
+        }
+    
+    def get_flagged_expenses(self, start_date, end_date, limit=None):
+        """讀取期間內已標記的異常支出（依金額由大到小）"""
+        query = db.session.query(
+            Transaction.id,
+            Transaction.date,
+            Transaction.amount,
+            Transaction.description,
+            Category.name,
+            ExpenseAnomaly.baseline_mean,
+            ExpenseAnomaly.baseline_stddev,
+            ExpenseAnomaly.z_score,
+            ExpenseAnomaly.history_count
+        ).select_from(ExpenseAnomaly).join(
+            Transaction, Transaction.id == ExpenseAnomaly.transaction_id
+        ).join(
+            Category, Category.id == Transaction.category_id
+        ).filter(
+            ExpenseAnomaly.user_id == self.user_id,
+            Transaction.date >= start_date,
+            Transaction.date <= end_date
+        ).order_by(Transaction.amount.desc(), Transaction.id.desc())
+        
+        if limit:
+            query = query.limit(limit)
+        
+        return [{
+            'transaction_id': row.id,
+            'date': row.date,
+            'amount': float(row.amount),
+            'description': row.description,
+            'category': row.name,
+            'mean': float(row.baseline_mean),
+            'stddev': float(row.baseline_stddev),
+            'z_score': row.z_score,
+            'history_count': row.history_count
+        } for row in query.all()]
@@ -0,0 +1,104 @@
+from models import db, Transaction, Category, Goal
+from services.transaction_service import TransactionService
+from services.analysis_service import AnalysisService
+from services.goal_service import GoalService
+from services.data_version_service import DataVersionService
+from utils.cache import get_cache, user_cache_key
+from utils.request_scope import get_service
+from datetime import timedelta
+
+
+class DashboardService:
+    """儀表板資料服務
+    
+    將計算完成的儀表板內容以使用者為單位快取，
+    快照記錄資料版本與日期，任一不符即重新計算；交易與目標異動時會主動清除。
+    """
+    
+    def __init__(self, user_id):
+        self.user_id = user_id
+    
+    def get_snapshot(self, today):
+        """取得儀表板內容（優先使用快取）"""
+        cache = get_cache()
+        key = user_cache_key('dashboard', self.user_id)
+        version = DataVersionService(self.user_id).get_version()
+        
+        cached = cache.get(key)
+        if cached and cached['version'] == version and cached['date'] == today:
+            return cached['payload']
+        
+        payload = self.build_snapshot(today)
+        cache.set(key, {'version': version, 'date': today, 'payload': payload})
+        return payload
+    
+    def build_snapshot(self, today):
+        """計算儀表板內容（只包含可序列化的基本型別）"""
+        # 獲取當前月份的統計資料
+        first_day_of_month = today.replace(day=1)
+        
+        # 本月收入和支出
+        transaction_service = get_service(TransactionService, self.user_id)
+        monthly_totals = transaction_service.aggregate(first_day_of_month)
+        monthly_income = monthly_totals['income']
+        monthly_expense = monthly_totals['expense']
+        
+        # 本月淨收入
+        net_income = float(monthly_income) - float(monthly_expense)
+        
+        # 最近 7 天的交易（直接聯結類別名稱）
+        seven_days_ago = today - timedelta(days=7)
+        recent_rows = db.session.query(
+            Transaction.date,
+            Transaction.type,
+            Category.name,
+            Transaction.amount,
+            Transaction.description
+        ).join(Category, Transaction.category_id == Category.id).filter(
+            Transaction.user_id == self.user_id,
+            Transaction.date >= seven_days_ago
+        ).order_by(Transaction.date.desc(), Transaction.created_at.desc()).limit(10).all()
+        
+        recent_transactions = [{
+            'date': t_date,
+            'type': t_type,
+            'category_name': category_name,
+            'amount': amount,
+            'description': description
+        } for t_date, t_type, category_name, amount, description in recent_rows]
+        
+        # 進行中的目標及進度（即時計算，不寫入資料庫）
+        goal_amounts = get_service(GoalService, self.user_id).compute_active_goal_progress()
+        active_goals = []
+        for goal in Goal.query.filter(
+            Goal.user_id == self.user_id,
+            Goal.status == 'active'
+        ).all():
+            current_amount = goal_amounts.get(goal.id, goal.current_amount)
+            active_goals.append({
+                'name': goal.name,
+                'progress': goal.calculate_progress(current_amount),
+                'current_amount': current_amount,
+                'target_amount': goal.target_amount
+            })
+        
+        # 獲取分析和建議
+        analysis_service = get_service(AnalysisService, self.user_id)
+        insights = analysis_service.get_monthly_insights()
+        suggestions = analysis_service.get_suggestions()
+        
+        # 獲取本月類別統計（用於圖表）
+        category_stats = transaction_service.get_monthly_category_stats(
+            today.year, today.month
+        )
+        
+        return {
+            'monthly_income': monthly_income,
+            'monthly_expense': monthly_expense,
+            'net_income': net_income,
+            'recent_transactions': recent_transactions,
+            'active_goals': active_goals,
+            'insights': insights,
+            'suggestions': suggestions,
+            'category_stats': category_stats
+        }
@@ -0,0 +1,70 @@
+from models import db, UserDataVersion
+from utils.cache import invalidate_user_cache
+from utils.request_scope import clear_request_memo
+from datetime import datetime
+import hashlib
+
+
+class DataVersionService:
+    """使用者資料版本服務
+    
+    每次交易、類別或目標異動時遞增版本號，
+    快取與 ETag 可以 (user_id, version) 作為鍵，資料未變動時直接沿用。
+    """
+    
+    def __init__(self, user_id):
+        self.user_id = user_id
+    
+    def get_version(self):
+        """取得目前的資料版本"""
+        version = db.session.query(UserDataVersion.version).filter(
+            UserDataVersion.user_id == self.user_id
+        ).scalar()
+        return version or 0
+    
+    def bump(self):
+        """遞增資料版本（需在與資料異動相同的資料庫交易中呼叫，由呼叫端 commit）"""
+        self.bump_many([self.user_id])
+    
+    @staticmethod
+    def bump_many(user_ids):
+        """一次遞增多位使用者的資料版本（批次作業使用，由呼叫端 commit）"""
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        
+        dialect = db.session.get_bind().dialect.name
+        table = UserDataVersion.__table__
+        now = datetime.utcnow()
+        
+        if dialect in ('postgresql', 'sqlite'):
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            
+            stmt = dialect_insert(table).values(version=1, updated_at=now)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['user_id'],
+                set_={'version': table.c.version + 1, 'updated_at': now}
+            )
+            db.session.execute(stmt, [{'user_id': user_id} for user_id in user_ids])
+        else:
+            for user_id in user_ids:
+                record = UserDataVersion.query.filter_by(user_id=user_id).with_for_update().first()
+                if record:
+                    record.version = record.version + 1
+                    record.updated_at = now
+                else:
+                    db.session.add(UserDataVersion(user_id=user_id, version=1, updated_at=now))
+            db.session.flush()
+        
+        # 主動清除本程序的快取（其他程序由版本比對失效）
+        for user_id in user_ids:
+            invalidate_user_cache(user_id)
+        clear_request_memo()
+    
+    def etag(self, *parts):
+        """以 (user_id, version, 其他參數) 產生 ETag"""
+        key = '|'.join(str(part) for part in (self.user_id, self.get_version()) + parts)
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
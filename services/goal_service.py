@@ -1,7 +1,10 @@
-from models import db, Goal, Transaction
-from sqlalchemy import func
-from datetime import datetime, date
+from models import db, Goal, Transaction, DailyRollup
+from sqlalchemy import func, case, bindparam
+from services.transaction_service import TransactionService
+from datetime import datetime, date, timedelta
 from decimal import Decimal
+from calendar import monthrange
+from utils.request_scope import request_memoize, get_service
 
 
 class GoalService:
@@ -14,6 +17,14 @@ class GoalService:
         """更新目標進度"""
         goal = Goal.query.filter_by(id=goal_id, user_id=self.user_id).first()
         
+        if self.recalculate_progress(goal) is None:
+            return None
+        
+        db.session.commit()
+        return goal
+    
+    def recalculate_progress(self, goal):
+        """依目標期間的收支重新計算目前金額並套用完成規則（不 commit，供呼叫端併入同一個資料庫交易）"""
         if not goal or goal.status != 'active':
             return None
         
@@ -49,39 +60,129 @@ class GoalService:
             # 因為支出可能會繼續增加
             pass
         
-        db.session.commit()
         return goal
     
+    @request_memoize
+    def compute_active_goal_progress(self):
+        """以單一分組查詢計算所有進行中目標的目前金額（唯讀，不修改目標資料）
+        
+        回傳 {goal_id: 目前金額}：儲蓄目標為期間淨收入，支出限制目標為期間總支出。
+        持久化 current_amount 與 status 由寫入路徑與排程負責。
+        """
+        rows = self.active_goal_progress_query().filter(Goal.user_id == self.user_id).all()
+        return {row.id: self.progress_amount(row) for row in rows}
+    
+    @staticmethod
+    def active_goal_progress_query():
+        """進行中目標與其期間收支合計的分組查詢（goals LEFT JOIN daily_rollups）"""
+        today = datetime.now().date()
+        window_end = func.coalesce(Goal.end_date, today)
+        
+        return db.session.query(
+            Goal.id,
+            Goal.user_id,
+            Goal.goal_type,
+            Goal.target_amount,
+            Goal.current_amount,
+            func.sum(case((DailyRollup.type == 'income', DailyRollup.total_amount), else_=0)).label('income'),
+            func.sum(case((DailyRollup.type == 'expense', DailyRollup.total_amount), else_=0)).label('expense')
+        ).outerjoin(
+            DailyRollup,
+            db.and_(
+                DailyRollup.user_id == Goal.user_id,
+                DailyRollup.date >= Goal.start_date,
+                DailyRollup.date <= window_end
+            )
+        ).filter(
+            Goal.status == 'active'
+        ).group_by(
+            Goal.id, Goal.user_id, Goal.goal_type, Goal.target_amount, Goal.current_amount
+        )
+    
+    @staticmethod
+    def progress_amount(row):
+        """由 active_goal_progress_query 的結果列計算目標的目前金額"""
+        income = Decimal(str(row.income or 0))
+        expense = Decimal(str(row.expense or 0))
+        return income - expense if row.goal_type == 'saving' else expense
+    
+    @staticmethod
+    def bulk_apply_progress(updates):
+        """批次寫入目標金額與狀態（單一 executemany UPDATE，由呼叫端 commit）
+        
+        updates 為 [{'goal_id', 'current_amount', 'status'}]，只更新仍為進行中的目標。
+        """
+        if not updates:
+            return 0
+        
+        table = Goal.__table__
+        result = db.session.execute(
+            table.update().where(
+                table.c.id == bindparam('goal_id'),
+                table.c.status == 'active'
+            ).values(
+                current_amount=bindparam('new_amount'),
+                status=bindparam('new_status')
+            ),
+            [
+                {
+                    'goal_id': item['goal_id'],
+                    'new_amount': item['current_amount'],
+                    'new_status': item['status']
+                }
+                for item in updates
+            ]
+        )
+        return result.rowcount
+    
+    def apply_transaction_delta(self, transaction_date, transaction_type, amount):
+        """依單筆交易的增減量調整目標進度（不重新掃描交易）
+        
+        amount 為帶正負號的金額：新增交易為正、刪除為負，編輯視為刪除舊值再新增新值。
+        只更新期間涵蓋交易日期的進行中目標，需由呼叫端 commit。
+        """
+        amount = Decimal(str(amount))
+        today = datetime.now().date()
+        
+        query = Goal.query.filter(
+            Goal.user_id == self.user_id,
+            Goal.status == 'active',
+            Goal.start_date <= transaction_date
+        )
+        
+        # 未設結束日期的目標只計算到今天
+        if transaction_date <= today:
+            query = query.filter(db.or_(Goal.end_date == None, Goal.end_date >= transaction_date))
+        else:
+            query = query.filter(Goal.end_date >= transaction_date)
+        
+        if transaction_type == 'income':
+            # 收入只影響儲蓄目標
+            query = query.filter(Goal.goal_type == 'saving')
+            delta = case((Goal.goal_type == 'saving', amount), else_=0)
+        else:
+            # 支出：儲蓄目標減少、支出限制目標增加
+            delta = case((Goal.goal_type == 'saving', -amount), else_=amount)
+        
+        new_amount = func.coalesce(Goal.current_amount, 0) + delta
+        
+        return query.update({
+            Goal.current_amount: new_amount,
+            # 儲蓄目標達成時標記為完成（與 update_goal_progress 規則相同）
+            Goal.status: case(
+                (db.and_(Goal.goal_type == 'saving', new_amount >= Goal.target_amount), 'completed'),
+                else_=Goal.status
+            )
+        }, synchronize_session=False)
+    
     def _calculate_net_income(self, start_date, end_date):
         """計算淨收入（收入 - 支出）"""
-        # 計算總收入
-        total_income = db.session.query(func.sum(Transaction.amount)).filter(
-            Transaction.user_id == self.user_id,
-            Transaction.type == 'income',
-            Transaction.date >= start_date,
-            Transaction.date <= end_date
-        ).scalar() or Decimal('0')
-        
-        # 計算總支出
-        total_expense = db.session.query(func.sum(Transaction.amount)).filter(
-            Transaction.user_id == self.user_id,
-            Transaction.type == 'expense',
-            Transaction.date >= start_date,
-            Transaction.date <= end_date
-        ).scalar() or Decimal('0')
-        
-        return total_income - total_expense
+        totals = get_service(TransactionService, self.user_id).aggregate(start_date, end_date)
+        return totals['income'] - totals['expense']
     
     def _calculate_total_expense(self, start_date, end_date):
         """計算總支出"""
-        total_expense = db.session.query(func.sum(Transaction.amount)).filter(
-            Transaction.user_id == self.user_id,
-            Transaction.type == 'expense',
-            Transaction.date >= start_date,
-            Transaction.date <= end_date
-        ).scalar() or Decimal('0')
-        
-        return total_expense
+        return get_service(TransactionService, self.user_id).aggregate(start_date, end_date)['expense']
     
     def is_goal_overdue(self, goal):
         """檢查目標是否已過期"""
@@ -162,38 +263,83 @@ class GoalService:
             'recent_transactions': transactions
         }
     
-    def get_goal_progress_history(self, goal_id):
-        """獲取目標的歷史進度（按週統計）"""
+    def get_goal_progress_history(self, goal_id, granularity='week'):
+        """獲取目標的歷史累計進度（granularity: day / week / month）
+        
+        以單一分組查詢取得每日金額，並用視窗函數計算累計值，查詢次數與目標期間長短無關。
+        """
+        if granularity not in ('day', 'week', 'month'):
+            raise ValueError(f'不支援的統計粒度: {granularity}')
+        
         goal = Goal.query.filter_by(id=goal_id, user_id=self.user_id).first()
         
         if not goal:
             return []
         
-        from datetime import timedelta
-        
-        history = []
-        current_date = goal.start_date
         today = datetime.now().date()
         end_date = min(goal.end_date or today, today)
         
-        while current_date <= end_date:
-            # 計算到當前日期的進度
-            if goal.goal_type == 'saving':
-                amount = self._calculate_net_income(goal.start_date, current_date)
-            else:
-                amount = self._calculate_total_expense(goal.start_date, current_date)
+        if goal.goal_type == 'saving':
+            daily_amount = func.sum(case(
+                (DailyRollup.type == 'income', DailyRollup.total_amount),
+                else_=-DailyRollup.total_amount
+            ))
+        else:
+            daily_amount = func.sum(case(
+                (DailyRollup.type == 'expense', DailyRollup.total_amount),
+                else_=0
+            ))
+        
+        rows = db.session.query(
+            DailyRollup.date,
+            func.sum(daily_amount).over(order_by=DailyRollup.date)
+        ).filter(
+            DailyRollup.user_id == self.user_id,
+            DailyRollup.date >= goal.start_date,
+            DailyRollup.date <= end_date
+        ).group_by(DailyRollup.date).order_by(DailyRollup.date).all()
+        
+        history = []
+        target = float(goal.target_amount)
+        amount = Decimal('0')
+        index = 0
+        
+        for checkpoint in self._history_checkpoints(goal.start_date, end_date, granularity):
+            # 取到檢查點（含）為止的最後一筆累計值
+            while index < len(rows) and rows[index][0] <= checkpoint:
+                amount = Decimal(str(rows[index][1] or 0))
+                index += 1
             
             history.append({
-                'date': current_date.strftime('%Y-%m-%d'),
+                'date': checkpoint.strftime('%Y-%m-%d'),
                 'amount': float(amount),
-                'progress': (float(amount) / float(goal.target_amount) * 100) if goal.target_amount > 0 else 0
+                'progress': (float(amount) / target * 100) if target > 0 else 0
             })
-            
-            # 每週記錄一次
-            current_date += timedelta(days=7)
         
         return history
     
+    @staticmethod
+    def _history_checkpoints(start_date, end_date, granularity):
+        """產生歷史進度的檢查日期（自開始日起每日、每週或每月同一天）"""
+        if granularity == 'month':
+            months = 0
+            while True:
+                year = start_date.year + (start_date.month - 1 + months) // 12
+                month = (start_date.month - 1 + months) % 12 + 1
+                # 當月天數不足時取該月最後一天
+                checkpoint = date(year, month, min(start_date.day, monthrange(year, month)[1]))
+                if checkpoint > end_date:
+                    return
+                yield checkpoint
+                months += 1
+        
+        step = timedelta(days=1 if granularity == 'day' else 7)
+        checkpoint = start_date
+        while checkpoint <= end_date:
+            yield checkpoint
+            checkpoint += step
+    
+    @request_memoize
     def get_all_active_goals_summary(self):
         """獲取所有進行中目標的摘要"""
         active_goals = Goal.query.filter_by(
@@ -209,11 +355,12 @@ class GoalService:
             'goals': []
         }
         
+        # 即時計算進度（不寫入資料庫）
+        amounts = self.compute_active_goal_progress()
+        
         for goal in active_goals:
-            # 更新進度
-            self.update_goal_progress(goal.id)
-            
-            progress = goal.calculate_progress()
+            current_amount = amounts.get(goal.id, goal.current_amount)
+            progress = goal.calculate_progress(current_amount)
             is_overdue = self.is_goal_overdue(goal)
             
             # 計算預期進度
@@ -240,7 +387,7 @@ class GoalService:
                 'name': goal.name,
                 'progress': progress,
                 'status': status,
-                'current_amount': float(goal.current_amount),
+                'current_amount': float(current_amount),
                 'target_amount': float(goal.target_amount)
             })
         
@@ -289,6 +436,3 @@ class GoalService:
             })
         
         return suggestions
-
-
-from datetime import timedelta
\ No newline at end of file
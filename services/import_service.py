@@ -0,0 +1,172 @@
+import csv
+from datetime import datetime
+from decimal import Decimal
+from models import db, Transaction, Category
+from services.rollup_service import RollupService
+from services.report_service import ReportService
+from services.anomaly_service import AnomalyService
+from services.data_version_service import DataVersionService
+from utils.validators import validate_amount, validate_date, validate_transaction_type, sanitize_string
+
+
+class ImportService:
+    """交易批次匯入服務
+    
+    以串流方式逐列解析 CSV，驗證後分批寫入：
+    Postgres（psycopg3）使用 COPY，其他資料庫使用 executemany。
+    每日彙總與目標進度在整批匯入結束後一次更新。
+    """
+    
+    # CSV 欄位：date, type, category, amount, description
+    REQUIRED_COLUMNS = ('date', 'type', 'category', 'amount')
+    BATCH_SIZE = 5000
+    MAX_ERRORS = 100
+    
+    def __init__(self, user_id, create_categories=False):
+        self.user_id = user_id
+        self.create_categories = create_categories
+        self._category_cache = None
+    
+    def import_csv(self, text_stream):
+        """匯入 CSV 文字串流，回傳匯入結果統計"""
+        result = {'imported': 0, 'skipped': 0, 'errors': []}
+        
+        reader = csv.DictReader(text_stream)
+        fieldnames = [name.strip().lower() for name in (reader.fieldnames or [])]
+        missing = [col for col in self.REQUIRED_COLUMNS if col not in fieldnames]
+        if missing:
+            result['errors'].append(f"缺少欄位: {', '.join(missing)}")
+            return result
+        reader.fieldnames = fieldnames
+        
+        batch = []
+        rollup_deltas = {}
+        created_at = datetime.utcnow()
+        
+        try:
+            # 第 1 列為標題，資料從第 2 列開始
+            for line_no, row in enumerate(reader, start=2):
+                parsed, error = self._parse_row(row)
+                
+                if error:
+                    result['skipped'] += 1
+                    if len(result['errors']) < self.MAX_ERRORS:
+                        result['errors'].append(f"第 {line_no} 列: {error}")
+                    continue
+                
+                parsed['created_at'] = created_at
+                batch.append(parsed)
+                
+                key = (parsed['date'], parsed['type'], parsed['category_id'])
+                amount_total, count = rollup_deltas.get(key, (Decimal('0'), 0))
+                rollup_deltas[key] = (amount_total + parsed['amount'], count + 1)
+                
+                if len(batch) >= self.BATCH_SIZE:
+                    self._insert_batch(batch)
+                    result['imported'] += len(batch)
+                    batch = []
+            
+            if batch:
+                self._insert_batch(batch)
+                result['imported'] += len(batch)
+            
+            # 在同一個資料庫交易中更新每日彙總並標記受影響的月報表
+            RollupService(self.user_id).apply_deltas(rollup_deltas)
+            ReportService(self.user_id).mark_months_dirty(
+                {(transaction_date.year, transaction_date.month) for transaction_date, _, _ in rollup_deltas}
+            )
+            if rollup_deltas:
+                # 匯入的交易會改變之後支出的歷史基準，自最早的匯入日期起重新判定
+                AnomalyService(self.user_id).refresh(min(transaction_date for transaction_date, _, _ in rollup_deltas))
+            if result['imported']:
+                DataVersionService(self.user_id).bump()
+            db.session.commit()
+        
+        except Exception:
+            db.session.rollback()
+            raise
+        
+        # 匯入結束後一次更新目標進度
+        if result['imported']:
+            from services.transaction_service import TransactionService
+            TransactionService(self.user_id).update_goals_progress()
+        
+        return result
+    
+    def _parse_row(self, row):
+        """驗證並轉換單列資料，回傳 (資料, 錯誤訊息)"""
+        transaction_type = (row.get('type') or '').strip().lower()
+        is_valid, message = validate_transaction_type(transaction_type)
+        if not is_valid:
+            return None, message
+        
+        is_valid, message, amount = validate_amount((row.get('amount') or '').strip())
+        if not is_valid:
+            return None, message
+        
+        is_valid, message, transaction_date = validate_date((row.get('date') or '').strip())
+        if not is_valid:
+            return None, message
+        
+        category_name = sanitize_string(row.get('category'), max_length=50)
+        if not category_name:
+            return None, "類別不能為空"
+        
+        category_id = self._resolve_category(category_name, transaction_type)
+        if category_id is None:
+            return None, f"找不到類別「{category_name}」"
+        
+        return {
+            'user_id': self.user_id,
+            'category_id': category_id,
+            'amount': amount,
+            'type': transaction_type,
+            'description': sanitize_string(row.get('description')) or None,
+            'date': transaction_date
+        }, None
+    
+    def _resolve_category(self, name, transaction_type):
+        """從匯入期間的快取解析類別名稱"""
+        if self._category_cache is None:
+            self._category_cache = {
+                (c_name, c_type): c_id
+                for c_id, c_name, c_type in db.session.query(
+                    Category.id, Category.name, Category.type
+                ).filter(Category.user_id == self.user_id)
+            }
+        
+        key = (name, transaction_type)
+        if key not in self._category_cache:
+            if not self.create_categories:
+                return None
+            
+            category = Category(
+                user_id=self.user_id,
+                name=name,
+                type=transaction_type,
+                is_default=False
+            )
+            db.session.add(category)
+            db.session.flush()
+            self._category_cache[key] = category.id
+        
+        return self._category_cache[key]
+    
+    def _insert_batch(self, batch):
+        """批次寫入交易"""
+        bind = db.session.get_bind()
+        
+        if bind.dialect.name == 'postgresql' and bind.dialect.driver == 'psycopg':
+            self._copy_batch(batch)
+        else:
+            db.session.execute(Transaction.__table__.insert(), batch)
+    
+    def _copy_batch(self, batch):
+        """使用 Postgres COPY 寫入（與 session 共用同一個連線與交易）"""
+        columns = ('user_id', 'category_id', 'amount', 'type', 'description', 'date', 'created_at')
+        raw_connection = db.session.connection().connection.driver_connection
+        
+        with raw_connection.cursor() as cursor:
+            with cursor.copy(f"COPY transactions ({', '.join(columns)}) FROM STDIN") as copy:
+                for row in batch:
+                    copy.write_row(tuple(row[col] for col in columns))
@@ -0,0 +1,219 @@
+import logging
+import math
+import multiprocessing
+import threading
+import time
+from datetime import datetime
+from models import db, User, ReportJob, ReportJobItem
+
+logger = logging.getLogger(__name__)
+
+# fork 出的工作程序沿用父程序建立的應用程式（由 initializer 重建連線池）
+_worker_app = None
+
+
+def _init_worker():
+    """工作程序初始化：丟棄自父程序繼承的連線，讓每個程序使用自己的連線池"""
+    with _worker_app.app_context():
+        db.engine.dispose(close=False)
+
+
+def _generate_chunk(args):
+    """在工作程序中為一批使用者生成月報表，回傳每位使用者的結果"""
+    year, month, user_ids = args
+    
+    with _worker_app.app_context():
+        try:
+            return generate_reports_for_users(year, month, user_ids)
+        finally:
+            db.session.remove()
+
+
+def generate_reports_for_users(year, month, user_ids):
+    """依序為多位使用者生成月報表（單一使用者失敗不影響其他使用者）"""
+    from services.report_service import ReportService
+    
+    results = []
+    for user_id in user_ids:
+        started = time.perf_counter()
+        
+        try:
+            report = ReportService(user_id).generate_monthly_report(year, month)
+            status, error = ('completed' if report else 'no_data'), None
+        except Exception as e:
+            db.session.rollback()
+            status, error = 'failed', str(e)
+        
+        results.append({
+            'user_id': user_id,
+            'status': status,
+            'elapsed_ms': (time.perf_counter() - started) * 1000,
+            'error': error
+        })
+    
+    return results
+
+
+class ReportBatchRunner:
+    """月報表批次生成
+    
+    將使用者分批交給 multiprocessing 程序池平行處理（只在單執行緒的 CLI 程序中 fork，
+    排程器以子程序執行 flask reports generate），
+    每批完成後將已處理的使用者寫入 report_job_items 作為檢查點，
+    中斷後再次執行同一年月會略過已完成的使用者。
+    """
+    
+    def __init__(self, app, year, month, workers=None, chunk_size=None):
+        self.app = app
+        self.year = year
+        self.month = month
+        self.workers = workers or app.config.get('REPORT_WORKERS', 1)
+        self.chunk_size = chunk_size or app.config.get('REPORT_CHUNK_SIZE', 50)
+    
+    def run(self, force=False):
+        """執行批次生成（需在應用程式上下文中呼叫），回傳執行統計"""
+        job = self._get_or_create_job(force)
+        job_id = job.id
+        
+        done_user_ids = {
+            row[0] for row in db.session.query(ReportJobItem.user_id).filter(
+                ReportJobItem.job_id == job_id,
+                ReportJobItem.status != 'failed'
+            )
+        }
+        user_ids = [
+            row[0] for row in db.session.query(User.id).order_by(User.id)
+            if row[0] not in done_user_ids
+        ]
+        
+        job.status = 'running'
+        job.total_users = len(done_user_ids) + len(user_ids)
+        job.finished_at = None
+        db.session.commit()
+        
+        if done_user_ids:
+            logger.info(f"續跑 {self.year}-{self.month:02d} 月報表作業，略過已處理的 {len(done_user_ids)} 位使用者")
+        
+        chunks = [
+            (self.year, self.month, user_ids[i:i + self.chunk_size])
+            for i in range(0, len(user_ids), self.chunk_size)
+        ]
+        
+        started = time.perf_counter()
+        timings = []
+        
+        try:
+            for results in self._map_chunks(chunks):
+                self._checkpoint(job_id, results)
+                timings.extend(result['elapsed_ms'] for result in results)
+                logger.info(
+                    f"已處理 {len(timings)}/{len(user_ids)} 位使用者"
+                    f"（{len(timings) / max(time.perf_counter() - started, 1e-9):.1f} 位/秒）"
+                )
+        except Exception:
+            db.session.rollback()
+            db.session.get(ReportJob, job_id).status = 'failed'
+            db.session.commit()
+            raise
+        
+        elapsed = time.perf_counter() - started
+        # 程序池模式會重設 session，需重新取得作業記錄
+        job = db.session.get(ReportJob, job_id)
+        job.status = 'completed'
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        
+        stats = self.get_job_stats(job)
+        stats.update({
+            'processed_users': len(timings),
+            'elapsed_seconds': elapsed,
+            'users_per_second': len(timings) / elapsed if elapsed > 0 else 0,
+            'p50_ms': self._percentile(timings, 50),
+            'p95_ms': self._percentile(timings, 95)
+        })
+        return stats
+    
+    def _get_or_create_job(self, force):
+        """取得此年月的作業記錄，force 時清除既有檢查點重新執行"""
+        job = ReportJob.query.filter_by(year=self.year, month=self.month).first()
+        
+        if job is None:
+            job = ReportJob(year=self.year, month=self.month, status='running')
+            db.session.add(job)
+            db.session.flush()
+        elif force:
+            job.items.delete(synchronize_session=False)
+            job.started_at = datetime.utcnow()
+        
+        return job
+    
+    def _map_chunks(self, chunks):
+        """將各批次分派給程序池，依完成順序回傳結果"""
+        global _worker_app
+        
+        parallel = self.workers > 1 and len(chunks) > 1 and 'fork' in multiprocessing.get_all_start_methods()
+        if parallel and threading.active_count() > 1:
+            # fork 只複製目前執行緒，其他執行緒持有的鎖（日誌、快取、連線池）在子程序中永遠不會釋放
+            logger.warning("目前程序有多個執行緒（例如 web worker 或排程器），改為在本程序依序生成")
+            parallel = False
+        
+        if not parallel:
+            for year, month, user_ids in chunks:
+                yield generate_reports_for_users(year, month, user_ids)
+            return
+        
+        # 父程序不可在 fork 時持有連線
+        db.session.remove()
+        db.engine.dispose()
+        _worker_app = self.app
+        
+        context = multiprocessing.get_context('fork')
+        with context.Pool(processes=self.workers, initializer=_init_worker) as pool:
+            yield from pool.imap_unordered(_generate_chunk, chunks)
+    
+    def _checkpoint(self, job_id, results):
+        """寫入一批使用者的處理結果"""
+        now = datetime.utcnow()
+        
+        for result in results:
+            db.session.merge(ReportJobItem(
+                job_id=job_id,
+                user_id=result['user_id'],
+                status=result['status'],
+                elapsed_ms=result['elapsed_ms'],
+                error=result['error'],
+                finished_at=now
+            ))
+            
+            if result['error']:
+                logger.error(f"生成使用者 {result['user_id']} 的月報表時發生錯誤: {result['error']}")
+        
+        db.session.commit()
+    
+    @staticmethod
+    def _percentile(values, percent):
+        """計算百分位數（最近排名法）"""
+        if not values:
+            return 0
+        ordered = sorted(values)
+        index = max(0, math.ceil(percent / 100 * len(ordered)) - 1)
+        return ordered[index]
+    
+    @staticmethod
+    def get_job_stats(job):
+        """彙總作業中各狀態的使用者數"""
+        counts = {'completed': 0, 'no_data': 0, 'failed': 0}
+        for status, count in db.session.query(
+            ReportJobItem.status, db.func.count()
+        ).filter(ReportJobItem.job_id == job.id).group_by(ReportJobItem.status):
+            counts[status] = count
+        
+        return {
+            'year': job.year,
+            'month': job.month,
+            'status': job.status,
+            'total_users': job.total_users,
+            'completed': counts['completed'],
+            'no_data': counts['no_data'],
+            'failed': counts['failed']
+        }
@@ -1,7 +1,12 @@
-from models import db, MonthlyReport, Transaction, Category, Goal
-from services.transaction_service import TransactionService
-from datetime import datetime
+from models import db, MonthlyReport, Transaction, Category, Goal, DirtyReportMonth, DailyRollup
+from services.transaction_service import TransactionService, get_month_range
+from sqlalchemy import func, case, tuple_
+from datetime import datetime, timedelta
 from decimal import Decimal
+import hashlib
+import heapq
+import json
+from utils.request_scope import get_service
 
 
 class ReportService:
@@ -9,40 +14,45 @@ class ReportService:
     
     def __init__(self, user_id):
         self.user_id = user_id
-        self.transaction_service = TransactionService(user_id)
+        self.transaction_service = get_service(TransactionService, user_id)
     
     def generate_monthly_report(self, year, month):
-        """生成月報表"""
-        # 檢查是否已存在報表
-        existing_report = MonthlyReport.query.filter_by(
+        """生成月報表
+        
+        以 upsert 寫入（同一個資料庫交易中清除待重新生成標記），
+        計算結果的總額與內容雜湊與既有報表相同時不寫入。
+        """
+        # 清除待重新生成標記（之後的交易異動會重新標記）
+        DirtyReportMonth.query.filter_by(
             user_id=self.user_id,
             year=year,
             month=month
-        ).first()
-        
-        # 如果已存在，先刪除
-        if existing_report:
-            db.session.delete(existing_report)
-            db.session.commit()
+        ).delete(synchronize_session=False)
         
-        # 獲取月度摘要
-        summary = self.transaction_service.get_monthly_summary(year, month)
+        # 單次查詢當月交易，計算摘要與各項明細
+        sections = self._build_month_sections(year, month)
+        summary = sections['summary']
         
-        # 如果沒有任何交易，返回 None
+        # 如果沒有任何交易，刪除既有報表並返回 None
         if summary['total_count'] == 0:
+            MonthlyReport.query.filter_by(
+                user_id=self.user_id,
+                year=year,
+                month=month
+            ).delete(synchronize_session=False)
+            db.session.commit()
             return None
         
-        # 獲取詳細資料
-        category_stats = self.transaction_service.get_monthly_category_stats(year, month)
-        daily_stats = self.transaction_service.get_daily_stats(year, month)
-        top_expenses = self.transaction_service.get_top_expenses(year, month)
-        weekday_stats = self.transaction_service.get_spending_by_weekday(year, month)
+        category_stats = sections['category_stats']
+        daily_stats = sections['daily_stats']
+        top_expenses = sections['top_expenses']
+        weekday_stats = sections['weekday_stats']
         
         # 獲取目標相關資料
         goals_data = self._get_monthly_goals_data(year, month)
         
         # 計算同比、環比資料
-        comparison_data = self._calculate_comparison(year, month)
+        comparison_data = self._calculate_comparison(year, month, current_summary=summary)
         
         # 組織報表資料
         report_data = {
@@ -56,21 +66,264 @@ class ReportService:
             'insights': self._generate_insights(summary, category_stats, comparison_data)
         }
         
-        # 建立報表記錄
-        report = MonthlyReport(
+        values = {
+            'total_income': Decimal(str(summary['total_income'])),
+            'total_expense': Decimal(str(summary['total_expense'])),
+            'net_amount': Decimal(str(summary['net_amount'])),
+            'report_data': report_data,
+            'payload_hash': self._payload_hash(report_data)
+        }
+        
+        # 總額與內容都未改變時略過寫入
+        stored = db.session.query(
+            MonthlyReport.total_income,
+            MonthlyReport.total_expense,
+            MonthlyReport.net_amount,
+            MonthlyReport.payload_hash
+        ).filter_by(user_id=self.user_id, year=year, month=month).first()
+        
+        if stored is None or tuple(stored) != (
+            values['total_income'], values['total_expense'], values['net_amount'], values['payload_hash']
+        ):
+            self._upsert_report(year, month, values)
+        
+        db.session.commit()
+        
+        return MonthlyReport.query.filter_by(
             user_id=self.user_id,
             year=year,
-            month=month,
-            total_income=Decimal(str(summary['total_income'])),
-            total_expense=Decimal(str(summary['total_expense'])),
-            net_amount=Decimal(str(summary['net_amount'])),
-            report_data=report_data
+            month=month
+        ).execution_options(populate_existing=True).first()
+    
+    @staticmethod
+    def _payload_hash(report_data):
+        """計算報表內容的雜湊值"""
+        payload = json.dumps(report_data, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def _upsert_report(self, year, month, values):
+        """以單一陳述式新增或更新報表（Postgres / SQLite 使用 ON CONFLICT，由呼叫端 commit）"""
+        dialect = db.session.get_bind().dialect.name
+        table = MonthlyReport.__table__
+        now = datetime.utcnow()
+        
+        if dialect in ('postgresql', 'sqlite'):
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            
+            stmt = dialect_insert(table).values(
+                user_id=self.user_id, year=year, month=month, created_at=now, **values
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['user_id', 'year', 'month'],
+                set_={**{key: stmt.excluded[key] for key in values}, 'created_at': now},
+                # 並行生成時，內容相同者不重複寫入
+                where=table.c.payload_hash.is_distinct_from(stmt.excluded.payload_hash)
+            )
+            db.session.execute(stmt)
+        else:
+            report = MonthlyReport.query.filter_by(
+                user_id=self.user_id,
+                year=year,
+                month=month
+            ).with_for_update().first()
+            
+            if report is None:
+                report = MonthlyReport(user_id=self.user_id, year=year, month=month)
+                db.session.add(report)
+            
+            for key, value in values.items():
+                setattr(report, key, value)
+            report.created_at = now
+            db.session.flush()
+    
+    def _build_month_sections(self, year, month, top_limit=5):
+        """以單一查詢取得當月交易（輕量 tuple），一次走訪計算報表各區塊
+        
+        回傳 summary、category_stats、daily_stats、top_expenses、weekday_stats，
+        格式與 TransactionService 對應方法相同。
+        """
+        start_date, end_date = get_month_range(year, month)
+        
+        rows = db.session.query(
+            Transaction.date,
+            Transaction.type,
+            Transaction.amount,
+            Transaction.description,
+            Category.name
+        ).join(
+            Category, Transaction.category_id == Category.id
+        ).filter(
+            Transaction.user_id == self.user_id,
+            Transaction.date >= start_date,
+            Transaction.date <= end_date
+        ).order_by(Transaction.id).all()
+        
+        totals = {'income': Decimal('0'), 'expense': Decimal('0')}
+        counts = {'income': 0, 'expense': 0}
+        by_category = {'income': {}, 'expense': {}}
+        by_date = {'income': {}, 'expense': {}}
+        weekday_totals = [Decimal('0')] * 7
+        weekday_counts = [0] * 7
+        expenses = []
+        
+        for row in rows:
+            transaction_date, transaction_type, amount, description, category_name = row
+            amount = Decimal(str(amount))
+            
+            totals[transaction_type] += amount
+            counts[transaction_type] += 1
+            by_category[transaction_type][category_name] = (
+                by_category[transaction_type].get(category_name, Decimal('0')) + amount
+            )
+            by_date[transaction_type][transaction_date] = (
+                by_date[transaction_type].get(transaction_date, Decimal('0')) + amount
+            )
+            
+            if transaction_type == 'expense':
+                weekday = transaction_date.weekday()
+                weekday_totals[weekday] += amount
+                weekday_counts[weekday] += 1
+                expenses.append((amount, row))
+        
+        summary = {
+            'year': year,
+            'month': month,
+            'total_income': float(totals['income']),
+            'total_expense': float(totals['expense']),
+            'net_amount': float(totals['income'] - totals['expense']),
+            'income_count': counts['income'],
+            'expense_count': counts['expense'],
+            'total_count': counts['income'] + counts['expense']
+        }
+        
+        category_stats = {
+            transaction_type: [
+                {'category': name, 'amount': float(amount)}
+                for name, amount in sorted(by_category[transaction_type].items())
+            ]
+            for transaction_type in ('income', 'expense')
+        }
+        
+        daily_stats = []
+        current_date = start_date
+        while current_date <= end_date:
+            daily_stats.append({
+                'date': current_date.strftime('%Y-%m-%d'),
+                'income': float(by_date['income'][current_date]) if current_date in by_date['income'] else 0,
+                'expense': float(by_date['expense'][current_date]) if current_date in by_date['expense'] else 0
+            })
+            current_date += timedelta(days=1)
+        
+        top_expenses = [{
+            'date': transaction_date.strftime('%Y-%m-%d'),
+            'category': category_name,
+            'amount': float(amount),
+            'description': description or '無描述'
+        } for amount, (transaction_date, _, _, description, category_name) in heapq.nlargest(
+            top_limit, expenses, key=lambda item: item[0]
+        )]
+        
+        # 以 Decimal 累加，結果與資料列順序無關
+        weekday_names = ['週一', '週二', '週三', '週四', '週五', '週六', '週日']
+        weekday_stats = [{
+            'weekday': weekday_names[i],
+            'total': float(weekday_totals[i]) if weekday_counts[i] > 0 else 0,
+            'count': weekday_counts[i],
+            'average': float(weekday_totals[i]) / weekday_counts[i] if weekday_counts[i] > 0 else 0
+        } for i in range(7)]
+        
+        return {
+            'summary': summary,
+            'category_stats': category_stats,
+            'daily_stats': daily_stats,
+            'top_expenses': top_expenses,
+            'weekday_stats': weekday_stats
+        }
+    
+    def mark_months_dirty(self, months):
+        """標記交易異動影響的月報表為待重新生成（由呼叫端 commit）
+        
+        months 為交易所在的 (year, month)；除當月外，下個月（環比）與明年同月（同比）
+        的報表也引用此月的金額，一併標記。
+        """
+        keys = set()
+        for year, month in months:
+            keys.add((year, month))
+            keys.add((year + month // 12, month % 12 + 1))
+            keys.add((year + 1, month))
+        
+        if not keys:
+            return
+        
+        dialect = db.session.get_bind().dialect.name
+        table = DirtyReportMonth.__table__
+        now = datetime.utcnow()
+        rows = [
+            {'user_id': self.user_id, 'year': year, 'month': month, 'marked_at': now}
+            for year, month in sorted(keys)
+        ]
+        
+        if dialect in ('postgresql', 'sqlite'):
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            
+            db.session.execute(dialect_insert(table).on_conflict_do_nothing(), rows)
+        else:
+            for row in rows:
+                if not db.session.get(DirtyReportMonth, (row['user_id'], row['year'], row['month'])):
+                    db.session.add(DirtyReportMonth(**row))
+            db.session.flush()
+    
+    def get_dirty_months(self, months=None):
+        """取得待重新生成的月份（可限定於 months 中的 (year, month)）"""
+        query = db.session.query(DirtyReportMonth.year, DirtyReportMonth.month).filter(
+            DirtyReportMonth.user_id == self.user_id
         )
+        if months is not None:
+            months = set(months)
+            if not months:
+                return []
+            query = query.filter(tuple_(DirtyReportMonth.year, DirtyReportMonth.month).in_(months))
         
-        db.session.add(report)
-        db.session.commit()
+        return [(year, month) for year, month in query.order_by(DirtyReportMonth.year, DirtyReportMonth.month)]
+    
+    def refresh_dirty_reports(self, months=None):
+        """重新生成待更新的月報表，回傳重新生成的月份數
+        
+        只重新生成已存在報表的月份；尚未生成報表的月份僅清除標記（檢視時才會生成）。
+        """
+        dirty_months = self.get_dirty_months(months)
+        if not dirty_months:
+            return 0
+        
+        existing = {
+            (year, month) for year, month in db.session.query(
+                MonthlyReport.year, MonthlyReport.month
+            ).filter(
+                MonthlyReport.user_id == self.user_id,
+                tuple_(MonthlyReport.year, MonthlyReport.month).in_(dirty_months)
+            )
+        }
         
-        return report
+        refreshed = 0
+        for year, month in dirty_months:
+            if (year, month) in existing:
+                self.generate_monthly_report(year, month)
+                refreshed += 1
+            else:
+                DirtyReportMonth.query.filter_by(
+                    user_id=self.user_id,
+                    year=year,
+                    month=month
+                ).delete(synchronize_session=False)
+        
+        db.session.commit()
+        return refreshed
     
     def _get_monthly_goals_data(self, year, month):
         """獲取月份相關的目標資料"""
@@ -104,10 +357,11 @@ class ReportService:
         
         return goals_data
     
-    def _calculate_comparison(self, year, month):
+    def _calculate_comparison(self, year, month, current_summary=None):
         """計算同比和環比資料"""
         # 獲取當月資料
-        current_summary = self.transaction_service.get_monthly_summary(year, month)
+        if current_summary is None:
+            current_summary = self.transaction_service.get_monthly_summary(year, month)
         
         # 計算上月
         if month == 1:
@@ -121,11 +375,11 @@ class ReportService:
         last_year = year - 1
         last_year_month = month
         
-        # 獲取上月資料（環比）
-        prev_summary = self.transaction_service.get_monthly_summary(prev_year, prev_month)
-        
-        # 獲取去年同月資料（同比）
-        yoy_summary = self.transaction_service.get_monthly_summary(last_year, last_year_month)
+        # 以單一分組查詢取得上月（環比）與去年同月（同比）的收支合計
+        prev_summary, yoy_summary = self._get_period_totals([
+            get_month_range(prev_year, prev_month),
+            get_month_range(last_year, last_year_month)
+        ])
         
         def calculate_change(old_val, new_val):
             """計算變化率"""
@@ -166,6 +420,35 @@ class ReportService:
         
         return comparison
     
+    def _get_period_totals(self, periods):
+        """以單一分組查詢取得多個不重疊期間的收入、支出與淨額"""
+        period_key = case(
+            *[
+                (DailyRollup.date.between(start_date, end_date), index)
+                for index, (start_date, end_date) in enumerate(periods)
+            ],
+            else_=-1
+        ).label('period')
+        
+        rows = db.session.query(
+            period_key,
+            DailyRollup.type,
+            func.sum(DailyRollup.total_amount)
+        ).filter(
+            DailyRollup.user_id == self.user_id,
+            db.or_(*[DailyRollup.date.between(start_date, end_date) for start_date, end_date in periods])
+        ).group_by(period_key, DailyRollup.type).all()
+        
+        amounts = [{'income': Decimal('0'), 'expense': Decimal('0')} for _ in periods]
+        for index, transaction_type, total in rows:
+            amounts[index][transaction_type] = Decimal(str(total or 0))
+        
+        return [{
+            'total_income': float(item['income']),
+            'total_expense': float(item['expense']),
+            'net_amount': float(item['income'] - item['expense'])
+        } for item in amounts]
+    
     def _generate_insights(self, summary, category_stats, comparison):
         """生成分析見解"""
         insights = []
@@ -292,38 +575,8 @@ class ReportService:
     def get_category_yearly_breakdown(self, year):
         """獲取年度類別明細"""
         from datetime import date
-        from calendar import monthrange
         
         start_date = date(year, 1, 1)
-        last_day = monthrange(year, 12)[1]
-        end_date = date(year, 12, last_day)
-        
-        # 收入類別統計
-        income_stats = db.session.query(
-            Category.name,
-            func.sum(Transaction.amount).label('total')
-        ).join(Transaction).filter(
-            Transaction.user_id == self.user_id,
-            Transaction.type == 'income',
-            Transaction.date >= start_date,
-            Transaction.date <= end_date
-        ).group_by(Category.name).all()
+        end_date = date(year, 12, 31)
         
-        # 支出類別統計
-        expense_stats = db.session.query(
-            Category.name,
-            func.sum(Transaction.amount).label('total')
-        ).join(Transaction).filter(
-            Transaction.user_id == self.user_id,
-            Transaction.type == 'expense',
-            Transaction.date >= start_date,
-            Transaction.date <= end_date
-        ).group_by(Category.name).all()
-        
-        return {
-            'income': [{'category': name, 'amount': float(total)} for name, total in income_stats],
-            'expense': [{'category': name, 'amount': float(total)} for name, total in expense_stats]
-        }
-
-
-from sqlalchemy import func
\ No newline at end of file
+        return self.transaction_service.get_category_stats(start_date, end_date)
\ No newline at end of file
@@ -0,0 +1,149 @@
+from models import db, Transaction, DailyRollup
+from sqlalchemy import func, select, insert, bindparam
+from decimal import Decimal
+
+
+class RollupService:
+    """每日彙總維護服務
+    
+    daily_rollups 以 (user_id, date, type, category_id) 為鍵儲存金額總和與筆數，
+    必須在與交易寫入相同的資料庫交易中更新（呼叫端負責 commit）。
+    """
+    
+    def __init__(self, user_id):
+        self.user_id = user_id
+    
+    def add_transaction(self, transaction):
+        """將交易計入彙總"""
+        self._apply(transaction.date, transaction.type, transaction.category_id,
+                    Decimal(str(transaction.amount)), 1)
+    
+    def remove_transaction(self, transaction):
+        """將交易自彙總中扣除（編輯時需在修改欄位前呼叫）"""
+        self._apply(transaction.date, transaction.type, transaction.category_id,
+                    -Decimal(str(transaction.amount)), -1)
+    
+    def _apply(self, date, transaction_type, category_id, amount_delta, count_delta):
+        """累加單一彙總列"""
+        self.apply_deltas({(date, transaction_type, category_id): (amount_delta, count_delta)})
+    
+    def apply_deltas(self, deltas):
+        """批次累加彙總列
+        
+        deltas: {(date, type, category_id): (amount_delta, count_delta)}
+        Postgres / SQLite 以單一 executemany upsert 完成。
+        """
+        if not deltas:
+            return
+        
+        dialect = db.session.get_bind().dialect.name
+        table = DailyRollup.__table__
+        params = [{
+            'user_id': self.user_id,
+            'date': date,
+            'type': transaction_type,
+            'category_id': category_id,
+            'total_amount': amount_delta,
+            'transaction_count': count_delta
+        } for (date, transaction_type, category_id), (amount_delta, count_delta) in deltas.items()]
+        
+        if dialect in ('postgresql', 'sqlite'):
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            
+            stmt = dialect_insert(table)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['user_id', 'date', 'type', 'category_id'],
+                set_={
+                    'total_amount': table.c.total_amount + stmt.excluded.total_amount,
+                    'transaction_count': table.c.transaction_count + stmt.excluded.transaction_count
+                }
+            )
+            db.session.execute(stmt, params)
+        else:
+            # 其他資料庫：鎖定既有列後更新，不存在則新增
+            for values in params:
+                rollup = DailyRollup.query.filter_by(
+                    user_id=self.user_id,
+                    date=values['date'],
+                    type=values['type'],
+                    category_id=values['category_id']
+                ).with_for_update().first()
+                
+                if rollup:
+                    rollup.total_amount = rollup.total_amount + values['total_amount']
+                    rollup.transaction_count = rollup.transaction_count + values['transaction_count']
+                else:
+                    db.session.add(DailyRollup(**values))
+            db.session.flush()
+        
+        # 移除已無交易的彙總列
+        removed = [values for values in params if values['transaction_count'] < 0]
+        if removed:
+            db.session.execute(
+                table.delete().where(
+                    table.c.user_id == bindparam('user_id'),
+                    table.c.date == bindparam('date'),
+                    table.c.type == bindparam('type'),
+                    table.c.category_id == bindparam('category_id'),
+                    table.c.transaction_count <= 0
+                ),
+                [{k: values[k] for k in ('user_id', 'date', 'type', 'category_id')} for values in removed]
+            )
+    
+    def _ledger_totals_query(self):
+        """從原始交易表計算彙總的查詢"""
+        return select(
+            Transaction.user_id,
+            Transaction.date,
+            Transaction.type,
+            Transaction.category_id,
+            func.sum(Transaction.amount),
+            func.count(Transaction.id)
+        ).where(
+            Transaction.user_id == self.user_id
+        ).group_by(
+            Transaction.user_id,
+            Transaction.date,
+            Transaction.type,
+            Transaction.category_id
+        )
+    
+    def rebuild(self):
+        """依原始交易重建使用者的所有彙總列"""
+        table = DailyRollup.__table__
+        db.session.execute(table.delete().where(table.c.user_id == self.user_id))
+        result = db.session.execute(
+            insert(table).from_select(
+                ['user_id', 'date', 'type', 'category_id', 'total_amount', 'transaction_count'],
+                self._ledger_totals_query()
+            )
+        )
+        db.session.commit()
+        return result.rowcount
+    
+    def verify(self):
+        """比對彙總列與原始交易，回傳不一致的項目"""
+        expected = {
+            (row[1], row[2], row[3]): (Decimal(str(row[4])), int(row[5]))
+            for row in db.session.execute(self._ledger_totals_query())
+        }
+        actual = {
+            (r.date, r.type, r.category_id): (Decimal(str(r.total_amount)), int(r.transaction_count))
+            for r in DailyRollup.query.filter_by(user_id=self.user_id)
+        }
+        
+        mismatches = []
+        for key in sorted(set(expected) | set(actual)):
+            if expected.get(key) != actual.get(key):
+                mismatches.append({
+                    'date': key[0].strftime('%Y-%m-%d'),
+                    'type': key[1],
+                    'category_id': key[2],
+                    'expected': expected.get(key),
+                    'actual': actual.get(key)
+                })
+        
+        return mismatches
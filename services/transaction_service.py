@@ -1,12 +1,85 @@
-from models import db, Transaction, Category, Goal
-from sqlalchemy import func, extract
-from datetime import datetime, timedelta
+from models import db, Transaction, Category, Goal, DailyRollup
+from services.rollup_service import RollupService
+from sqlalchemy import func, extract, case
+from datetime import datetime, date, timedelta
 from decimal import Decimal
+from calendar import monthrange
+from utils.request_scope import request_memoize
+
+
+def get_month_range(year, month):
+    """獲取月份的第一天和最後一天"""
+    last_day = monthrange(year, month)[1]
+    return date(year, month, 1), date(year, month, last_day)
+
+
+def shift_month(year, month, offset):
+    """將 (year, month) 位移 offset 個月（可為負數），回傳新的 (year, month)"""
+    index = year * 12 + (month - 1) + offset
+    return index // 12, index % 12 + 1
+
+
+class MonthlyTrend:
+    """多月份收支矩陣（月份 × 類型 × 類別）
+    
+    由 TransactionService.get_monthly_trend 以單一分組查詢建立，
+    summary / category_stats 的格式與 get_monthly_summary / get_monthly_category_stats 相同。
+    """
+    
+    def __init__(self, months, rows):
+        self.months = months
+        self.matrix = {key: {'income': {}, 'expense': {}} for key in months}
+        self.counts = {key: {'income': {}, 'expense': {}} for key in months}
+        
+        for year, month, transaction_type, category_name, amount, count in rows:
+            key = (int(year), int(month))
+            self.matrix[key][transaction_type][category_name] = Decimal(str(amount or 0))
+            self.counts[key][transaction_type][category_name] = int(count or 0)
+    
+    def totals(self, year, month):
+        """月份的收入與支出合計（Decimal）及筆數"""
+        amounts = self.matrix[(year, month)]
+        counts = self.counts[(year, month)]
+        return {
+            'income': sum(amounts['income'].values(), Decimal('0')),
+            'expense': sum(amounts['expense'].values(), Decimal('0')),
+            'income_count': sum(counts['income'].values()),
+            'expense_count': sum(counts['expense'].values())
+        }
+    
+    def summary(self, year, month):
+        """月度摘要（同 get_monthly_summary）"""
+        totals = self.totals(year, month)
+        return {
+            'year': year,
+            'month': month,
+            'total_income': float(totals['income']),
+            'total_expense': float(totals['expense']),
+            'net_amount': float(totals['income'] - totals['expense']),
+            'income_count': totals['income_count'],
+            'expense_count': totals['expense_count'],
+            'total_count': totals['income_count'] + totals['expense_count']
+        }
+    
+    def category_stats(self, year, month):
+        """月度類別統計（同 get_monthly_category_stats）"""
+        amounts = self.matrix[(year, month)]
+        counts = self.counts[(year, month)]
+        return {
+            transaction_type: [
+                {'category': name, 'amount': float(amount)}
+                for name, amount in sorted(amounts[transaction_type].items())
+                if counts[transaction_type][name] > 0
+            ]
+            for transaction_type in ('income', 'expense')
+        }
 
 
 class TransactionService:
     """交易處理服務"""
     
+    MAX_TREND_MONTHS = 120
+    
     def __init__(self, user_id):
         self.user_id = user_id
     
@@ -23,125 +96,171 @@ class TransactionService:
         
         return query.order_by(Transaction.date.desc()).all()
     
-    def get_monthly_summary(self, year, month):
-        """獲取月度摘要統計"""
-        # 計算月份的第一天和最後一天
-        from calendar import monthrange
-        last_day = monthrange(year, month)[1]
-        start_date = datetime(year, month, 1).date()
-        end_date = datetime(year, month, last_day).date()
+    @request_memoize
+    def aggregate(self, start_date=None, end_date=None, group_by=None):
+        """單次掃描彙總收入與支出的總額和筆數
         
-        # 計算收入總額
-        total_income = db.session.query(func.sum(Transaction.amount)).filter(
-            Transaction.user_id == self.user_id,
-            Transaction.type == 'income',
-            Transaction.date >= start_date,
-            Transaction.date <= end_date
-        ).scalar() or Decimal('0')
+        從 daily_rollups 每日彙總表以條件聚合（SUM + CASE）在同一個查詢中
+        同時計算收入與支出，不需掃描原始交易表。
         
-        # 計算支出總額
-        total_expense = db.session.query(func.sum(Transaction.amount)).filter(
-            Transaction.user_id == self.user_id,
-            Transaction.type == 'expense',
-            Transaction.date >= start_date,
-            Transaction.date <= end_date
-        ).scalar() or Decimal('0')
+        group_by:
+            None       - 回傳整個期間的彙總 dict
+            'date'     - 回傳 {date: 彙總 dict}
+            'category' - 回傳 {類別名稱: 彙總 dict}
         
-        # 計算淨額
-        net_amount = total_income - total_expense
+        彙總 dict 包含 income、expense（Decimal）及 income_count、expense_count（int）
+        """
+        is_income = DailyRollup.type == 'income'
+        is_expense = DailyRollup.type == 'expense'
         
-        # 計算交易筆數
-        income_count = Transaction.query.filter(
-            Transaction.user_id == self.user_id,
-            Transaction.type == 'income',
-            Transaction.date >= start_date,
-            Transaction.date <= end_date
-        ).count()
+        columns = [
+            func.sum(case((is_income, DailyRollup.total_amount), else_=0)).label('income'),
+            func.sum(case((is_expense, DailyRollup.total_amount), else_=0)).label('expense'),
+            func.sum(case((is_income, DailyRollup.transaction_count), else_=0)).label('income_count'),
+            func.sum(case((is_expense, DailyRollup.transaction_count), else_=0)).label('expense_count')
+        ]
         
-        expense_count = Transaction.query.filter(
-            Transaction.user_id == self.user_id,
-            Transaction.type == 'expense',
-            Transaction.date >= start_date,
-            Transaction.date <= end_date
-        ).count()
+        if group_by == 'date':
+            key = DailyRollup.date
+        elif group_by == 'category':
+            key = Category.name
+        elif group_by is None:
+            key = None
+        else:
+            raise ValueError(f'不支援的分組方式: {group_by}')
+        
+        query = db.session.query(*([key] if key is not None else []), *columns).select_from(DailyRollup)
+        
+        if group_by == 'category':
+            query = query.join(Category, DailyRollup.category_id == Category.id)
+        
+        query = query.filter(DailyRollup.user_id == self.user_id)
+        if start_date is not None:
+            query = query.filter(DailyRollup.date >= start_date)
+        if end_date is not None:
+            query = query.filter(DailyRollup.date <= end_date)
+        
+        if key is None:
+            return self._to_totals(query.one())
+        
+        return {row[0]: self._to_totals(row[1:]) for row in query.group_by(key).all()}
+    
+    @staticmethod
+    def _to_totals(row):
+        """將聚合結果列轉換為彙總 dict"""
+        income, expense, income_count, expense_count = row
+        return {
+            'income': Decimal(str(income or 0)),
+            'expense': Decimal(str(expense or 0)),
+            'income_count': int(income_count or 0),
+            'expense_count': int(expense_count or 0)
+        }
+    
+    @request_memoize
+    def count_transactions(self, transaction_type=None, category_id=None, start_date=None, end_date=None):
+        """從每日彙總計算符合條件的交易筆數（不需掃描交易表）"""
+        query = db.session.query(func.sum(DailyRollup.transaction_count)).filter(
+            DailyRollup.user_id == self.user_id
+        )
+        
+        if transaction_type:
+            query = query.filter(DailyRollup.type == transaction_type)
+        if category_id:
+            query = query.filter(DailyRollup.category_id == category_id)
+        if start_date is not None:
+            query = query.filter(DailyRollup.date >= start_date)
+        if end_date is not None:
+            query = query.filter(DailyRollup.date <= end_date)
+        
+        return int(query.scalar() or 0)
+    
+    def get_monthly_summary(self, year, month):
+        """獲取月度摘要統計"""
+        start_date, end_date = get_month_range(year, month)
+        
+        totals = self.aggregate(start_date, end_date)
+        
+        # 計算淨額
+        net_amount = totals['income'] - totals['expense']
         
         return {
             'year': year,
             'month': month,
-            'total_income': float(total_income),
-            'total_expense': float(total_expense),
+            'total_income': float(totals['income']),
+            'total_expense': float(totals['expense']),
             'net_amount': float(net_amount),
-            'income_count': income_count,
-            'expense_count': expense_count,
-            'total_count': income_count + expense_count
+            'income_count': totals['income_count'],
+            'expense_count': totals['expense_count'],
+            'total_count': totals['income_count'] + totals['expense_count']
         }
     
-    def get_monthly_category_stats(self, year, month):
-        """獲取月度類別統計"""
-        from calendar import monthrange
-        last_day = monthrange(year, month)[1]
-        start_date = datetime(year, month, 1).date()
-        end_date = datetime(year, month, last_day).date()
+    def get_category_stats(self, start_date, end_date):
+        """獲取指定期間的類別統計"""
+        by_category = self.aggregate(start_date, end_date, group_by='category')
         
-        # 收入類別統計
-        income_stats = db.session.query(
-            Category.name,
-            func.sum(Transaction.amount).label('total')
-        ).join(Transaction).filter(
-            Transaction.user_id == self.user_id,
-            Transaction.type == 'income',
-            Transaction.date >= start_date,
-            Transaction.date <= end_date
-        ).group_by(Category.name).all()
+        return {
+            'income': [
+                {'category': name, 'amount': float(totals['income'])}
+                for name, totals in by_category.items() if totals['income_count'] > 0
+            ],
+            'expense': [
+                {'category': name, 'amount': float(totals['expense'])}
+                for name, totals in by_category.items() if totals['expense_count'] > 0
+            ]
+        }
+    
+    def get_monthly_trend(self, months=6, end_year=None, end_month=None):
+        """獲取最近 N 個月（含結束月份）的收支矩陣
+        
+        以單一分組查詢（年、月、類型、類別）從每日彙總取得所有月份的資料，
+        回傳 MonthlyTrend，months 由舊到新排列。最多 120 個月（10 年）。
+        """
+        if not 1 <= months <= self.MAX_TREND_MONTHS:
+            raise ValueError(f'月份數必須介於 1 到 {self.MAX_TREND_MONTHS} 之間')
+        
+        if end_year is None or end_month is None:
+            today = datetime.now().date()
+            end_year, end_month = today.year, today.month
         
-        # 支出類別統計
-        expense_stats = db.session.query(
+        month_keys = [shift_month(end_year, end_month, offset) for offset in range(1 - months, 1)]
+        start_date = get_month_range(*month_keys[0])[0]
+        end_date = get_month_range(end_year, end_month)[1]
+        
+        year_key = extract('year', DailyRollup.date)
+        month_key = extract('month', DailyRollup.date)
+        
+        rows = db.session.query(
+            year_key,
+            month_key,
+            DailyRollup.type,
             Category.name,
-            func.sum(Transaction.amount).label('total')
-        ).join(Transaction).filter(
-            Transaction.user_id == self.user_id,
-            Transaction.type == 'expense',
-            Transaction.date >= start_date,
-            Transaction.date <= end_date
-        ).group_by(Category.name).all()
+            func.sum(DailyRollup.total_amount),
+            func.sum(DailyRollup.transaction_count)
+        ).join(
+            Category, DailyRollup.category_id == Category.id
+        ).filter(
+            DailyRollup.user_id == self.user_id,
+            DailyRollup.date >= start_date,
+            DailyRollup.date <= end_date
+        ).group_by(year_key, month_key, DailyRollup.type, Category.name).all()
         
-        return {
-            'income': [{'category': name, 'amount': float(total)} for name, total in income_stats],
-            'expense': [{'category': name, 'amount': float(total)} for name, total in expense_stats]
-        }
+        return MonthlyTrend(month_keys, rows)
+    
+    def get_monthly_category_stats(self, year, month):
+        """獲取月度類別統計"""
+        start_date, end_date = get_month_range(year, month)
+        return self.get_category_stats(start_date, end_date)
     
     def get_daily_stats(self, year, month):
         """獲取每日統計（用於趨勢圖）"""
-        from calendar import monthrange
-        last_day = monthrange(year, month)[1]
-        start_date = datetime(year, month, 1).date()
-        end_date = datetime(year, month, last_day).date()
+        start_date, end_date = get_month_range(year, month)
         
-        # 按日期分組的收入
-        daily_income = db.session.query(
-            Transaction.date,
-            func.sum(Transaction.amount).label('total')
-        ).filter(
-            Transaction.user_id == self.user_id,
-            Transaction.type == 'income',
-            Transaction.date >= start_date,
-            Transaction.date <= end_date
-        ).group_by(Transaction.date).all()
-        
-        # 按日期分組的支出
-        daily_expense = db.session.query(
-            Transaction.date,
-            func.sum(Transaction.amount).label('total')
-        ).filter(
-            Transaction.user_id == self.user_id,
-            Transaction.type == 'expense',
-            Transaction.date >= start_date,
-            Transaction.date <= end_date
-        ).group_by(Transaction.date).all()
+        # 按日期分組的收入與支出
+        by_date = self.aggregate(start_date, end_date, group_by='date')
         
         # 建立完整的日期範圍字典
-        income_dict = {date: float(total) for date, total in daily_income}
-        expense_dict = {date: float(total) for date, total in daily_expense}
+        income_dict = {d: float(t['income']) for d, t in by_date.items() if t['income_count'] > 0}
+        expense_dict = {d: float(t['expense']) for d, t in by_date.items() if t['expense_count'] > 0}
         
         daily_data = []
         current_date = start_date
@@ -162,7 +281,12 @@ class TransactionService:
         start_date = datetime(year, month, 1).date()
         end_date = datetime(year, month, last_day).date()
         
-        top_expenses = Transaction.query.filter(
+        top_expenses = db.session.query(
+            Transaction.date,
+            Category.name,
+            Transaction.amount,
+            Transaction.description
+        ).join(Category, Transaction.category_id == Category.id).filter(
             Transaction.user_id == self.user_id,
             Transaction.type == 'expense',
             Transaction.date >= start_date,
@@ -170,11 +294,11 @@ class TransactionService:
         ).order_by(Transaction.amount.desc()).limit(limit).all()
         
         return [{
-            'date': t.date.strftime('%Y-%m-%d'),
-            'category': t.category.name,
-            'amount': float(t.amount),
-            'description': t.description or '無描述'
-        } for t in top_expenses]
+            'date': t_date.strftime('%Y-%m-%d'),
+            'category': category_name,
+            'amount': float(amount),
+            'description': description or '無描述'
+        } for t_date, category_name, amount, description in top_expenses]
     
     def get_category_trend(self, category_id, months=6):
         """獲取特定類別的趨勢（最近 N 個月）"""
@@ -197,8 +321,37 @@ class TransactionService:
             'amount': float(total)
         } for year, month, total in monthly_data]
     
+    def record_transaction_added(self, transaction):
+        """交易新增後同步更新衍生資料（每日彙總、目標進度、月報表標記、異常支出標記）
+        
+        需在與交易寫入相同的資料庫交易中呼叫，由呼叫端 commit。
+        """
+        from services.goal_service import GoalService
+        from services.report_service import ReportService
+        from services.anomaly_service import AnomalyService
+        
+        RollupService(self.user_id).add_transaction(transaction)
+        GoalService(self.user_id).apply_transaction_delta(
+            transaction.date, transaction.type, transaction.amount
+        )
+        ReportService(self.user_id).mark_months_dirty([(transaction.date.year, transaction.date.month)])
+        AnomalyService(self.user_id).flag_transaction(transaction)
+    
+    def record_transaction_removed(self, transaction):
+        """交易刪除前（或編輯修改欄位前）同步扣除衍生資料"""
+        from services.goal_service import GoalService
+        from services.report_service import ReportService
+        from services.anomaly_service import AnomalyService
+        
+        RollupService(self.user_id).remove_transaction(transaction)
+        GoalService(self.user_id).apply_transaction_delta(
+            transaction.date, transaction.type, -Decimal(str(transaction.amount))
+        )
+        ReportService(self.user_id).mark_months_dirty([(transaction.date.year, transaction.date.month)])
+        AnomalyService(self.user_id).unflag_transaction(transaction)
+    
     def update_goals_progress(self):
-        """更新所有進行中的目標進度"""
+        """重新計算所有進行中的目標進度（批次匯入及定期校正使用）"""
         from services.goal_service import GoalService
         
         goal_service = GoalService(self.user_id)
@@ -219,12 +372,7 @@ class TransactionService:
         today = datetime.now().date()
         start_date = today - timedelta(days=days)
         
-        total_expense = db.session.query(func.sum(Transaction.amount)).filter(
-            Transaction.user_id == self.user_id,
-            Transaction.type == 'expense',
-            Transaction.date >= start_date,
-            Transaction.date <= today
-        ).scalar() or Decimal('0')
+        total_expense = self.aggregate(start_date, today)['expense']
         
         return float(total_expense) / days
     
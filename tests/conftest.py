@@ -0,0 +1,85 @@
+import os
+import sys
+import pytest
+
+# app.py 匯入時會建立模組層級的應用程式，測試時改用測試環境配置（記憶體資料庫）
+os.environ.setdefault('SECRET_KEY', 'test')
+os.environ.setdefault('FLASK_ENV', 'testing')
+os.environ['ENABLE_SCHEDULER'] = 'false'
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def app():
+    """使用記憶體資料庫的測試應用程式
+    
+    fixture 不保留應用程式上下文：test client 的每個請求都需要自己的上下文（flask.g 不跨請求共用），
+    測試中直接存取資料庫時以 app.app_context() 包住。
+    """
+    from app import create_app
+    
+    return create_app('testing')
+
+
+@pytest.fixture
+def user_id(app):
+    """沒有交易的測試使用者，回傳 id"""
+    from models import db, User
+    
+    with app.app_context():
+        user = User(username='tester', email='tester@example.com')
+        user.set_password('password')
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+@pytest.fixture
+def categories(app, user_id):
+    """測試使用者的類別 id：{'income': 薪資, 'expense': 餐飲, 'other_expense': 交通}"""
+    from models import db, Category
+    
+    with app.app_context():
+        categories = {
+            'income': Category(user_id=user_id, name='薪資', type='income'),
+            'expense': Category(user_id=user_id, name='餐飲', type='expense'),
+            'other_expense': Category(user_id=user_id, name='交通', type='expense')
+        }
+        db.session.add_all(categories.values())
+        db.session.commit()
+        return {key: category.id for key, category in categories.items()}
+
+
+@pytest.fixture
+def client(app, user_id):
+    """已登入測試使用者的 test client"""
+    client = app.test_client()
+    response = client.post('/auth/login', data={'username': 'tester', 'password': 'password'})
+    assert response.status_code == 302
+    return client
+
+
+@pytest.fixture
+def add_transaction(app):
+    """經由 TransactionService 的寫入路徑新增交易並 commit，回傳交易 id"""
+    from decimal import Decimal
+    from models import db, Transaction
+    from services.transaction_service import TransactionService
+    
+    def add(user_id, category_id, transaction_type, amount, transaction_date, description=None):
+        with app.app_context():
+            transaction = Transaction(
+                user_id=user_id,
+                category_id=category_id,
+                type=transaction_type,
+                amount=Decimal(amount),
+                date=transaction_date,
+                description=description
+            )
+            db.session.add(transaction)
+            TransactionService(user_id).record_transaction_added(transaction)
+            db.session.commit()
+            return transaction.id
+    
+    return add
@@ -0,0 +1,67 @@
+"""異常支出標記測試：交易寫入時的判定需與 AnomalyService.refresh() 的結果一致"""
+from datetime import date, timedelta
+from decimal import Decimal
+from models import db, Transaction, ExpenseAnomaly
+from services.anomaly_service import AnomalyService
+from services.transaction_service import TransactionService
+
+
+def _stored_flags(user_id):
+    return set(db.session.scalars(
+        db.select(ExpenseAnomaly.transaction_id).where(ExpenseAnomaly.user_id == user_id)
+    ))
+
+
+def _refreshed_flags(user_id):
+    AnomalyService(user_id).refresh(date(2000, 1, 1))
+    db.session.commit()
+    return _stored_flags(user_id)
+
+
+def test_sparse_category_flags_match_refresh(app, user_id, categories, add_transaction):
+    """歷史視窗跨越一年以上時，寫入時的判定不能只看最近一年"""
+    category_id = categories['expense']
+    start = date.today() - timedelta(days=48 * 30)
+    for month in range(48):
+        add_transaction(user_id, category_id, 'expense', '3000' if month < 24 else '1000',
+                        start + timedelta(days=month * 30))
+    
+    add_transaction(user_id, category_id, 'expense', '1800', date.today())
+    
+    with app.app_context():
+        stored = _stored_flags(user_id)
+        assert stored == _refreshed_flags(user_id)
+
+
+def test_back_dated_edit_and_delete_flags_match_refresh(app, user_id, categories, add_transaction):
+    """補登、修改與刪除較早的支出後，之後的支出標記與 refresh() 一致"""
+    category_id = categories['expense']
+    start = date.today() - timedelta(days=120)
+    transaction_ids = [
+        add_transaction(user_id, category_id, 'expense', '100', start + timedelta(days=day))
+        for day in range(0, 120, 3)
+    ]
+    add_transaction(user_id, category_id, 'expense', '400', start + timedelta(days=100))
+    
+    # 補登一筆較早的大額支出，之後的支出基準提高
+    add_transaction(user_id, category_id, 'expense', '2000', start + timedelta(days=50))
+    
+    with app.app_context():
+        assert _stored_flags(user_id) == _refreshed_flags(user_id)
+        
+        # 修改較早支出的金額與日期
+        transaction = db.session.get(Transaction, transaction_ids[20])
+        transaction_service = TransactionService(user_id)
+        transaction_service.record_transaction_removed(transaction)
+        transaction.amount = Decimal('900')
+        transaction.date = start + timedelta(days=10)
+        transaction_service.record_transaction_added(transaction)
+        db.session.commit()
+        assert _stored_flags(user_id) == _refreshed_flags(user_id)
+        
+        # 刪除較早的支出
+        transaction = db.session.get(Transaction, transaction_ids[5])
+        transaction_service.record_transaction_removed(transaction)
+        db.session.delete(transaction)
+        db.session.commit()
+        assert _stored_flags(user_id) == _refreshed_flags(user_id)
@@ -0,0 +1,27 @@
+"""快取序列化測試：Redis 快取以 JSON 儲存儀表板快照，還原後與原值相同"""
+import pickle
+from datetime import date, timedelta
+import pytest
+from services.dashboard_service import DashboardService
+from utils.cache import dumps_cache_value, loads_cache_value
+
+
+@pytest.mark.parametrize('backend', ['python', 'numpy'])
+def test_dashboard_snapshot_round_trips(app, user_id, categories, add_transaction, backend):
+    app.config['ANALYTICS_BACKEND'] = backend
+    today = date.today()
+    for day in range(40):
+        add_transaction(user_id, categories['expense'], 'expense', f'{50 + day}.10', today - timedelta(days=day),
+                        description='午餐')
+    add_transaction(user_id, categories['expense'], 'expense', '9000', today)
+    add_transaction(user_id, categories['income'], 'income', '52000', today.replace(day=1))
+    
+    with app.test_request_context():
+        snapshot = {'version': 3, 'date': today, 'payload': DashboardService(user_id).build_snapshot(today)}
+        
+        assert loads_cache_value(dumps_cache_value(snapshot)) == snapshot
+
+
+def test_pickled_values_are_not_loaded():
+    with pytest.raises(ValueError):
+        loads_cache_value(pickle.dumps({'date': date.today()}))
@@ -0,0 +1,73 @@
+"""交易匯出測試：CSV 可重新匯入得到相同資料，NDJSON 每行一筆且與資料庫一致"""
+import io
+import json
+from datetime import date, timedelta
+from models import db, User, Transaction, Category
+from services.import_service import ImportService
+
+
+def _records(user_id):
+    """(日期, 類型, 類別, 金額, 描述) 依日期與 id 排序"""
+    rows = db.session.execute(
+        db.select(Transaction.date, Transaction.type, Category.name, Transaction.amount, Transaction.description)
+        .join(Category, Category.id == Transaction.category_id)
+        .where(Transaction.user_id == user_id)
+        .order_by(Transaction.date, Transaction.id)
+    )
+    return [(t_date, t_type, name, amount, description or None) for t_date, t_type, name, amount, description in rows]
+
+
+def _seed(user_id, categories, add_transaction):
+    start = date(2024, 3, 1)
+    for day in range(12):
+        add_transaction(user_id, categories['expense'], 'expense', f'{day + 1}.25', start + timedelta(days=day),
+                        description='午餐, "外帶"' if day % 3 == 0 else None)
+    add_transaction(user_id, categories['income'], 'income', '52000', start, description='三月薪資')
+
+
+def test_csv_export_round_trips_through_import(app, client, user_id, categories, add_transaction):
+    _seed(user_id, categories, add_transaction)
+    
+    response = client.get('/transactions/export?format=csv')
+    
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    body = response.get_data(as_text=True)
+    assert body.startswith('\ufeff')
+    
+    with app.app_context():
+        other = User(username='other', email='other@example.com')
+        other.set_password('password')
+        db.session.add(other)
+        db.session.commit()
+        
+        result = ImportService(other.id, create_categories=True).import_csv(io.StringIO(body.lstrip('\ufeff'), newline=''))
+        
+        assert result['errors'] == []
+        assert result['imported'] == 13
+        assert _records(other.id) == _records(user_id)
+
+
+def test_ndjson_export_matches_filtered_transactions(app, client, user_id, categories, add_transaction):
+    _seed(user_id, categories, add_transaction)
+    
+    response = client.get('/transactions/export?format=ndjson&type=expense')
+    
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    lines = response.get_data(as_text=True).splitlines()
+    exported = [json.loads(line) for line in lines]
+    
+    with app.app_context():
+        expected = [record for record in _records(user_id) if record[1] == 'expense']
+        assert [
+            (date.fromisoformat(item['date']), item['type'], item['category'], item['amount'], item['description'])
+            for item in exported
+        ] == [
+            (t_date, t_type, name, str(amount), description)
+            for t_date, t_type, name, amount, description in expected
+        ]
+
+
+def test_unknown_export_format_is_rejected(client):
+    assert client.get('/transactions/export?format=xml').status_code == 400
@@ -0,0 +1,100 @@
+"""目標進度測試：修改目標與手動刷新後，儲存的 current_amount 與狀態需與即時計算一致"""
+from datetime import date, timedelta
+from decimal import Decimal
+from models import db, Goal
+from services.goal_service import GoalService
+
+
+def _goal(app, user_id, goal_type, target_amount, start_date, end_date=None):
+    with app.app_context():
+        goal = Goal(
+            user_id=user_id,
+            name=f'{goal_type} 目標',
+            goal_type=goal_type,
+            target_amount=Decimal(target_amount),
+            current_amount=Decimal('0'),
+            period='custom',
+            start_date=start_date,
+            end_date=end_date,
+            status='active'
+        )
+        db.session.add(goal)
+        db.session.commit()
+        return goal.id
+
+
+def test_edit_recomputes_current_amount(app, client, user_id, categories, add_transaction):
+    today = date.today()
+    goal_id = _goal(app, user_id, 'saving', '10000', today - timedelta(days=20), today + timedelta(days=10))
+    add_transaction(user_id, categories['income'], 'income', '4200', today - timedelta(days=2))
+    with app.app_context():
+        assert db.session.get(Goal, goal_id).current_amount == Decimal('4200')
+    
+    # 結束日期移到收入之前，期間內已沒有收支
+    response = client.post(f'/goals/edit/{goal_id}', data={
+        'name': 'saving 目標',
+        'target_amount': '10000',
+        'end_date': (today - timedelta(days=5)).strftime('%Y-%m-%d')
+    })
+    
+    assert response.status_code == 302
+    with app.app_context():
+        stored = db.session.get(Goal, goal_id).current_amount
+        assert stored == GoalService(user_id).compute_active_goal_progress()[goal_id] == 0
+
+
+def test_refresh_progress_completes_only_saving_goals(app, client, user_id, categories, add_transaction):
+    today = date.today()
+    start_date = today - timedelta(days=10)
+    saving_id = _goal(app, user_id, 'saving', '1000', start_date)
+    expense_limit_id = _goal(app, user_id, 'expense_limit', '1000', start_date)
+    add_transaction(user_id, categories['income'], 'income', '3000', today - timedelta(days=1))
+    add_transaction(user_id, categories['expense'], 'expense', '1500', today - timedelta(days=1))
+    
+    response = client.post('/goals/refresh-progress')
+    
+    assert response.get_json()['success']
+    with app.app_context():
+        assert db.session.get(Goal, saving_id).status == 'completed'
+        # 超過支出上限的目標不能被標記為完成
+        expense_limit = db.session.get(Goal, expense_limit_id)
+        assert expense_limit.status == 'active'
+        assert expense_limit.current_amount == Decimal('1500')
+
+
+def test_delta_progress_matches_live_recompute(app, client, user_id, categories, add_transaction):
+    """新增、修改、刪除交易後，增量更新的 current_amount 與即時重算一致"""
+    today = date.today()
+    goal_ids = [
+        _goal(app, user_id, 'saving', '1000000', today - timedelta(days=30)),
+        _goal(app, user_id, 'saving', '1000000', today - timedelta(days=30), today - timedelta(days=10)),
+        _goal(app, user_id, 'expense_limit', '1000000', today - timedelta(days=15), today + timedelta(days=15)),
+        _goal(app, user_id, 'expense_limit', '1000000', today - timedelta(days=5))
+    ]
+    
+    transaction_ids = []
+    for day in range(-35, 10, 4):
+        transaction_ids.append(add_transaction(user_id, categories['expense'], 'expense', '37.5', today + timedelta(days=day)))
+        transaction_ids.append(add_transaction(user_id, categories['income'], 'income', '210', today + timedelta(days=day + 1)))
+    
+    # 支出移到其他目標的期間、改為未來日期，以及刪除
+    response = client.post(f'/transactions/edit/{transaction_ids[4]}', data={
+        'category_id': categories['other_expense'],
+        'amount': '88',
+        'date': (today - timedelta(days=2)).strftime('%Y-%m-%d')
+    })
+    assert response.status_code == 302
+    response = client.post(f'/transactions/edit/{transaction_ids[10]}', data={
+        'category_id': categories['expense'],
+        'amount': '12',
+        'date': (today + timedelta(days=3)).strftime('%Y-%m-%d')
+    })
+    assert response.status_code == 302
+    for transaction_id in transaction_ids[15:18]:
+        assert client.post(f'/transactions/delete/{transaction_id}').status_code == 302
+    
+    with app.app_context():
+        live = GoalService(user_id).compute_active_goal_progress()
+        stored = {goal_id: db.session.get(Goal, goal_id).current_amount for goal_id in goal_ids}
+        assert stored == {goal_id: live[goal_id] for goal_id in goal_ids}
+        assert all(amount != 0 for amount in stored.values())
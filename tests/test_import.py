@@ -0,0 +1,59 @@
+"""CSV 匯入測試：錯誤列跳過並回報列號，有效列寫入且彙總一致"""
+import io
+from decimal import Decimal
+from models import db, Transaction, Category
+from services.import_service import ImportService
+from services.rollup_service import RollupService
+
+
+def _import(user_id, text, create_categories=False):
+    return ImportService(user_id, create_categories=create_categories).import_csv(io.StringIO(text))
+
+
+def test_invalid_rows_are_skipped_with_line_numbers(app, user_id, categories):
+    text = '\n'.join([
+        'Date,Type,Category,Amount,Description',
+        '2024-01-05,expense,餐飲,120.50,午餐',
+        '2024-01-06,transfer,餐飲,10,',
+        '2024-01-07,expense,餐飲,-5,',
+        '2024-13-01,expense,餐飲,10,',
+        '2024-01-08,expense,不存在,10,',
+        '2024-01-09,expense,,10,',
+        '2024-01-10,income,薪資,3000,'
+    ])
+    
+    with app.app_context():
+        result = _import(user_id, text)
+        
+        assert result['imported'] == 2
+        assert result['skipped'] == 5
+        assert [error.split(':')[0] for error in result['errors']] == [
+            '第 3 列', '第 4 列', '第 5 列', '第 6 列', '第 7 列'
+        ]
+        assert '不存在' in result['errors'][3]
+        
+        amounts = sorted(t.amount for t in Transaction.query.filter_by(user_id=user_id))
+        assert amounts == [Decimal('120.50'), Decimal('3000.00')]
+        assert RollupService(user_id).verify() == []
+
+
+def test_missing_columns_imports_nothing(app, user_id, categories):
+    with app.app_context():
+        result = _import(user_id, 'date,type,amount\n2024-01-05,expense,10\n')
+        
+        assert result['imported'] == 0
+        assert result['errors'] == ['缺少欄位: category']
+        assert Transaction.query.filter_by(user_id=user_id).count() == 0
+
+
+def test_unknown_categories_are_created_when_requested(app, user_id, categories):
+    text = 'date,type,category,amount,description\n2024-01-05,expense,寵物,80,飼料\n'
+    
+    with app.app_context():
+        result = _import(user_id, text, create_categories=True)
+        
+        assert result['imported'] == 1
+        assert result['errors'] == []
+        category = Category.query.filter_by(user_id=user_id, name='寵物').one()
+        assert category.type == 'expense'
+        assert db.session.scalar(db.select(Transaction.category_id).where(Transaction.user_id == user_id)) == category.id
@@ -0,0 +1,66 @@
+"""Keyset 分頁測試：逐頁往後與往前翻頁時不重複、不遺漏"""
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+import pytest
+from models import db, Transaction
+from utils.pagination import paginate_keyset
+
+COLUMNS = (Transaction.date, Transaction.created_at, Transaction.id)
+
+
+@pytest.fixture
+def transaction_ids(app, user_id, categories):
+    """53 筆交易，日期與建立時間大量重複，排序需靠 id 區分；回傳依排序鍵遞減的 id"""
+    created_at = datetime(2024, 1, 1, 12, 0, 0)
+    with app.app_context():
+        transactions = [
+            Transaction(
+                user_id=user_id,
+                category_id=categories['expense'],
+                type='expense',
+                amount=Decimal('10'),
+                date=date(2024, 1, 1) + timedelta(days=index // 7),
+                created_at=created_at + timedelta(seconds=index % 2)
+            )
+            for index in range(53)
+        ]
+        db.session.add_all(transactions)
+        db.session.commit()
+        
+        ordered = sorted(transactions, key=lambda t: (t.date, t.created_at, t.id), reverse=True)
+        return [transaction.id for transaction in ordered]
+
+
+def _page(user_id, after=None, before=None):
+    query = Transaction.query.filter_by(user_id=user_id)
+    return paginate_keyset(query, COLUMNS, per_page=10, after=after, before=before)
+
+
+def test_forward_and_backward_pages_cover_every_row_once(app, user_id, transaction_ids):
+    with app.app_context():
+        pages = [_page(user_id)]
+        assert not pages[0].has_prev
+        while pages[-1].has_next:
+            pages.append(_page(user_id, after=pages[-1].next_cursor))
+        
+        forward_ids = [item.id for page in pages for item in page.items]
+        assert forward_ids == transaction_ids
+        assert [len(page.items) for page in pages] == [10, 10, 10, 10, 10, 3]
+        
+        # 自最後一頁往前翻，每一頁與往後翻時相同
+        page = pages[-1]
+        for expected in reversed(pages[:-1]):
+            assert page.has_prev
+            page = _page(user_id, before=page.prev_cursor)
+            assert [item.id for item in page.items] == [item.id for item in expected.items]
+        
+        assert not page.has_prev
+        assert page.has_next
+
+
+def test_invalid_cursor_returns_first_page(app, user_id, transaction_ids):
+    with app.app_context():
+        page = _page(user_id, after='not-a-cursor')
+        
+        assert [item.id for item in page.items] == transaction_ids[:10]
+        assert not page.has_prev
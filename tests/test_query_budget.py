@@ -0,0 +1,75 @@
+"""主要頁面的 SQL 查詢數回歸測試（TestingConfig 的 QUERY_BUDGET 超過時直接拋出 QueryBudgetExceeded）"""
+import re
+import pytest
+from app import create_app
+from models import db
+from benchmarks.datagen import BENCH_PASSWORD, SyntheticDataGenerator
+from utils.query_budget import QueryBudgetExceeded, query_budget
+
+_SERVER_TIMING = re.compile(r'desc="(\d+) queries"')
+
+
+@pytest.fixture(scope='module')
+def app():
+    app = create_app('testing')
+    
+    with app.app_context():
+        generator = SyntheticDataGenerator(users=1, years=1, transactions_per_day=3.0, seed=1)
+        generator.generate()
+        app.config['BENCH_USERNAME'] = generator.username(0)
+    
+    @app.route('/_test/over-budget')
+    @query_budget(1)
+    def over_budget():
+        db.session.execute(db.select(1))
+        db.session.execute(db.select(2))
+        return 'ok'
+    
+    return app
+
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    response = client.post('/auth/login', data={
+        'username': app.config['BENCH_USERNAME'],
+        'password': BENCH_PASSWORD
+    })
+    assert response.status_code == 302
+    return client
+
+
+def _query_count(response):
+    return int(_SERVER_TIMING.search(response.headers['Server-Timing']).group(1))
+
+
+@pytest.mark.parametrize('url', [
+    '/transactions/',
+    '/transactions/?count=1',
+    '/dashboard/',
+    '/dashboard/quick-stats',
+    '/goals/'
+])
+def test_page_within_query_budget(app, client, url):
+    app.extensions['cache'].clear()
+    
+    response = client.get(url)
+    
+    assert response.status_code == 200
+    assert _query_count(response) <= app.config['QUERY_BUDGET']
+
+
+def test_transactions_next_page_within_query_budget(app, client):
+    first_page = client.get('/transactions/').get_data(as_text=True)
+    cursor = re.search(r'href="[^"]*[?&]after=([^"&]+)', first_page)
+    assert cursor is not None
+    
+    response = client.get(f'/transactions/?after={cursor.group(1)}')
+    
+    assert response.status_code == 200
+    assert _query_count(response) <= app.config['QUERY_BUDGET']
+
+
+def test_budget_is_enforced(client):
+    with pytest.raises(QueryBudgetExceeded):
+        client.get('/_test/over-budget')
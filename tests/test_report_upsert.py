@@ -0,0 +1,59 @@
+"""月報表 upsert 測試：內容雜湊未改變時不寫入，內容改變時更新"""
+from datetime import date
+from decimal import Decimal
+from sqlalchemy import event
+from models import db, MonthlyReport
+from services.report_service import ReportService
+
+
+def _report_writes(statements):
+    return [sql for sql in statements if 'monthly_reports' in sql and not sql.lstrip().upper().startswith('SELECT')]
+
+
+def test_unchanged_report_is_not_rewritten(app, user_id, categories, add_transaction):
+    add_transaction(user_id, categories['expense'], 'expense', '120', date(2024, 3, 5))
+    add_transaction(user_id, categories['income'], 'income', '3000', date(2024, 3, 1))
+    
+    with app.app_context():
+        report = ReportService(user_id).generate_monthly_report(2024, 3)
+        first_hash, first_created_at = report.payload_hash, report.created_at
+        
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            report = ReportService(user_id).generate_monthly_report(2024, 3)
+            # 並行生成的另一個程序以相同內容 upsert 時也不會覆寫
+            ReportService(user_id)._upsert_report(2024, 3, {
+                'total_income': report.total_income,
+                'total_expense': report.total_expense,
+                'net_amount': report.net_amount,
+                'report_data': report.report_data,
+                'payload_hash': report.payload_hash
+            })
+            db.session.commit()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        
+        # 重新生成時略過寫入，只有上面直接呼叫的 upsert（其 WHERE 條件使它不更新任何列）
+        assert len(_report_writes(statements)) == 1
+        stored = db.session.get(MonthlyReport, report.id)
+        db.session.refresh(stored)
+        assert (stored.payload_hash, stored.created_at) == (first_hash, first_created_at)
+
+
+def test_changed_report_is_updated(app, user_id, categories, add_transaction):
+    add_transaction(user_id, categories['expense'], 'expense', '120', date(2024, 3, 5))
+    
+    with app.app_context():
+        first = ReportService(user_id).generate_monthly_report(2024, 3)
+        first_hash = first.payload_hash
+    
+    add_transaction(user_id, categories['expense'], 'expense', '80', date(2024, 3, 6))
+    
+    with app.app_context():
+        report = ReportService(user_id).generate_monthly_report(2024, 3)
+        
+        assert report.payload_hash != first_hash
+        assert report.total_expense == Decimal('200')
+        assert MonthlyReport.query.filter_by(user_id=user_id).count() == 1
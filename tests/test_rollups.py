@@ -0,0 +1,60 @@
+"""每日彙總測試：新增、修改、刪除與匯入交易後，daily_rollups 需與原始交易一致"""
+import io
+from datetime import date, timedelta
+from models import Transaction
+from services.rollup_service import RollupService
+
+
+def _add(client, category_id, transaction_type, amount, transaction_date):
+    response = client.post('/transactions/add', data={
+        'type': transaction_type,
+        'category_id': category_id,
+        'amount': amount,
+        'date': transaction_date.strftime('%Y-%m-%d'),
+        'description': 'test'
+    })
+    assert response.status_code == 302
+
+
+def test_rollups_match_transactions_after_mixed_writes(app, client, user_id, categories):
+    today = date.today()
+    for day in range(10):
+        _add(client, categories['expense'], 'expense', f'{100 + day}.50', today - timedelta(days=day))
+        _add(client, categories['income'], 'income', '1000', today - timedelta(days=day * 3))
+    
+    with app.app_context():
+        transaction_ids = [
+            transaction.id
+            for transaction in Transaction.query.filter_by(user_id=user_id).order_by(Transaction.id)
+        ]
+    
+    # 修改類別、金額與日期
+    response = client.post(f'/transactions/edit/{transaction_ids[0]}', data={
+        'category_id': categories['other_expense'],
+        'amount': '999.99',
+        'date': (today - timedelta(days=40)).strftime('%Y-%m-%d'),
+        'description': 'edited'
+    })
+    assert response.status_code == 302
+    
+    # 刪除同一天唯一的一筆與還有其他交易的一筆
+    for transaction_id in (transaction_ids[2], transaction_ids[5]):
+        response = client.post(f'/transactions/delete/{transaction_id}')
+        assert response.status_code == 302
+    
+    # 匯入既有與新日期的交易（含一列錯誤資料）
+    csv_text = '\n'.join([
+        'date,type,category,amount,description',
+        f'{today:%Y-%m-%d},expense,餐飲,50,import',
+        f'{today - timedelta(days=60):%Y-%m-%d},expense,交通,75.25,import',
+        f'{today - timedelta(days=60):%Y-%m-%d},income,薪資,not-a-number,import'
+    ])
+    response = client.post('/transactions/import', data={
+        'file': (io.BytesIO(csv_text.encode('utf-8')), 'import.csv')
+    }, content_type='multipart/form-data')
+    assert response.status_code == 200
+    
+    with app.app_context():
+        assert Transaction.query.filter_by(user_id=user_id, description='import').count() == 2
+        assert Transaction.query.filter_by(user_id=user_id, description='edited').count() == 1
+        assert RollupService(user_id).verify() == []
@@ -0,0 +1,232 @@
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from flask import current_app
+
+
+class CacheBackend(ABC):
+    """快取後端介面"""
+    
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+    
+    @abstractmethod
+    def get(self, key):
+        """取得快取值，不存在或已過期時回傳 None"""
+    
+    @abstractmethod
+    def set(self, key, value, ttl=None):
+        """寫入快取值，ttl 為存活秒數（None 使用預設值）"""
+    
+    @abstractmethod
+    def delete(self, key):
+        """刪除快取值"""
+    
+    @abstractmethod
+    def clear(self):
+        """清除所有快取"""
+    
+    def _record(self, hit):
+        # 統計用計數器，不加鎖（允許少量誤差以避免影響熱路徑）
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+    
+    def get_stats(self):
+        """取得命中率統計"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total > 0 else 0
+        }
+
+
+class NullCache(CacheBackend):
+    """不快取任何內容（測試或停用快取時使用）"""
+    
+    def get(self, key):
+        self._record(False)
+        return None
+    
+    def set(self, key, value, ttl=None):
+        pass
+    
+    def delete(self, key):
+        pass
+    
+    def clear(self):
+        pass
+
+
+class LRUCache(CacheBackend):
+    """程序內 LRU 快取，支援 TTL 與筆數上限淘汰"""
+    
+    def __init__(self, max_entries=1024, default_ttl=300):
+        super().__init__()
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            
+            if entry is None:
+                self._record(False)
+                return None
+            
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                self._record(False)
+                return None
+            
+            self._entries.move_to_end(key)
+            self._record(True)
+            return value
+    
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            
+            # 超過上限時淘汰最久未使用的項目
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def __len__(self):
+        return len(self._entries)
+
+
+def _encode_value(value):
+    """JSON 無法直接表示的型別改以帶型別標記的物件儲存"""
+    if isinstance(value, Decimal):
+        return {'__decimal__': str(value)}
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    if isinstance(value, date):
+        return {'__date__': value.isoformat()}
+    raise TypeError(f'無法序列化為快取值的型別: {type(value).__name__}')
+
+
+def _decode_value(obj):
+    """還原 _encode_value 的型別標記"""
+    if len(obj) == 1:
+        if '__decimal__' in obj:
+            return Decimal(obj['__decimal__'])
+        if '__datetime__' in obj:
+            return datetime.fromisoformat(obj['__datetime__'])
+        if '__date__' in obj:
+            return date.fromisoformat(obj['__date__'])
+    return obj
+
+
+def dumps_cache_value(value):
+    """將快取值序列化為 JSON（支援 Decimal、date、datetime；tuple 會還原為 list）"""
+    return json.dumps(value, default=_encode_value, ensure_ascii=False, separators=(',', ':'))
+
+
+def loads_cache_value(raw):
+    """還原 dumps_cache_value 的結果"""
+    return json.loads(raw, object_hook=_decode_value)
+
+
+class RedisCache(CacheBackend):
+    """共用快取後端（Redis 相容伺服器），多個 worker 共用同一份快取
+    
+    值以 JSON 儲存，不使用 pickle：能寫入同一個 Redis 的程序無法藉快取內容在 worker 中執行程式碼。
+    """
+    
+    def __init__(self, url, default_ttl=300, key_prefix='fms:'):
+        super().__init__()
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("使用 Redis 快取需要安裝 redis 套件（pip install redis）")
+        
+        self._client = redis.Redis.from_url(url)
+        self.default_ttl = default_ttl
+        self.key_prefix = key_prefix
+    
+    def get(self, key):
+        raw = self._client.get(self.key_prefix + key)
+        value = None
+        if raw is not None:
+            try:
+                value = loads_cache_value(raw)
+            except ValueError:
+                # 格式不符（例如舊版本以 pickle 寫入的內容）視為未命中，之後會被覆寫
+                raw = None
+        
+        self._record(raw is not None)
+        return value
+    
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        self._client.set(self.key_prefix + key, dumps_cache_value(value), ex=ttl or None)
+    
+    def delete(self, key):
+        self._client.delete(self.key_prefix + key)
+    
+    def clear(self):
+        for key in self._client.scan_iter(match=self.key_prefix + '*'):
+            self._client.delete(key)
+
+
+# 以使用者為單位的快取名稱，資料版本遞增時一併清除
+USER_CACHE_NAMES = ('dashboard',)
+
+
+def user_cache_key(name, user_id):
+    """產生使用者層級的快取鍵"""
+    return f'{name}:{user_id}'
+
+
+def invalidate_user_cache(user_id):
+    """清除使用者的所有快取項目"""
+    cache = get_cache()
+    for name in USER_CACHE_NAMES:
+        cache.delete(user_cache_key(name, user_id))
+
+
+def init_cache(app):
+    """依設定建立快取後端"""
+    backend = app.config.get('CACHE_BACKEND', 'lru')
+    default_ttl = app.config.get('CACHE_DEFAULT_TTL', 300)
+    
+    if backend == 'redis':
+        cache = RedisCache(app.config['CACHE_REDIS_URL'], default_ttl=default_ttl)
+    elif backend == 'null':
+        cache = NullCache()
+    else:
+        cache = LRUCache(
+            max_entries=app.config.get('CACHE_MAX_ENTRIES', 1024),
+            default_ttl=default_ttl
+        )
+    
+    app.extensions['cache'] = cache
+    return cache
+
+
+def get_cache():
+    """取得目前應用程式的快取後端"""
+    return current_app.extensions['cache']
@@ -0,0 +1,208 @@
+import click
+from flask.cli import AppGroup
+
+rollups_cli = AppGroup('rollups', help='每日彙總表維護指令')
+transactions_cli = AppGroup('transactions', help='交易資料指令')
+reports_cli = AppGroup('reports', help='月報表指令')
+anomalies_cli = AppGroup('anomalies', help='異常支出標記指令')
+bench_cli = AppGroup('bench', help='測試資料與效能基準指令')
+
+
+def _get_user_ids(user_id):
+    """取得要處理的使用者 ID 清單"""
+    from models import db, User
+    
+    if user_id:
+        return [user_id]
+    return [row[0] for row in db.session.query(User.id).order_by(User.id).all()]
+
+
+@rollups_cli.command('rebuild')
+@click.option('--user-id', type=int, help='只重建指定使用者')
+def rebuild_rollups(user_id):
+    """依原始交易重建每日彙總"""
+    from services.rollup_service import RollupService
+    
+    for uid in _get_user_ids(user_id):
+        rows = RollupService(uid).rebuild()
+        click.echo(f"使用者 {uid}: 已重建 {rows} 筆彙總")
+    
+    click.echo("✅ 每日彙總重建完成")
+
+
+@rollups_cli.command('verify')
+@click.option('--user-id', type=int, help='只檢查指定使用者')
+@click.option('--fix', is_flag=True, help='發現不一致時自動重建該使用者的彙總')
+def verify_rollups(user_id, fix):
+    """比對每日彙總與原始交易是否一致"""
+    from services.rollup_service import RollupService
+    
+    failed_users = 0
+    
+    for uid in _get_user_ids(user_id):
+        rollup_service = RollupService(uid)
+        mismatches = rollup_service.verify()
+        
+        if not mismatches:
+            continue
+        
+        failed_users += 1
+        click.echo(f"⚠️  使用者 {uid}: {len(mismatches)} 筆彙總不一致")
+        for item in mismatches[:10]:
+            click.echo(
+                f"   {item['date']} {item['type']} 類別 {item['category_id']}: "
+                f"應為 {item['expected']}，實際 {item['actual']}"
+            )
+        
+        if fix:
+            rollup_service.rebuild()
+            click.echo(f"   已重建使用者 {uid} 的彙總")
+    
+    if failed_users and not fix:
+        raise SystemExit(1)
+    
+    click.echo(f"✅ 檢查完成，不一致的使用者: {failed_users}")
+
+
+@transactions_cli.command('import')
+@click.argument('csv_file', type=click.Path(exists=True, dir_okay=False))
+@click.option('--username', required=True, help='匯入至此使用者')
+@click.option('--create-categories', is_flag=True, help='自動建立不存在的類別')
+def import_transactions(csv_file, username, create_categories):
+    """從 CSV 檔案批次匯入交易"""
+    import time
+    from models import User
+    from services.import_service import ImportService
+    
+    user = User.query.filter_by(username=username).first()
+    if not user:
+        raise click.ClickException(f"找不到使用者 {username}")
+    
+    started = time.perf_counter()
+    with open(csv_file, encoding='utf-8-sig', newline='') as text_stream:
+        result = ImportService(user.id, create_categories=create_categories).import_csv(text_stream)
+    elapsed = time.perf_counter() - started
+    
+    for error in result['errors']:
+        click.echo(f"⚠️  {error}")
+    
+    click.echo(f"✅ 匯入完成：成功 {result['imported']} 筆，略過 {result['skipped']} 筆，耗時 {elapsed:.2f} 秒")
+
+
+@reports_cli.command('generate')
+@click.option('--year', type=int, required=True, help='報表年份')
+@click.option('--month', type=click.IntRange(1, 12), required=True, help='報表月份')
+@click.option('--workers', type=int, help='平行處理的程序數（預設使用 REPORT_WORKERS）')
+@click.option('--chunk-size', type=int, help='每批交給程序池的使用者數（預設使用 REPORT_CHUNK_SIZE）')
+@click.option('--force', is_flag=True, help='忽略檢查點，重新生成所有使用者的報表')
+def generate_reports(year, month, workers, chunk_size, force):
+    """為所有使用者批次生成月報表（中斷後重新執行會從檢查點續跑）"""
+    from flask import current_app
+    from services.report_batch_service import ReportBatchRunner
+    
+    runner = ReportBatchRunner(
+        current_app._get_current_object(), year, month,
+        workers=workers, chunk_size=chunk_size
+    )
+    stats = runner.run(force=force)
+    
+    click.echo(
+        f"✅ {year}-{month:02d} 月報表生成完成：成功 {stats['completed']}，"
+        f"無交易 {stats['no_data']}，失敗 {stats['failed']}"
+    )
+    click.echo(
+        f"   本次處理 {stats['processed_users']} 位使用者，耗時 {stats['elapsed_seconds']:.2f} 秒，"
+        f"{stats['users_per_second']:.1f} 位/秒，p50 {stats['p50_ms']:.1f} ms，p95 {stats['p95_ms']:.1f} ms"
+    )
+    
+    if stats['failed']:
+        raise SystemExit(1)
+
+
+@anomalies_cli.command('refresh')
+@click.option('--user-id', type=int, help='只處理指定使用者')
+@click.option('--days', type=int, default=365, show_default=True, help='重新判定最近幾天的支出')
+def refresh_anomalies(user_id, days):
+    """依目前的偵測設定重新判定異常支出標記（升級後補建或調整門檻後使用）"""
+    from datetime import datetime, timedelta
+    from models import db
+    from services.anomaly_service import AnomalyService
+    
+    start_date = datetime.now().date() - timedelta(days=days)
+    
+    for uid in _get_user_ids(user_id):
+        flagged = AnomalyService(uid).refresh(start_date)
+        db.session.commit()
+        click.echo(f"使用者 {uid}: 標記 {flagged} 筆異常支出")
+    
+    click.echo("✅ 異常支出標記更新完成")
+
+
+@bench_cli.command('seed')
+@click.option('--users', type=int, default=10, show_default=True, help='使用者數')
+@click.option('--years', type=int, default=1, show_default=True, help='交易歷史年數')
+@click.option('--per-day', type=float, default=3.0, show_default=True, help='每位使用者每日平均支出筆數')
+@click.option('--skew', type=float, default=1.2, show_default=True, help='支出類別集中程度（Zipf 指數）')
+@click.option('--goals', default='saving=1,expense_limit=1', show_default=True, help='每位使用者的目標組合')
+@click.option('--seed', type=int, default=42, show_default=True, help='亂數種子')
+@click.option('--end-date', type=click.DateTime(formats=['%Y-%m-%d']), help='資料最後一天（預設今天，固定後可重現相同資料）')
+@click.option('--prefix', default='bench', show_default=True, help='使用者名稱前綴')
+def seed_bench_data(users, years, per_day, skew, goals, seed, end_date, prefix):
+    """產生可重現的測試資料（密碼皆為 bench123）"""
+    from benchmarks.datagen import SyntheticDataGenerator, parse_goal_mix
+    
+    try:
+        goal_mix = parse_goal_mix(goals)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='--goals')
+    
+    generator = SyntheticDataGenerator(
+        users=users, years=years, transactions_per_day=per_day, category_skew=skew,
+        goal_mix=goal_mix, seed=seed, end_date=end_date.date() if end_date else None, username_prefix=prefix
+    )
+    try:
+        totals = generator.generate()
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    
+    click.echo(
+        f"✅ 已建立 {totals['users']} 位使用者、{totals['transactions']} 筆交易、{totals['goals']} 個目標，"
+        f"耗時 {totals['elapsed_seconds']:.2f} 秒（{generator.username(0)} ~ {generator.username(users - 1)}）"
+    )
+
+
+@bench_cli.command('run')
+@click.option('--username', default='bench00000', show_default=True, help='量測使用的使用者（需由 bench seed 建立）')
+@click.option('--repeat', type=int, default=5, show_default=True, help='每個項目的量測次數')
+@click.option('--output', type=click.Path(dir_okay=False, writable=True), help='將 JSON 結果寫入檔案（預設輸出到標準輸出）')
+def run_benchmarks(username, repeat, output):
+    """執行服務層與主要路由的效能基準，輸出 JSON（含耗時與查詢數）"""
+    import json
+    from flask import current_app
+    from benchmarks.suite import BenchmarkSuite
+    
+    try:
+        report = BenchmarkSuite(current_app._get_current_object(), username, repeat=repeat).run()
+    except (ValueError, RuntimeError) as e:
+        raise click.ClickException(str(e))
+    
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        click.echo(f"✅ 已寫入 {output}（{len(report['results'])} 個項目）")
+    else:
+        click.echo(text)
+    
+    for result in report['results']:
+        if 'error' in result:
+            click.echo(f"⚠️  {result['name']} 執行失敗: {result['error']}", err=True)
+
+
+def register_commands(app):
+    """註冊 flask 命令列指令"""
+    app.cli.add_command(rollups_cli)
+    app.cli.add_command(transactions_cli)
+    app.cli.add_command(reports_cli)
+    app.cli.add_command(anomalies_cli)
+    app.cli.add_command(bench_cli)
@@ -0,0 +1,89 @@
+import time
+from sqlalchemy import exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+from utils.metrics import db_pool_checkout_wait, db_pool_timeouts
+
+
+class TimedQueuePool(QueuePool):
+    """記錄取得連線耗時與逾時次數的 QueuePool
+    
+    耗時包含等待其他請求歸還連線、建立新連線與 pre-ping 檢查，
+    連線池耗盡時會先反映在這個直方圖上，再變成 DB_POOL_TIMEOUT 逾時錯誤。
+    engine.dispose() 以 recreate() 重建連線池時會沿用這個類別。
+    """
+    
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            db_pool_timeouts.inc()
+            raise
+        finally:
+            db_pool_checkout_wait.observe(value=time.perf_counter() - started)
+
+
+def build_engine_options(config):
+    """依 DB_POOL_* 配置產生 SQLALCHEMY_ENGINE_OPTIONS（SQLite 或未設定資料庫時回傳 None）"""
+    uri = config.get('SQLALCHEMY_DATABASE_URI')
+    if not uri:
+        return None
+    
+    url = make_url(uri)
+    if url.get_backend_name() == 'sqlite':
+        # SQLite 沿用 Flask-SQLAlchemy 的預設連線池（記憶體資料庫使用 StaticPool）
+        return None
+    
+    options = {
+        'poolclass': TimedQueuePool,
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+        'pool_use_lifo': config['DB_POOL_USE_LIFO']
+    }
+    
+    if config.get('DB_PGBOUNCER') and url.get_driver_name() == 'psycopg':
+        # PgBouncer transaction pooling 下同一個連線的語句可能送到不同的伺服器連線，
+        # psycopg3 預設執行 5 次後改用伺服器端 prepared statement，需停用
+        options['connect_args'] = {'prepare_threshold': None}
+    
+    return options
+
+
+def init_db_pool(app):
+    """將連線池配置合併到 SQLALCHEMY_ENGINE_OPTIONS（需在 db.init_app 之前呼叫，明確設定的選項優先）"""
+    options = build_engine_options(app.config)
+    if options is None:
+        return
+    
+    engine_options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    connect_args = {**options.pop('connect_args', {}), **engine_options.get('connect_args', {})}
+    for key, value in options.items():
+        engine_options.setdefault(key, value)
+    if connect_args:
+        engine_options['connect_args'] = connect_args
+    
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options
+
+
+def get_pool_status(engine):
+    """連線池狀態（SQLite 等不提供統計的連線池只回傳類別名稱）"""
+    pool = engine.pool
+    status = {'pool': type(pool).__name__}
+    if not isinstance(pool, QueuePool):
+        return status
+    
+    status.update({
+        'size': pool.size(),
+        'checked_out': pool.checkedout(),
+        'checked_in': pool.checkedin(),
+        'overflow': pool.overflow(),
+        'max_connections': pool.size() + pool._max_overflow if pool._max_overflow >= 0 else None,
+        'timeout': pool.timeout(),
+        'recycle': pool._recycle,
+        'pre_ping': pool._pre_ping
+    })
+    return status
@@ -0,0 +1,20 @@
+from flask import request, session, make_response
+
+
+def conditional_response(etag, build_response):
+    """依 ETag 回傳 304 Not Modified，或呼叫 build_response 建立完整回應
+    
+    資料未變動時不需重新計算頁面內容。
+    有待顯示的 flash 訊息時不使用快取，避免瀏覽器沿用含舊訊息的頁面。
+    """
+    if session.get('_flashes'):
+        return build_response()
+    
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        response = make_response(build_response())
+    
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
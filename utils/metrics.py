@@ -0,0 +1,225 @@
+import bisect
+import time
+from flask import g, request
+from sqlalchemy import event
+from models import db
+
+# 延遲直方圖的桶上限（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values)) + (extra or [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """指標基底類別
+    
+    數值存放在以標籤值為鍵的 dict 中，更新時不加鎖（與快取命中計數相同，
+    允許多執行緒同時更新時有少量誤差，以避免影響請求的熱路徑）。
+    """
+    type = None
+    
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+    
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        lines.extend(self._samples())
+        return lines
+    
+    def _samples(self):
+        return [
+            f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+            for labels, value in sorted(self._values.items())
+        ]
+
+
+class Counter(Metric):
+    """只增不減的計數器"""
+    type = 'counter'
+    
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+    
+    def set_total(self, *labels, value):
+        """以外部累計值（例如快取後端的命中數）更新計數器"""
+        self._values[labels] = value
+
+
+class Gauge(Metric):
+    """可任意設定的量測值（在收集時更新）"""
+    type = 'gauge'
+    
+    def set(self, *labels, value):
+        self._values[labels] = value
+
+
+class Histogram(Metric):
+    """累積直方圖（各桶計數、總和與次數）"""
+    type = 'histogram'
+    
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+    
+    def observe(self, *labels, value):
+        series = self._values.get(labels)
+        if series is None:
+            # [各桶計數..., +Inf 桶計數, 總和]
+            series = self._values.setdefault(labels, [0] * (len(self.buckets) + 1) + [0.0])
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+    
+    def _samples(self):
+        lines = []
+        for labels, series in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                lines.append(
+                    f'{self.name}_bucket{_format_labels(self.labelnames, labels, [("le", _format_value(bound))])} {cumulative}'
+                )
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(series[-1])}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}')
+        return lines
+
+
+class MetricsRegistry:
+    """指標登錄表，輸出 Prometheus 文字格式"""
+    
+    def __init__(self):
+        self._metrics = []
+    
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+    
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+http_requests = registry.register(Counter(
+    'http_requests_total', 'HTTP 請求數', ('endpoint', 'method', 'status')
+))
+http_request_duration = registry.register(Histogram(
+    'http_request_duration_seconds', 'HTTP 請求處理時間（秒）', ('endpoint', 'method')
+))
+db_pool_checkouts = registry.register(Counter(
+    'db_pool_checkouts_total', '自連線池取出連線的次數'
+))
+db_pool_connects = registry.register(Counter(
+    'db_pool_connections_created_total', '連線池建立新資料庫連線的次數'
+))
+db_pool_checkout_wait = registry.register(Histogram(
+    'db_pool_checkout_wait_seconds', '自連線池取得連線的耗時（秒，含等待、建立連線與 pre-ping）',
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30)
+))
+db_pool_timeouts = registry.register(Counter(
+    'db_pool_timeouts_total', '連線池用盡、等待超過 DB_POOL_TIMEOUT 的次數'
+))
+db_pool_invalidations = registry.register(Counter(
+    'db_pool_invalidations_total', '因資料庫斷線、重啟或容錯移轉而丟棄的連線數'
+))
+db_pool_connections = registry.register(Gauge(
+    'db_pool_connections', '連線池連線數（state: size / checked_out / checked_in / overflow）', ('state',)
+))
+cache_requests = registry.register(Counter(
+    'cache_requests_total', '快取讀取次數（result: hit / miss）', ('result',)
+))
+cache_hit_ratio = registry.register(Gauge(
+    'cache_hit_ratio', '快取命中率'
+))
+job_runs = registry.register(Counter(
+    'scheduler_job_runs_total', '排程任務執行次數', ('job', 'status')
+))
+job_duration = registry.register(Histogram(
+    'scheduler_job_duration_seconds', '排程任務執行時間（秒）', ('job',),
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 1800, 3600)
+))
+
+
+def track_job(job_id, func, *args):
+    """執行排程任務並記錄耗時與結果（任務拋出例外或回傳 False 視為失敗）"""
+    started = time.perf_counter()
+    status = 'failure'
+    
+    try:
+        status = 'failure' if func(*args) is False else 'success'
+    finally:
+        job_duration.observe(job_id, value=time.perf_counter() - started)
+        job_runs.inc(job_id, status)
+
+
+def _start_timer():
+    g._metrics_started = time.perf_counter()
+
+
+def _record_request(response):
+    started = g.pop('_metrics_started', None)
+    if started is not None:
+        endpoint = request.endpoint or 'unmatched'
+        http_request_duration.observe(endpoint, request.method, value=time.perf_counter() - started)
+        http_requests.inc(endpoint, request.method, str(response.status_code))
+    return response
+
+
+def init_metrics(app):
+    """啟用請求、連線池、快取與排程任務的指標收集（METRICS_ENABLED=false 時停用，/metrics 回傳 404）
+    
+    指標存放在程序記憶體中，多個 gunicorn worker 各自統計。
+    """
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    
+    if app.config.get('METRICS_REQUIRE_TOKEN') and not app.config.get('METRICS_TOKEN'):
+        raise ValueError("生產環境啟用 /metrics 必須設定 METRICS_TOKEN 環境變數（或設定 METRICS_ENABLED=false）")
+    
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
+    
+    with app.app_context():
+        pool = db.engine.pool
+    
+    # engine.dispose() 重建的連線池會沿用這些事件
+    event.listen(pool, 'checkout', lambda *args: db_pool_checkouts.inc())
+    event.listen(pool, 'connect', lambda *args: db_pool_connects.inc())
+    event.listen(pool, 'invalidate', lambda *args: db_pool_invalidations.inc())
+    
+    app.extensions['metrics'] = registry
+
+
+def collect_runtime_metrics(app):
+    """更新收集時才計算的指標（連線池與快取狀態，需在應用程式上下文中呼叫）"""
+    pool = db.engine.pool
+    # SQLite 等使用的連線池不一定提供這些統計
+    for state, method in (('size', 'size'), ('checked_out', 'checkedout'),
+                          ('checked_in', 'checkedin'), ('overflow', 'overflow')):
+        if hasattr(pool, method):
+            db_pool_connections.set(state, value=getattr(pool, method)())
+    
+    stats = app.extensions['cache'].get_stats()
+    cache_requests.set_total('hit', value=stats['hits'])
+    cache_requests.set_total('miss', value=stats['misses'])
+    cache_hit_ratio.set(value=stats['hit_ratio'])
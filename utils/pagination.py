@@ -0,0 +1,94 @@
+import base64
+from datetime import date, datetime
+from sqlalchemy import tuple_
+
+
+def encode_cursor(values):
+    """將排序鍵值編碼為 URL 安全的游標字串"""
+    raw = '|'.join(v.isoformat() if isinstance(v, (date, datetime)) else str(v) for v in values)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, columns):
+    """解碼游標字串，格式錯誤時回傳 None"""
+    if not cursor:
+        return None
+    
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        parts = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8').split('|')
+        if len(parts) != len(columns):
+            return None
+        
+        values = []
+        for part, column in zip(parts, columns):
+            python_type = column.type.python_type
+            if python_type is datetime:
+                values.append(datetime.fromisoformat(part))
+            elif python_type is date:
+                values.append(date.fromisoformat(part))
+            else:
+                values.append(python_type(part))
+        return tuple(values)
+    except (ValueError, TypeError, UnicodeError):
+        return None
+
+
+class KeysetPage:
+    """Keyset（游標）分頁結果"""
+    
+    def __init__(self, items, columns, per_page, has_next, has_prev):
+        self.items = items
+        self.columns = columns
+        self.per_page = per_page
+        self.has_next = has_next
+        self.has_prev = has_prev
+    
+    def _cursor_for(self, item):
+        return encode_cursor([getattr(item, column.key) for column in self.columns])
+    
+    @property
+    def next_cursor(self):
+        """下一頁的游標（最後一筆的排序鍵）"""
+        if not self.has_next or not self.items:
+            return None
+        return self._cursor_for(self.items[-1])
+    
+    @property
+    def prev_cursor(self):
+        """上一頁的游標（第一筆的排序鍵）"""
+        if not self.has_prev or not self.items:
+            return None
+        return self._cursor_for(self.items[0])
+
+
+def paginate_keyset(query, columns, per_page=20, after=None, before=None):
+    """依排序鍵遞減的 Keyset 分頁
+    
+    columns 為排序鍵欄位（需能唯一識別一筆資料，並有對應的複合索引），
+    after / before 為上一頁回傳的游標。每頁成本與頁數深度無關，且不需 COUNT(*)。
+    """
+    after_values = decode_cursor(after, columns)
+    before_values = decode_cursor(before, columns) if after_values is None else None
+    
+    key = tuple_(*columns)
+    
+    if before_values is not None:
+        # 往前翻頁：反向排序取資料後再反轉
+        rows = query.filter(key > tuple_(*before_values)).order_by(
+            *[column.asc() for column in columns]
+        ).limit(per_page + 1).all()
+        
+        has_prev = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        return KeysetPage(items, columns, per_page, has_next=True, has_prev=has_prev)
+    
+    if after_values is not None:
+        query = query.filter(key < tuple_(*after_values))
+    
+    rows = query.order_by(
+        *[column.desc() for column in columns]
+    ).limit(per_page + 1).all()
+    
+    has_next = len(rows) > per_page
+    return KeysetPage(rows[:per_page], columns, per_page, has_next=has_next, has_prev=after_values is not None)
@@ -0,0 +1,46 @@
+import logging
+from flask import current_app, g, request
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """請求執行的 SQL 查詢數超過上限（測試環境中讓測試失敗）"""
+
+
+def query_budget(limit):
+    """為單一路由指定查詢數上限（覆寫 QUERY_BUDGET）"""
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+def get_query_count():
+    """取得本次請求目前已執行的查詢數"""
+    stats = g.get('_query_stats')
+    return stats.count if stats else 0
+
+
+def _check_budget(response):
+    view = current_app.view_functions.get(request.endpoint)
+    limit = getattr(view, 'query_budget', None) or current_app.config.get('QUERY_BUDGET')
+    count = get_query_count()
+    
+    if limit and count > limit:
+        message = f"{request.method} {request.path} 執行了 {count} 次查詢，超過上限 {limit}"
+        if current_app.config.get('QUERY_BUDGET_STRICT'):
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+    
+    return response
+
+
+def init_query_budget(app):
+    """依 QUERY_BUDGET 設定啟用每個請求的查詢數檢查
+    
+    查詢數來自 utils.query_stats 的引擎事件統計（含延遲載入等隱含查詢，需先呼叫 init_query_stats），
+    超過上限時記錄警告；QUERY_BUDGET_STRICT（測試環境）則拋出 QueryBudgetExceeded。
+    """
+    if app.config.get('QUERY_BUDGET'):
+        app.after_request(_check_budget)
@@ -0,0 +1,178 @@
+import heapq
+import json
+import logging
+import re
+import time
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from models import db
+
+logger = logging.getLogger(__name__)
+
+# 指紋化時將 IN 清單等連續的參數佔位符合併，讓不同長度的清單視為同一條語句
+_PLACEHOLDER_LIST = re.compile(r'\(\s*(?:\?|%s|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+))*\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def fingerprint(statement):
+    """將 SQL 語句正規化為指紋（合併空白與參數清單）"""
+    return _PLACEHOLDER_LIST.sub('(?)', _WHITESPACE.sub(' ', statement).strip())
+
+
+class RequestQueryStats:
+    """單一請求的 SQL 執行統計（查詢數、資料庫時間、最慢語句、重複語句）"""
+    
+    def __init__(self, slowest_count=3):
+        self.count = 0
+        self.total_ms = 0.0
+        self.slowest_count = slowest_count
+        self._slowest = []
+        self._fingerprints = {}
+    
+    def record(self, statement, elapsed_ms):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        
+        key = fingerprint(statement)
+        count, total = self._fingerprints.get(key, (0, 0.0))
+        self._fingerprints[key] = (count + 1, total + elapsed_ms)
+        
+        entry = (elapsed_ms, self.count, key)
+        if len(self._slowest) < self.slowest_count:
+            heapq.heappush(self._slowest, entry)
+        elif entry > self._slowest[0]:
+            heapq.heapreplace(self._slowest, entry)
+    
+    def slowest(self):
+        """最慢的語句（由慢到快）"""
+        return [
+            {'statement': statement, 'ms': round(elapsed_ms, 2)}
+            for elapsed_ms, _, statement in sorted(self._slowest, reverse=True)
+        ]
+    
+    def repeated(self, threshold):
+        """執行次數達門檻的相同語句（可能的 N+1 查詢），依次數由多到少"""
+        return [
+            {'statement': statement, 'count': count, 'ms': round(total, 2)}
+            for statement, (count, total) in sorted(
+                self._fingerprints.items(), key=lambda item: item[1][0], reverse=True
+            )
+            if count >= threshold
+        ]
+
+
+def get_request_stats():
+    """取得本次請求的 SQL 統計（無請求上下文時回傳 None）"""
+    if not has_request_context():
+        return None
+    stats = g.get('_query_stats')
+    if stats is None:
+        stats = g._query_stats = RequestQueryStats(current_app.config.get('SQL_SLOWEST_COUNT', 3))
+    return stats
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['_query_started'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop('_query_started', None)
+    if started is None or not has_app_context():
+        return
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    
+    stats = get_request_stats()
+    if stats is not None:
+        stats.record(statement, elapsed_ms)
+    
+    threshold = current_app.config.get('SLOW_QUERY_MS', 0)
+    if threshold and elapsed_ms >= threshold:
+        _log_slow_query(conn, statement, parameters, elapsed_ms, executemany)
+
+
+def _log_slow_query(conn, statement, parameters, elapsed_ms, executemany):
+    """記錄慢查詢的語句、參數與執行計畫"""
+    plan = None
+    if current_app.config.get('SLOW_QUERY_EXPLAIN', False) and not executemany:
+        plan = _explain(conn, statement, parameters)
+    
+    logger.warning(json.dumps({
+        'event': 'slow_query',
+        'ms': round(elapsed_ms, 2),
+        'statement': _WHITESPACE.sub(' ', statement).strip(),
+        'parameters': list(parameters[:10]) if executemany else [parameters],  # executemany 只記錄前 10 組
+        'plan': plan,
+        'path': request.path if has_request_context() else None
+    }, ensure_ascii=False, default=str))
+
+
+def _explain(conn, statement, parameters):
+    """以同一個連線取得 SELECT 語句的執行計畫（不觸發引擎事件，失敗時回傳錯誤訊息）
+    
+    在 SAVEPOINT 中執行：PostgreSQL 中失敗的語句會讓整個交易進入中止狀態，
+    失敗時回滾到 SAVEPOINT，請求後續的語句與 commit 不受影響。
+    """
+    if not statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return None
+    
+    prefix = 'EXPLAIN QUERY PLAN ' if conn.dialect.name == 'sqlite' else 'EXPLAIN '
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute('SAVEPOINT slow_query_explain')
+        try:
+            cursor.execute(prefix + statement, parameters)
+            plan = [' '.join(str(value) for value in row) for row in cursor.fetchall()]
+        except Exception as e:
+            cursor.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+            plan = [f'EXPLAIN 失敗: {e}']
+        cursor.execute('RELEASE SAVEPOINT slow_query_explain')
+        return plan
+    except Exception as e:
+        return [f'EXPLAIN 失敗: {e}']
+    finally:
+        cursor.close()
+
+
+def _finish_request(response):
+    stats = g.get('_query_stats')
+    if stats is None:
+        return response
+    
+    config = current_app.config
+    
+    if config.get('SQL_SERVER_TIMING', True):
+        response.headers.add('Server-Timing', f'db;dur={stats.total_ms:.2f};desc="{stats.count} queries"')
+    
+    repeated = stats.repeated(config.get('SQL_REPEAT_THRESHOLD', 5))
+    log = logger.warning if repeated else logger.info
+    log(json.dumps({
+        'event': 'request_sql',
+        'method': request.method,
+        'path': request.path,
+        'endpoint': request.endpoint,
+        'status': response.status_code,
+        'queries': stats.count,
+        'db_ms': round(stats.total_ms, 2),
+        'slowest': stats.slowest(),
+        'repeated': repeated
+    }, ensure_ascii=False))
+    
+    return response
+
+
+def init_query_stats(app):
+    """以 SQLAlchemy 引擎事件啟用 SQL 統計
+    
+    每個請求累計查詢數與資料庫時間，回應附加 Server-Timing 標頭並輸出一筆 JSON 結構化日誌
+    （含最慢語句與重複執行的語句指紋）；超過 SLOW_QUERY_MS 的語句另外記錄參數（SLOW_QUERY_EXPLAIN 時附上 EXPLAIN 結果）。
+    """
+    instrumentation = app.config.get('SQL_INSTRUMENTATION', True)
+    if not (instrumentation or app.config.get('SLOW_QUERY_MS') or app.config.get('QUERY_BUDGET')):
+        return
+    
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(db.engine, 'after_cursor_execute', _after_cursor_execute)
+    
+    if instrumentation:
+        app.after_request(_finish_request)
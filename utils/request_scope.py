@@ -0,0 +1,50 @@
+import copy
+import functools
+from flask import g, has_request_context
+
+
+def get_service(service_class, user_id):
+    """取得請求範圍內共用的服務實例（無請求上下文時建立新實例）"""
+    if not has_request_context():
+        return service_class(user_id)
+    
+    services = g.setdefault('_services', {})
+    key = (service_class, user_id)
+    if key not in services:
+        services[key] = service_class(user_id)
+    return services[key]
+
+
+def request_memoize(method):
+    """在同一個請求內快取服務方法的結果
+    
+    以 (類別, 方法, user_id, 參數) 為鍵儲存在 flask.g，只用於唯讀查詢方法；
+    回傳深複製避免呼叫端修改共用結果。資料寫入後由 clear_request_memo() 清除。
+    排程與命令列（無請求上下文）不快取。
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not has_request_context():
+            return method(self, *args, **kwargs)
+        
+        key = (type(self).__name__, method.__name__, self.user_id, args, tuple(sorted(kwargs.items())))
+        memo = g.setdefault('_request_memo', {})
+        
+        try:
+            if key in memo:
+                return copy.deepcopy(memo[key])
+        except TypeError:
+            # 參數無法雜湊時不快取
+            return method(self, *args, **kwargs)
+        
+        result = method(self, *args, **kwargs)
+        memo[key] = result
+        return copy.deepcopy(result)
+    
+    return wrapper
+
+
+def clear_request_memo():
+    """清除本次請求的查詢結果快取（資料異動後呼叫）"""
+    if has_request_context():
+        g.pop('_request_memo', None)
@@ -2,6 +2,12 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 from datetime import datetime, timedelta
 import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+from utils.metrics import track_job
 
 # 設定日誌
 logging.basicConfig(level=logging.INFO)
@@ -11,88 +17,164 @@ scheduler = None
 
 
 def generate_all_monthly_reports(app):
-    """為所有使用者生成上月報表"""
+    """在獨立程序中以 flask reports generate 為所有使用者生成上月報表
+    
+    排程器執行於 web worker 的背景執行緒，在此 fork 程序池會複製其他執行緒持有的鎖，
+    也不可重建 worker 正在使用的連線池；子程序是單執行緒的 CLI 程序，可安全地分派給程序池。
+    """
+    # 計算上個月
+    today = datetime.now()
+    if today.month == 1:
+        last_month_year = today.year - 1
+        last_month = 12
+    else:
+        last_month_year = today.year
+        last_month = today.month - 1
+    
+    logger.info(f"開始生成 {last_month_year} 年 {last_month} 月的月報表...")
+    
+    # 子程序不啟動排程器；中斷後重新執行會從檢查點續跑
+    command = [
+        sys.executable, '-m', 'flask', '--app', 'app', 'reports', 'generate',
+        '--year', str(last_month_year), '--month', str(last_month)
+    ]
+    timeout = app.config['REPORT_BATCH_TIMEOUT']
+    
+    # 子程序在獨立的程序群組中執行，逾時時連同其程序池一起終止，避免卡住排程器的執行緒
+    process = subprocess.Popen(
+        command, cwd=app.root_path, env=dict(os.environ, ENABLE_SCHEDULER='false'),
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, start_new_session=True
+    )
+    try:
+        stdout, stderr = process.communicate(timeout=timeout)
+        timed_out = False
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        stdout, stderr = process.communicate()
+        timed_out = True
+    
+    for line in stdout.splitlines():
+        logger.info(line)
+    if timed_out:
+        logger.error(f"月報表批次生成超過 {timeout} 秒未完成，已終止子程序，可重新執行以從檢查點續跑")
+        return False
+    if process.returncode != 0:
+        logger.error(
+            f"月報表批次生成失敗（結束碼 {process.returncode}），可重新執行以從檢查點續跑: "
+            f"{stderr.strip()[-2000:]}"
+        )
+        return False
+    
+    return True
+
+
+def update_all_goals(app):
+    """重新計算所有使用者的目標進度（校正交易寫入時增量更新可能累積的誤差）
+    
+    以單一分組查詢計算所有進行中目標的金額，只對有變動的目標分批執行 UPDATE，
+    每批獨立 commit 以縮短交易與連線占用時間。
+    """
     with app.app_context():
-        from models import db, User
-        from services.report_service import ReportService
+        from models import db
+        from services.goal_service import GoalService
+        from services.data_version_service import DataVersionService
+        
+        chunk_size = app.config.get('GOAL_UPDATE_CHUNK_SIZE', 1000)
         
-        # 計算上個月
-        today = datetime.now()
-        if today.month == 1:
-            last_month_year = today.year - 1
-            last_month = 12
-        else:
-            last_month_year = today.year
-            last_month = today.month - 1
+        logger.info("開始更新所有目標進度...")
+        started = time.perf_counter()
+        
+        rows = GoalService.active_goal_progress_query().all()
+        query_elapsed = time.perf_counter() - started
+        
+        updates = []
+        for row in rows:
+            current_amount = GoalService.progress_amount(row)
+            status = 'active'
+            
+            # 檢查是否達成
+            if current_amount >= row.target_amount:
+                status = 'completed'
+            
+            if current_amount != row.current_amount or status != 'active':
+                updates.append({
+                    'goal_id': row.id,
+                    'user_id': row.user_id,
+                    'current_amount': current_amount,
+                    'status': status
+                })
         
-        logger.info(f"開始生成 {last_month_year} 年 {last_month} 月的月報表...")
+        logger.info(
+            f"已計算 {len(rows)} 個進行中目標（{query_elapsed * 1000:.1f} ms），"
+            f"需更新 {len(updates)} 個"
+        )
         
-        # 獲取所有使用者
-        users = User.query.all()
-        success_count = 0
-        error_count = 0
+        total_goals_updated = 0
+        completed_count = 0
+        failed_chunks = 0
         
-        for user in users:
+        for index in range(0, len(updates), chunk_size):
+            chunk = updates[index:index + chunk_size]
+            chunk_started = time.perf_counter()
+            
             try:
-                report_service = ReportService(user.id)
-                report = report_service.generate_monthly_report(last_month_year, last_month)
-                
-                if report:
-                    logger.info(f"使用者 {user.username} 的月報表已生成")
-                    success_count += 1
-                else:
-                    logger.info(f"使用者 {user.username} 在 {last_month_year}-{last_month} 無交易記錄")
+                total_goals_updated += GoalService.bulk_apply_progress(chunk)
+                DataVersionService.bump_many(sorted({item['user_id'] for item in chunk}))
+                db.session.commit()
             
             except Exception as e:
-                logger.error(f"生成使用者 {user.username} 的月報表時發生錯誤: {e}")
-                error_count += 1
+                db.session.rollback()
+                logger.error(f"更新第 {index // chunk_size + 1} 批目標時發生錯誤: {e}")
+                failed_chunks += 1
+                continue
+            
+            completed_count += sum(1 for item in chunk if item['status'] == 'completed')
+            logger.info(
+                f"第 {index // chunk_size + 1} 批：{len(chunk)} 個目標，"
+                f"耗時 {(time.perf_counter() - chunk_started) * 1000:.1f} ms"
+            )
         
-        logger.info(f"月報表生成完成。成功: {success_count}, 失敗: {error_count}")
+        logger.info(
+            f"目標更新完成。共更新 {total_goals_updated} 個目標，達成 {completed_count} 個，"
+            f"總耗時 {time.perf_counter() - started:.2f} 秒"
+        )
+        return failed_chunks == 0
 
 
-def update_all_goals(app):
-    """更新所有使用者的目標進度"""
+def refresh_dirty_reports(app):
+    """重新生成因交易異動而過期的月報表"""
     with app.app_context():
-        from models import db, User, Goal
-        from services.goal_service import GoalService
+        from models import db, DirtyReportMonth
+        from services.report_service import ReportService
         
-        logger.info("開始更新所有目標進度...")
+        user_ids = [
+            row[0] for row in db.session.query(DirtyReportMonth.user_id).distinct().order_by(DirtyReportMonth.user_id)
+        ]
         
-        # 獲取所有使用者
-        users = User.query.all()
-        total_goals_updated = 0
+        if not user_ids:
+            return
+        
+        started = time.perf_counter()
+        refreshed_count = 0
+        failed_count = 0
         
-        for user in users:
+        for user_id in user_ids:
             try:
-                goal_service = GoalService(user.id)
-                
-                # 獲取使用者的所有進行中目標
-                active_goals = Goal.query.filter_by(
-                    user_id=user.id,
-                    status='active'
-                ).all()
-                
-                for goal in active_goals:
-                    goal_service.update_goal_progress(goal.id)
-                    
-                    # 檢查是否達成
-                    if goal.current_amount >= goal.target_amount:
-                        goal.status = 'completed'
-                        logger.info(f"目標 {goal.name} 已達成！")
-                    
-                    total_goals_updated += 1
-                
-                db.session.commit()
-            
+                refreshed_count += ReportService(user_id).refresh_dirty_reports()
             except Exception as e:
                 db.session.rollback()
-                logger.error(f"更新使用者 {user.username} 的目標時發生錯誤: {e}")
+                failed_count += 1
+                logger.error(f"重新生成使用者 {user_id} 的過期月報表時發生錯誤: {e}")
         
-        logger.info(f"目標更新完成。共更新 {total_goals_updated} 個目標")
+        logger.info(
+            f"過期月報表更新完成。使用者: {len(user_ids)}, 重新生成: {refreshed_count}，"
+            f"耗時 {time.perf_counter() - started:.2f} 秒"
+        )
+        return failed_count == 0
 
 
 def init_scheduler(app):
-    """初始化排程器"""
+    """初始化排程器（各任務的耗時與結果記錄於 /metrics）"""
     global scheduler
     
     if scheduler is not None:
@@ -102,7 +184,7 @@ def init_scheduler(app):
     
     # 每月 1 日凌晨 00:05 自動生成上月報表
     scheduler.add_job(
-        func=lambda: generate_all_monthly_reports(app),
+        func=lambda: track_job('monthly_report_job', generate_all_monthly_reports, app),
         trigger=CronTrigger(day=1, hour=0, minute=5),
         id='monthly_report_job',
         name='生成月報表',
@@ -112,7 +194,7 @@ def init_scheduler(app):
     
     # 每日凌晨 01:00 更新所有目標進度
     scheduler.add_job(
-        func=lambda: update_all_goals(app),
+        func=lambda: track_job('daily_goal_update_job', update_all_goals, app),
         trigger=CronTrigger(hour=1, minute=0),
         id='daily_goal_update_job',
         name='更新目標進度',
@@ -120,6 +202,16 @@ def init_scheduler(app):
     )
     logger.info("已設定每日目標更新任務：每日 01:00")
     
+    # 每 15 分鐘重新生成因交易異動而過期的月報表
+    scheduler.add_job(
+        func=lambda: track_job('dirty_report_refresh_job', refresh_dirty_reports, app),
+        trigger=CronTrigger(minute='*/15'),
+        id='dirty_report_refresh_job',
+        name='更新過期月報表',
+        replace_existing=True
+    )
+    logger.info("已設定過期月報表更新任務：每 15 分鐘")
+    
     # 啟動排程器
     scheduler.start()
     logger.info("排程器已啟動")